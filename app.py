@@ -1,18 +1,27 @@
 import os
-import sqlite3
+import io
 import uuid
 import json
+import time
+import threading
+import multiprocessing
+from collections import OrderedDict
 from datetime import timedelta
-from flask import Flask, render_template, request, send_file, jsonify, flash, redirect, url_for, send_from_directory, abort
+from flask import Flask, render_template, request, send_file, jsonify, flash, redirect, url_for, abort, Response, stream_with_context
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from db_init import init_db
-
-from engines.parser import parse_ingredients, standardize_units
-from engines.calculator import calculate_nutrition
-from engines.compliance import apply_compliance
-from engines.compliance_features import validate_health_claims, suggest_sodium_fix
-from engines.label_generator import generate_pdf
+from job_queue import JobQueue
+from batch_generate import read_products, run_batch, summarize, write_zip, save_history
+
+from engines import db
+from engines.ingredient_store import get_store
+from engines.parse_cache import get_parse_cache, get_recipe_cache
+from engines.pipeline import compute_label, label_inputs, label_from_ingredients, recipe_ingredients
+from engines.label_generator import render_pdf_bytes
+from engines import analytics
+from engines.history_store import insert_label, delete_label, label_from_row
+from engines.label_store import get_label_cache, label_hash, retain_blob, release_blob
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -31,6 +40,8 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
 # DB Initialization
 with app.app_context():
     init_db()
+    # Warm the in-memory ingredient store so the first label doesn't pay for it
+    get_store()
 
 # Login Manager Setup
 login_manager = LoginManager()
@@ -40,9 +51,8 @@ login_manager.login_message_category = "alert"
 login_manager.init_app(app)
 
 def get_db_connection():
-    conn = sqlite3.connect('nutrition.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Pooled per thread (WAL, tuned pragmas); close() just ends the transaction
+    return db.app_connection()
 
 class User(UserMixin):
     def __init__(self, id, name, email):
@@ -50,13 +60,61 @@ class User(UserMixin):
         self.name = name
         self.email = email
 
+class UserCache:
+    """
+    Bounded LRU of User objects with a TTL, so steady-state authenticated
+    requests don't read the users table. Routes that change a user call
+    invalidate(); the TTL bounds staleness across worker processes.
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self._users[user_id]
+                return None
+            self._users.move_to_end(user_id)
+            return user
+
+    def put(self, user):
+        with self._lock:
+            self._users[user.id] = (user, time.monotonic() + self.ttl)
+            self._users.move_to_end(user.id)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+user_cache = UserCache(max_size=int(os.environ.get('USER_CACHE_SIZE', 1024)),
+                       ttl=float(os.environ.get('USER_CACHE_TTL', 300)))
+
 @login_manager.user_loader
 def load_user(user_id):
+    try:
+        user_id = int(user_id)
+    except ValueError:
+        return None
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
     conn = get_db_connection()
-    user_row = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
+    user_row = conn.execute('SELECT id, name, email FROM users WHERE id = ?', (user_id,)).fetchone()
     conn.close()
     if user_row:
-        return User(id=user_row['id'], name=user_row['name'], email=user_row['email'])
+        user = User(id=user_row['id'], name=user_row['name'], email=user_row['email'])
+        user_cache.put(user)
+        return user
     return None
 
 @login_manager.unauthorized_handler
@@ -153,127 +211,104 @@ def dashboard():
     settings = get_user_settings(current_user.id)
     return render_template('dashboard.html', current_user=current_user, settings=settings)
 
+def build_label(form, user_id):
+    """
+    Run the full label pipeline (parse, calculate, comply, PDF, history) for
+    one submitted form. Shared by the synchronous /generate path and the job
+    workers, so it must not touch `request` or `current_user`.
+    Raises ValueError for bad input.
+    """
+    # Add company info from user settings for PDF
+    user_settings = get_user_settings(user_id)
+    compliant_data, compliance_score = compute_label(
+        form,
+        user_settings['default_company_name'] or '',
+        user_settings['default_address'] or '',
+        keep_parse=True
+    )
+
+    # PDFs are stored once per distinct label content; a repeat generation
+    # reuses the existing blob instead of rendering it again
+    key = label_hash(compliant_data)
+    cache = get_label_cache()
+    pdf = cache.get(key)
+    if pdf is None:
+        pdf = render_pdf_bytes(compliant_data)
+    pdf_filename = f"label_{key[:16]}.pdf"
+
+    # Save to History, referencing the shared blob
+    conn = get_db_connection()
+    with conn:
+        label_id = insert_label(conn, user_id, compliant_data['product_name'], compliance_score,
+                                pdf_filename, key, compliant_data)
+        retain_blob(conn, key, len(pdf))
+    conn.close()
+    cache.put(key, pdf)
+
+    compliant_data["pdf_url"] = f"/download/{label_id}"
+    return compliant_data
+
+def label_pdf_bytes(record):
+    """
+    PDF for a history row: the content-addressed cache first, then a file
+    written to static/labels by older versions, else a deterministic
+    re-render of the stored label data (which is put back in the cache).
+    """
+    label_data = label_from_row(record)
+    key = record['pdf_hash'] or label_hash(label_data)
+    cache = get_label_cache()
+    pdf = cache.get(key)
+    if pdf is not None:
+        return pdf
+
+    legacy_path = os.path.join(app.root_path, 'static', 'labels', os.path.basename(record['pdf_filename']))
+    if os.path.exists(legacy_path):
+        with open(legacy_path, 'rb') as f:
+            return f.read()
+
+    pdf = render_pdf_bytes(label_data)
+    cache.put(key, pdf)
+    return pdf
+
+def run_job(kind, user_id, payload):
+    if kind == 'generate':
+        return build_label(payload, user_id)
+    raise ValueError(f"Unknown job kind '{kind}'")
+
+# Workers are started by `python app.py` or `flask --app app jobs`, not on import
+job_queue = JobQueue(db.APP_DB, run_job, workers=int(os.environ.get('JOB_WORKERS', 2)))
+
+@app.cli.command('jobs')
+def run_jobs():
+    """Run the job queue workers until interrupted (for deployments not started with app.py)."""
+    job_queue.start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        job_queue.stop()
+
+def wants_async():
+    return (request.form.get('async') in ('1', 'true', 'on')
+            or 'respond-async' in request.headers.get('Prefer', ''))
+
 @app.route('/generate', methods=['POST', 'GET'])
 @login_required
 def generate():
     if request.method == 'GET':
         return redirect(url_for('dashboard'))
-        
-    try:
-        # 1. Collect inputs
-        product_name = request.form.get('product_name', 'Unnamed Product')
-        raw_recipe = request.form.get('ingredients', '')
-        serving_size_g = float(request.form.get('serving_size', 30) or 30)
-        net_weight_g = float(request.form.get('net_weight', 100) or 100)
-        fssai_license = request.form.get('fssai_license', '')
-        
-        # Validate FSSAI license: if provided, must be exactly 14 digits
-        if fssai_license.strip() and not (fssai_license.strip().isdigit() and len(fssai_license.strip()) == 14):
-            return jsonify({"error": "FSSAI License Number must be exactly 14 digits if provided."}), 400
-        
-        use_raw_weight = request.form.get('use_raw_weight') == 'on'
-        yield_weight_str = request.form.get('total_weight', request.form.get('yield_weight', '0'))
-        final_yield_weight = 0 if use_raw_weight else float(yield_weight_str or 0)
-
-        if not raw_recipe.strip():
-            return jsonify({"error": "Ingredients are required"}), 400
-
-        # Guard against division by zero
-        if serving_size_g <= 0:
-            serving_size_g = 30
-        if net_weight_g <= 0:
-            net_weight_g = 100
-
-        # Calculate servings per pack
-        servings_per_pack = max(1, round(net_weight_g / serving_size_g))
-
-        # 2. Parse and Standardize
-        parsed_json = parse_ingredients(raw_recipe)
-        standardized_ingredients = standardize_units(parsed_json)
 
-        # 3. Calculate Nutrition
-        calc_data = calculate_nutrition(standardized_ingredients, final_yield_weight, serving_size_g)
-
-        # 4. Apply Compliance (Rounding, formatting, allergens)
-        compliant_data = apply_compliance(calc_data)
-        
-        health_claims = validate_health_claims(calc_data['per_100g'])
-        
-        sodium_fix = None
-        if calc_data['per_100g']['sodium'] > 600:
-            sodium_fix = suggest_sodium_fix(
-                standardized_ingredients,
-                calc_data['per_100g']['sodium'],
-                final_yield_weight
-            )
-        
-        # Merge form data with compliant data
-        compliant_data.update({
-            "product_name": product_name,
-            "serving_size_g": serving_size_g,
-            "servings_per_pack": servings_per_pack,
-            "fssai_license": fssai_license,
-            "health_claims": health_claims,
-            "sodium_fix": sodium_fix
-        })
-        
-        # Add company info from user settings for PDF
-        user_settings = get_user_settings(current_user.id)
-        compliant_data["company_name"] = user_settings['default_company_name'] or ''
-        compliant_data["manufacturer_address"] = user_settings['default_address'] or ''
-
-        # 5. Generate PDF with uuid4
-        pdf_dir = os.path.join(app.root_path, 'static', 'labels')
-        os.makedirs(pdf_dir, exist_ok=True)
-        pdf_filename = f"label_{uuid.uuid4().hex[:8]}.pdf"
-        pdf_path = os.path.join(pdf_dir, pdf_filename)
-        generate_pdf(compliant_data, pdf_path)
-        
-        compliant_data["pdf_url"] = f"/static/labels/{pdf_filename}"
-        
-        # 6. Calculate Compliance Score
-        compliance_score = 100
-        compliance_warnings = []
-        
-        # Subtract 20 if sodium > 600mg per 100g
-        if float(calc_data['per_100g'].get('sodium', 0)) > 600:
-            compliance_score -= 20
-            compliance_warnings.append('Sodium exceeds 600mg per 100g')
-            
-        # Subtract 10 if trans fat > 0.2g per serving
-        if float(calc_data['per_serving'].get('trans_fat', 0)) > 0.2:
-            compliance_score -= 10
-            compliance_warnings.append('Trans fat exceeds 0.2g per serving')
-            
-        # Subtract 10 if any mandatory nutrient value is missing or zero.
-        mandatory = ['energy', 'protein', 'carbs', 'sugar', 'fat', 'sat_fat', 'trans_fat', 'sodium']
-        missing_or_zero = False
-        for n in mandatory:
-            val = float(calc_data['per_100g'].get(n, 0))
-            if val == 0:
-                missing_or_zero = True
-                break
-        
-        if missing_or_zero:
-            compliance_score -= 10
-            compliance_warnings.append('One or more mandatory nutrients are missing or zero')
-            
-        # Subtract 10 if FSSAI license number was not provided
-        if not fssai_license.strip():
-            compliance_score -= 10
-            compliance_warnings.append('Add your FSSAI license number before printing on final packaging')
-            
-        compliance_score = max(0, compliance_score)
-        compliant_data['compliance_warnings'] = compliance_warnings
+    if wants_async():
+        job_id = job_queue.enqueue(current_user.id, request.form.to_dict())
+        return jsonify({
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": url_for('job_status', job_id=job_id),
+            "events_url": url_for('job_events', job_id=job_id)
+        }), 202
         
-        # 7. Save to History
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO label_history (user_id, product_name, compliance_score, pdf_filename, nutrition_json)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (current_user.id, product_name, compliance_score, pdf_filename, json.dumps(compliant_data)))
-        conn.commit()
-        conn.close()
+    try:
+        compliant_data = build_label(request.form, current_user.id)
 
         # Provide JSON or HTML Preview
         if request.headers.get('Accept') == 'application/json':
@@ -285,26 +320,194 @@ def generate():
     except Exception as e:
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
+@app.route('/recalculate', methods=['POST'])
+@login_required
+def recalculate():
+    """
+    What-if recalculation of a label from already standardized ingredients
+    (or the parse_id /generate returned) plus edits to quantities, serving
+    size, pack or yield weight. No parsing, no PDF and no history row; the
+    label is only saved when it is generated.
+    """
+    payload = request.get_json(silent=True)
+    if payload is None:
+        payload = request.form.to_dict()
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Send a JSON object."}), 400
+    try:
+        ingredients = recipe_ingredients(payload)
+        user_settings = get_user_settings(current_user.id)
+        compliant_data, compliance_score = label_from_ingredients(
+            ingredients,
+            label_inputs(payload),
+            user_settings['default_company_name'] or '',
+            user_settings['default_address'] or '',
+            parse_id=payload.get('parse_id')
+        )
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    compliant_data["compliance_score"] = compliance_score
+    return jsonify(compliant_data)
+
+# ─── Batch Generation ──────────────────────────────────────────
+
+def batch_zip_path(user_id, batch_id):
+    return os.path.join(app.instance_path, 'batches', f"{user_id}_{batch_id}.zip")
+
+@app.route('/batch', methods=['POST'])
+@login_required
+def batch():
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({"error": "Upload a CSV or JSONL file of products as 'file'"}), 400
+
+    fmt = 'jsonl' if upload.filename.endswith(('.jsonl', '.json')) else None
+    try:
+        products = read_products(io.TextIOWrapper(upload.stream, encoding='utf-8-sig'), fmt)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": f"Could not read batch file: {e}"}), 400
+    if not products:
+        return jsonify({"error": "Batch file contains no products"}), 400
+
+    user_id = current_user.id
+    user_settings = get_user_settings(user_id)
+    batch_id = uuid.uuid4().hex
+    workers = int(os.environ.get('BATCH_WORKERS', 0)) or None
+
+    def stream():
+        # One NDJSON line per product as it finishes, then a summary with the zip link
+        results = []
+        # Spawned workers: forking this threaded server could copy held locks
+        for result in run_batch(products, user_settings['default_company_name'] or '',
+                                user_settings['default_address'] or '', workers,
+                                mp_context=multiprocessing.get_context('spawn')):
+            results.append(result)
+            yield json.dumps(summarize(result)) + "\n"
+
+        zip_path = batch_zip_path(user_id, batch_id)
+        os.makedirs(os.path.dirname(zip_path), exist_ok=True)
+        write_zip(results, zip_path)
+        saved = save_history(db.APP_DB, user_id, results)
+        yield json.dumps({
+            "status": "complete",
+            "labels": saved,
+            "failed": len(results) - saved,
+            "zip_url": url_for('batch_download', batch_id=batch_id)
+        }) + "\n"
+
+    return Response(stream_with_context(stream()), mimetype='application/x-ndjson')
+
+@app.route('/batch/<batch_id>/download')
+@login_required
+def batch_download(batch_id):
+    zip_path = batch_zip_path(current_user.id, batch_id)
+    if not batch_id.isalnum() or not os.path.exists(zip_path):
+        abort(404)
+    return send_file(zip_path, as_attachment=True, download_name=f"labels_{batch_id[:8]}.zip")
+
+def get_user_job(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        abort(404)
+    if job['user_id'] != current_user.id:
+        abort(403)
+    return job
+
+def job_payload(job):
+    return {k: job[k] for k in ('id', 'status', 'result', 'error')}
+
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    return jsonify(job_payload(get_user_job(job_id)))
+
+@app.route('/jobs/<job_id>/events')
+@login_required
+def job_events(job_id):
+    job = get_user_job(job_id)
+
+    def stream(job):
+        # Server-sent events: one event per status change, closing once the job settles
+        last_status = None
+        while True:
+            if job['status'] != last_status:
+                last_status = job['status']
+                yield f"event: {last_status}\ndata: {json.dumps(job_payload(job))}\n\n"
+            if last_status in ('done', 'failed'):
+                return
+            time.sleep(0.5)
+            job = job_queue.get(job['id'])
+
+    return Response(stream_with_context(stream(job)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
 @app.route('/history')
 @login_required
 def history():
-    page = request.args.get('page', 1, type=int)
     per_page = 10
-    offset = (page - 1) * per_page
-    
+    page = max(1, request.args.get('page', 1, type=int))
+    after = parse_history_cursor(request.args.get('after'))
+    before = parse_history_cursor(request.args.get('before'))
+
     conn = get_db_connection()
-    total_count = conn.execute('SELECT COUNT(*) FROM label_history WHERE user_id = ?', (current_user.id,)).fetchone()[0]
+    count_row = conn.execute('SELECT total FROM label_counts WHERE user_id = ?', (current_user.id,)).fetchone()
+    total_count = count_row['total'] if count_row else 0
     total_pages = max(1, (total_count + per_page - 1) // per_page)
-    
-    records = conn.execute('''
-        SELECT * FROM label_history 
-        WHERE user_id = ? 
-        ORDER BY created_at DESC 
-        LIMIT ? OFFSET ?
-    ''', (current_user.id, per_page, offset)).fetchall()
+
+    # Keyset pagination over the covering index: only the list columns,
+    # never the label payload, and no OFFSET scan for deep pages
+    columns = 'id, product_name, created_at, compliance_score'
+    if before:
+        records = conn.execute(f'''
+            SELECT {columns} FROM label_history
+            WHERE user_id = ? AND (created_at, id) > (?, ?)
+            ORDER BY created_at, id
+            LIMIT ?
+        ''', (current_user.id, *before, per_page + 1)).fetchall()
+        has_more = len(records) > per_page
+        records = records[:per_page][::-1]
+        has_prev, has_next = has_more, True
+    elif after:
+        records = conn.execute(f'''
+            SELECT {columns} FROM label_history
+            WHERE user_id = ? AND (created_at, id) < (?, ?)
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ''', (current_user.id, *after, per_page + 1)).fetchall()
+        has_prev, has_next = True, len(records) > per_page
+        records = records[:per_page]
+    else:
+        # First page, or an old ?page=N link
+        records = conn.execute(f'''
+            SELECT {columns} FROM label_history
+            WHERE user_id = ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT ? OFFSET ?
+        ''', (current_user.id, per_page + 1, (page - 1) * per_page)).fetchall()
+        has_prev, has_next = page > 1, len(records) > per_page
+        records = records[:per_page]
     conn.close()
-    
-    return render_template('history.html', records=records, page=page, total_pages=total_pages, current_user=current_user)
+
+    prev_url = next_url = None
+    if records and has_prev:
+        prev_url = url_for('history', before=history_cursor(records[0]), page=max(1, page - 1))
+    if records and has_next:
+        next_url = url_for('history', after=history_cursor(records[-1]), page=page + 1)
+
+    return render_template('history.html', records=records, page=page, total_pages=total_pages,
+                           prev_url=prev_url, next_url=next_url, current_user=current_user)
+
+def history_cursor(record):
+    return f"{record['created_at']}|{record['id']}"
+
+def parse_history_cursor(value):
+    """(created_at, id) from a history cursor, or None if absent/malformed."""
+    if not value:
+        return None
+    created_at, _, record_id = value.rpartition('|')
+    if not created_at or not record_id.isdigit():
+        return None
+    return created_at, int(record_id)
 
 @app.route('/download/<int:id>')
 @login_required
@@ -316,7 +519,8 @@ def download(id):
     if not record or record['user_id'] != current_user.id:
         abort(403)
         
-    return send_from_directory(os.path.join(app.root_path, 'static', 'labels'), record['pdf_filename'], as_attachment=True)
+    return send_file(io.BytesIO(label_pdf_bytes(record)), mimetype='application/pdf',
+                     as_attachment=True, download_name=record['pdf_filename'])
 
 @app.route('/delete/<int:id>', methods=['POST'])
 @login_required
@@ -328,19 +532,43 @@ def delete(id):
         conn.close()
         abort(403)
         
-    conn.execute('DELETE FROM label_history WHERE id = ?', (id,))
-    conn.commit()
+    with conn:
+        delete_label(conn, record)
+        last_reference = record['pdf_hash'] is not None and release_blob(conn, record['pdf_hash'])
     conn.close()
     
-    # Clean up PDF file
-    try:
-        os.remove(os.path.join(app.root_path, 'static', 'labels', record['pdf_filename']))
-    except:
-        pass
+    # Remove the PDF once no other history row shares it
+    if last_reference:
+        get_label_cache().remove(record['pdf_hash'])
+    elif record['pdf_hash'] is None:
+        # Rows from older versions own a file in static/labels
+        try:
+            os.remove(os.path.join(app.root_path, 'static', 'labels', record['pdf_filename']))
+        except:
+            pass
         
     flash("Menu item deleted from history.", "alert")
     return redirect(url_for('history'))
 
+@app.route('/analytics')
+@login_required
+def analytics_summary():
+    weeks = min(max(request.args.get('weeks', 12, type=int), 1), 104)
+    top = min(max(request.args.get('top', 10, type=int), 1), 50)
+    conn = get_db_connection()
+    data = analytics.summary(conn, current_user.id, weeks=weeks, top=top)
+    conn.close()
+    return jsonify(data)
+
+@app.route('/stats/cache')
+@login_required
+def cache_stats():
+    return jsonify({
+        "ingredient_store": get_store().stats(),
+        "parse_cache": get_parse_cache().stats(),
+        "recipe_cache": get_recipe_cache().stats()
+    })
+
 # ─── Settings Routes ───────────────────────────────────────────
 
 @app.route('/settings')
@@ -361,6 +589,7 @@ def update_name():
     conn.execute('UPDATE users SET name = ? WHERE id = ?', (new_name, current_user.id))
     conn.commit()
     conn.close()
+    user_cache.invalidate(current_user.id)
     current_user.name = new_name
     flash('Display name updated successfully', 'alert')
     return redirect(url_for('settings'))
@@ -393,6 +622,7 @@ def update_email():
     conn.execute('UPDATE users SET email = ? WHERE id = ?', (new_email, current_user.id))
     conn.commit()
     conn.close()
+    user_cache.invalidate(current_user.id)
     current_user.email = new_email
     flash('Email updated successfully', 'alert')
     return redirect(url_for('settings'))
@@ -488,4 +718,7 @@ def save_notifications():
     return redirect(url_for('settings'))
 
 if __name__ == '__main__':
+    # Under the reloader only the serving child runs jobs, not the file watcher
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        job_queue.start()
     app.run(debug=True, port=5000)
@@ -0,0 +1,145 @@
+import io
+import csv
+import sys
+import json
+import zipfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from engines import db
+from engines.pipeline import compute_label
+from engines.label_generator import render_pdf_bytes
+from engines.history_store import insert_labels
+from engines.label_store import get_label_cache, label_hash, retain_blob
+
+# Columns understood in a batch file; same names as the /generate form fields
+FIELDS = ['product_name', 'ingredients', 'serving_size', 'net_weight', 'fssai_license',
+          'total_weight', 'yield_weight', 'use_raw_weight']
+
+
+def read_products(stream, fmt=None):
+    """
+    Read products from a CSV (header row with FIELDS columns) or JSONL
+    (one object per line) text stream. `fmt` is 'csv' or 'jsonl'; when
+    omitted it is sniffed from the first non-blank character. Raises a
+    ValueError naming the line for a JSONL line that is not a JSON object.
+    """
+    # A byte order mark left by Excel & co. would otherwise end up in the first column name
+    text = stream.read().lstrip('\ufeff')
+    if fmt is None:
+        fmt = 'jsonl' if text.lstrip().startswith('{') else 'csv'
+    if fmt == 'jsonl':
+        products = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                product = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"line {number} is not valid JSON ({e})")
+            if not isinstance(product, dict):
+                raise ValueError(f"line {number} is not a JSON object")
+            products.append(product)
+    else:
+        products = list(csv.DictReader(io.StringIO(text)))
+    return [{k: ('' if v is None else str(v)) for k, v in p.items() if k in FIELDS} for p in products]
+
+
+def process_row(row, product, company_name='', manufacturer_address=''):
+    """Worker: run one product through the pipeline and render its PDF in memory."""
+    try:
+        compliant_data, compliance_score = compute_label(product, company_name, manufacturer_address)
+        return {"row": row, "status": "ok", "product_name": compliant_data["product_name"],
+                "compliance_score": compliance_score, "data": compliant_data,
+                "pdf": render_pdf_bytes(compliant_data)}
+    except Exception as e:
+        return {"row": row, "status": "error", "product_name": product.get('product_name', ''), "error": str(e)}
+
+
+def run_batch(products, company_name='', manufacturer_address='', workers=None, mp_context=None):
+    """
+    Yield process_row results across a process pool, in completion order.
+    Callers running threads of their own (the web app) should pass a "spawn"
+    or "forkserver" `mp_context`: a forked worker would inherit whatever
+    locks those threads held at the time.
+    """
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+        futures = [pool.submit(process_row, i, p, company_name, manufacturer_address)
+                   for i, p in enumerate(products)]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def summarize(result):
+    """The per-row line streamed back to the caller (no PDF bytes, no full payload)."""
+    return {k: result[k] for k in ('row', 'status', 'product_name', 'compliance_score', 'error') if k in result}
+
+
+def pdf_name(result):
+    safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in result["product_name"])[:40]
+    return f"{result['row'] + 1:04d}_{safe or 'label'}.pdf"
+
+
+def write_zip(results, target):
+    """Write every successful row's PDF into a zip at `target` (path or file object)."""
+    with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for result in sorted(results, key=lambda r: r["row"]):
+            if result["status"] == "ok":
+                zf.writestr(pdf_name(result), result["pdf"])
+
+
+def save_history(db_path, user_id, results, cache=None):
+    """
+    Insert every successful row into label_history in one transaction,
+    storing each distinct PDF once and counting the rows that share it.
+    """
+    cache = cache or get_label_cache()
+    ok = sorted((r for r in results if r["status"] == "ok"), key=lambda r: r["row"])
+    keys = [label_hash(r["data"]) for r in ok]
+
+    conn = db.connect(db_path)
+    with conn:
+        insert_labels(conn, user_id, [
+            (r["product_name"], r["compliance_score"], f"label_{key[:16]}.pdf", key, r["data"])
+            for r, key in zip(ok, keys)
+        ])
+        for r, key in zip(ok, keys):
+            retain_blob(conn, key, len(r["pdf"]))
+    conn.close()
+
+    for r, key in zip(ok, keys):
+        cache.put(key, r["pdf"])
+    return len(ok)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Generate nutrition labels for a CSV/JSONL product catalogue.")
+    ap.add_argument("input", help="CSV or JSONL file of products")
+    ap.add_argument("--out", default="labels.zip", help="zip file to write the PDFs to")
+    ap.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    ap.add_argument("--user-id", type=int, help="also save the labels to this user's history")
+    ap.add_argument("--db", default=db.APP_DB, help="app database used with --user-id")
+    ap.add_argument("--company-name", default="")
+    ap.add_argument("--address", default="")
+    args = ap.parse_args(argv)
+
+    fmt = 'jsonl' if args.input.endswith(('.jsonl', '.json')) else None
+    with open(args.input, newline='', encoding='utf-8-sig') as f:
+        products = read_products(f, fmt)
+
+    results = []
+    for result in run_batch(products, args.company_name, args.address, args.workers):
+        results.append(result)
+        print(json.dumps(summarize(result)), flush=True)
+
+    write_zip(results, args.out)
+    failed = sum(r["status"] == "error" for r in results)
+    print(f"{len(results) - failed} labels written to {args.out}, {failed} failed.", file=sys.stderr)
+    if args.user_id is not None:
+        saved = save_history(args.db, args.user_id, results)
+        print(f"Saved {saved} rows to label history.", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Requests/sec for the app's SQLite access pattern under concurrent load:
+a new connection per query in rollback-journal mode (what get_db_connection
+used to do) versus the per-thread WAL pool in engines/db.py.
+
+Each simulated request loads the user, reads their settings and the first
+history page; every fourth request also saves a label (a write).
+
+    python bench_db.py [threads] [requests per thread]
+"""
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import threading
+
+from db_init import init_db
+from engines import db
+from engines.history_store import insert_label
+
+LABEL = {"product_name": "Bench Biscuits", "per_100g": {"energy": 480.0}}
+
+
+def fresh_connection(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def pooled_connection(db_path):
+    return db.connect(db_path, row_factory=sqlite3.Row)
+
+
+def simulate_request(get_conn, db_path, user_id, write):
+    conn = get_conn(db_path)
+    conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
+    conn.close()
+    conn = get_conn(db_path)
+    conn.execute('SELECT * FROM user_settings WHERE user_id = ?', (user_id,)).fetchone()
+    conn.close()
+    conn = get_conn(db_path)
+    conn.execute('''
+        SELECT id, product_name, created_at, compliance_score FROM label_history
+        WHERE user_id = ? ORDER BY created_at DESC LIMIT 10
+    ''', (user_id,)).fetchall()
+    conn.close()
+    if write:
+        conn = get_conn(db_path)
+        insert_label(conn, user_id, 'Bench Biscuits', 90, 'label_bench.pdf', None, LABEL)
+        conn.commit()
+        conn.close()
+
+
+def requests_per_second(get_conn, db_path, threads, per_thread):
+    def worker(user_id):
+        for i in range(per_thread):
+            simulate_request(get_conn, db_path, user_id, write=(i % 4 == 0))
+        db.close_all()
+
+    pool = [threading.Thread(target=worker, args=(t % 4 + 1,)) for t in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return threads * per_thread / (time.perf_counter() - start)
+
+
+def make_db(directory, name):
+    db_path = os.path.join(directory, name)
+    init_db(db_path)
+    conn = sqlite3.connect(db_path)
+    for user_id in range(1, 5):
+        conn.execute('INSERT INTO users (name, email, password_hash) VALUES (?, ?, ?)',
+                     (f'User {user_id}', f'user{user_id}@example.com', 'x'))
+        conn.execute('INSERT INTO user_settings (user_id) VALUES (?)', (user_id,))
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        # Separate files: WAL mode is persistent once set on a database
+        before = requests_per_second(fresh_connection, make_db(tmp, 'per_query.db'), threads, per_thread)
+        after = requests_per_second(pooled_connection, make_db(tmp, 'pooled.db'), threads, per_thread)
+    print(f"connection per query     : {before:8.1f} requests/sec")
+    print(f"per-thread WAL pool      : {after:8.1f} requests/sec")
+    print(f"speed-up                 : {after / before:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Size and read time of label history: the old layout (one json.dumps()
+text blob per row) versus typed nutrient columns plus a zlib-compressed
+payload (engines/history_store.py).
+
+    python bench_history.py [rows]
+"""
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import tempfile
+
+from engines import db
+from engines.pipeline import compute_label
+from engines.history_store import INSERT_SQL, COLUMNS, history_row, label_from_row
+
+RECIPES = [
+    "100g wheat flour\n50g sugar\n20g ghee\n1g salt",
+    "500g rice\n10g salt",
+    "200g besan\n50g sunflower oil\n5g salt\n20g onion",
+    "250g milk\n40g sugar\n10g ghee",
+]
+
+
+def sample_labels(n):
+    """n realistic payloads: real pipeline output with jittered numbers and names."""
+    base = [compute_label({"product_name": "Sample", "ingredients": r, "serving_size": "30",
+                           "net_weight": "150", "total_weight": str(random.randint(300, 700))})[0]
+            for r in RECIPES]
+    labels = []
+    for i in range(n):
+        label = json.loads(json.dumps(base[i % len(base)]))
+        label["product_name"] = f"Product {i}"
+        for section in ("per_100g", "per_serving"):
+            for key in ("energy", "sodium"):
+                label[section][key] = label[section][key] + random.randint(0, 50)
+            for key in ("protein", "carbs", "fat"):
+                label[section][key] = round(label[section][key] + random.random(), 1)
+        labels.append(label)
+    return labels
+
+
+def file_size(path):
+    conn = sqlite3.connect(path)
+    conn.execute("VACUUM")
+    conn.close()
+    return os.path.getsize(path)
+
+
+def read_all(conn, sql, decode):
+    start = time.perf_counter()
+    for _ in range(5):
+        labels = [decode(row) for row in conn.execute(sql, (1,))]
+    return (time.perf_counter() - start) / 5, len(labels)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    random.seed(1)
+    labels = sample_labels(n)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path = os.path.join(tmp, "json.db")
+        db.migrate(old_path, db.APP_MIGRATIONS[:4])
+        conn = sqlite3.connect(old_path)
+        conn.executemany('''
+            INSERT INTO label_history (user_id, product_name, compliance_score, pdf_filename, nutrition_json)
+            VALUES (1, ?, 90, 'label.pdf', ?)
+        ''', [(label["product_name"], json.dumps(label)) for label in labels])
+        conn.commit()
+        old_read, _ = read_all(conn, "SELECT nutrition_json FROM label_history WHERE user_id = ?",
+                               lambda row: json.loads(row[0]))
+        conn.close()
+        old_size = file_size(old_path)
+
+        new_path = os.path.join(tmp, "columnar.db")
+        db.migrate(new_path, db.APP_MIGRATIONS)
+        conn = sqlite3.connect(new_path)
+        conn.row_factory = sqlite3.Row
+        conn.executemany(INSERT_SQL, [history_row(1, label["product_name"], 90, "label.pdf", None, label)
+                                      for label in labels])
+        conn.commit()
+        new_read, count = read_all(
+            conn, f"SELECT {', '.join(COLUMNS)}, payload FROM label_history WHERE user_id = ?", label_from_row)
+        start = time.perf_counter()
+        conn.execute("SELECT AVG(p100_sodium) FROM label_history WHERE user_id = ?", (1,)).fetchone()
+        column_query = time.perf_counter() - start
+        conn.close()
+        new_size = file_size(new_path)
+
+    print(f"rows                         : {count}")
+    print(f"database size  json / columnar: {old_size / 1024:9.1f} KiB / {new_size / 1024:9.1f} KiB "
+          f"({old_size / new_size:.2f}x smaller)")
+    print(f"read + decode  json / columnar: {old_read * 1000:9.1f} ms  / {new_read * 1000:9.1f} ms")
+    print(f"AVG(sodium) straight from a column: {column_query * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
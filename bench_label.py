@@ -0,0 +1,55 @@
+"""
+Labels/sec for PDF generation: a fresh LabelTemplate per label (what
+generate_pdf used to do - rebuild every style, TableStyle and static
+flowable) versus the cached per-thread template.
+
+    python bench_label.py [labels per round]
+"""
+import io
+import sys
+import time
+
+from engines.label_generator import LabelTemplate, generate_pdf
+
+LABEL = {
+    "product_name": "Benchmark Cookies",
+    "servings_per_pack": 5,
+    "serving_size_g": 30,
+    "per_100g": {"energy": 361, "protein": 11.8, "carbs": 119.4, "sugar": 50.5, "added_sugar": 50.0,
+                 "fat": 1.8, "sat_fat": "0.4", "trans_fat": "0", "sodium": 3},
+    "per_serving": {"energy": 108, "protein": 3.5, "carbs": 35.8, "sugar": 15.1, "added_sugar": 15.0,
+                    "fat": 0.5, "sat_fat": "0", "trans_fat": "0", "sodium": 1},
+    "ingredients": [{"name": "wheat flour", "quantity": 100}, {"name": "sugar", "quantity": 50},
+                    {"name": "ghee", "quantity": 20}],
+    "allergen_statement": "Contains: Gluten, Milk",
+    "veg_type": "veg",
+    "fssai_license": "12345678901234",
+    "company_name": "Acme Foods",
+    "manufacturer_address": "Plot 4, MIDC, Pune",
+    "show_disclaimer": True
+}
+
+
+def labels_per_second(n, fresh_template):
+    start = time.perf_counter()
+    for _ in range(n):
+        generate_pdf(LABEL, io.BytesIO(), template=LabelTemplate() if fresh_template else None)
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rounds = 5
+    labels_per_second(20, False)  # warm up imports / font metrics
+    # Interleave the two variants and keep the best round of each to damp noise
+    before = after = 0
+    for _ in range(rounds):
+        before = max(before, labels_per_second(n, fresh_template=True))
+        after = max(after, labels_per_second(n, fresh_template=False))
+    print(f"fresh template per label : {before:8.1f} labels/sec")
+    print(f"cached template          : {after:8.1f} labels/sec")
+    print(f"speed-up                 : {after / before:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+pytest setup: the suite runs against throwaway databases, never the tracked
+nutrition.db or the local database/nutrition.db.
+
+engines.db reads NUTRITION_APP_DB / NUTRITION_COMPOSITION_DB when it is
+first imported, so they are pointed at a temp directory before any test
+module is collected, and the composition database is seeded there.
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+_tmp = None
+
+
+def pytest_configure(config):
+    global _tmp
+    _tmp = tempfile.mkdtemp(prefix="nutrition-tests-")
+    os.environ["NUTRITION_APP_DB"] = os.path.join(_tmp, "nutrition.db")
+    os.environ["NUTRITION_COMPOSITION_DB"] = os.path.join(_tmp, "composition.db")
+
+    from database.seed_db import seed_db
+    seed_db()
+
+
+def pytest_unconfigure(config):
+    from engines import db
+    db.close_all()
+    shutil.rmtree(_tmp, ignore_errors=True)
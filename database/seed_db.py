@@ -1,35 +1,19 @@
 import sqlite3
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engines import db
 
 def seed_db():
-    db_path = os.path.join(os.path.dirname(__file__), 'nutrition.db')
+    db_path = db.COMPOSITION_DB
+    # The schema (ingredients table and index) is owned by engines/db.py
+    db.migrate(db_path, db.COMPOSITION_MIGRATIONS)
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
-    # Drop the table if it exists so we can run this script multiple times safely
-    cursor.execute('DROP TABLE IF EXISTS ingredients')
-
-    # Create the ingredients table with FSSAI-compliant structure
-    cursor.execute('''
-    CREATE TABLE ingredients (
-        name          TEXT PRIMARY KEY NOT NULL,
-        energy        REAL NOT NULL DEFAULT 0,
-        protein       REAL NOT NULL DEFAULT 0,
-        carbs         REAL NOT NULL DEFAULT 0,
-        sugar         REAL NOT NULL DEFAULT 0,
-        added_sugar   REAL NOT NULL DEFAULT 0,
-        fat           REAL NOT NULL DEFAULT 0,
-        sat_fat       REAL NOT NULL DEFAULT 0,
-        trans_fat     REAL NOT NULL DEFAULT 0,
-        sodium        REAL NOT NULL DEFAULT 0,
-        allergen      TEXT NOT NULL DEFAULT 'none',
-        veg_type      TEXT NOT NULL DEFAULT 'veg',
-        source        TEXT NOT NULL DEFAULT 'IFCT 2017'
-    )
-    ''')
-
-    # Create an index for quick lookups by ingredient name
-    cursor.execute('CREATE INDEX idx_ingredient_name ON ingredients(name)')
+    # Clear the table so we can run this script multiple times safely
+    cursor.execute('DELETE FROM ingredients')
 
     # IFCT 2017 seed data (per 100g)
     ingredients = [
@@ -0,0 +1,120 @@
+"""
+Label history analytics kept as small aggregate tables (see migration 6 in
+engines/db.py), updated in the same transaction as every history insert and
+delete. Reading them never touches label_history, so /analytics costs the
+same for ten labels or ten million.
+
+Rebuild them from the history (e.g. after a manual data fix) with:
+
+    python -m engines.analytics rebuild [--db nutrition.db]
+"""
+import sys
+import sqlite3
+import argparse
+
+# created_at -> the Monday starting its week
+WEEK_SQL = "date(?, '-6 days', 'weekday 1')"
+
+
+def declared_allergens(label_data):
+    statement = label_data.get("allergen_statement") or ""
+    if not statement.startswith("Contains:"):
+        return []
+    return [a.strip() for a in statement[len("Contains:"):].split(",") if a.strip()]
+
+
+def sodium_offenders(label_data):
+    """(ingredient, contribution_mg) for labels over the sodium limit, from the sodium fix breakdown."""
+    sodium_fix = label_data.get("sodium_fix") or {}
+    return [(c["name"], c["contribution_mg"]) for c in sodium_fix.get("contributors", [])]
+
+
+def record(conn, user_id, created_at, compliance_score, label_data, sign=1):
+    """Add one label to (sign=1) or remove it from (sign=-1) the aggregates."""
+    conn.execute(f'''
+        INSERT INTO analytics_weekly (user_id, week, labels, score_sum)
+        VALUES (?, {WEEK_SQL}, ?, ?)
+        ON CONFLICT(user_id, week) DO UPDATE SET
+            labels = labels + excluded.labels, score_sum = score_sum + excluded.score_sum
+    ''', (user_id, created_at, sign, sign * compliance_score))
+    conn.executemany('''
+        INSERT INTO analytics_sodium (user_id, ingredient, labels, contribution_mg)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(user_id, ingredient) DO UPDATE SET
+            labels = labels + excluded.labels, contribution_mg = contribution_mg + excluded.contribution_mg
+    ''', [(user_id, name, sign, sign * mg) for name, mg in sodium_offenders(label_data)])
+    conn.executemany('''
+        INSERT INTO analytics_allergens (user_id, allergen, labels) VALUES (?, ?, ?)
+        ON CONFLICT(user_id, allergen) DO UPDATE SET labels = labels + excluded.labels
+    ''', [(user_id, allergen, sign) for allergen in declared_allergens(label_data)])
+    if sign < 0:
+        for table in ('analytics_weekly', 'analytics_sodium', 'analytics_allergens'):
+            conn.execute(f'DELETE FROM {table} WHERE user_id = ? AND labels <= 0', (user_id,))
+
+
+def rebuild(conn):
+    """Recompute every aggregate from label_history (inside the caller's transaction)."""
+    from engines.history_store import COLUMNS, label_from_row
+
+    for table in ('analytics_weekly', 'analytics_sodium', 'analytics_allergens'):
+        conn.execute(f'DELETE FROM {table}')
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute(f'''
+        SELECT user_id, created_at, compliance_score, {", ".join(COLUMNS)}, payload
+        FROM label_history ORDER BY id
+    ''')
+    count = 0
+    while True:
+        rows = cursor.fetchmany(500)
+        if not rows:
+            return count
+        for row in rows:
+            record(conn, row["user_id"], row["created_at"], row["compliance_score"], label_from_row(row))
+        count += len(rows)
+
+
+def summary(conn, user_id, weeks=12, top=10):
+    """Everything /analytics serves for one user, read from the aggregate tables only."""
+    weekly = conn.execute('''
+        SELECT week, labels, score_sum FROM analytics_weekly
+        WHERE user_id = ? ORDER BY week DESC LIMIT ?
+    ''', (user_id, weeks)).fetchall()
+    sodium = conn.execute('''
+        SELECT ingredient, labels, contribution_mg FROM analytics_sodium
+        WHERE user_id = ? ORDER BY labels DESC, contribution_mg DESC LIMIT ?
+    ''', (user_id, top)).fetchall()
+    allergens = conn.execute('''
+        SELECT allergen, labels FROM analytics_allergens
+        WHERE user_id = ? ORDER BY labels DESC, allergen LIMIT ?
+    ''', (user_id, top)).fetchall()
+    total = conn.execute('SELECT total FROM label_counts WHERE user_id = ?', (user_id,)).fetchone()
+    return {
+        "total_labels": total[0] if total else 0,
+        "weekly": [{"week": w, "labels": n, "avg_compliance_score": round(s / n, 1)}
+                   for w, n, s in reversed(weekly)],
+        "sodium_offenders": [{"ingredient": name, "labels": n, "avg_contribution_mg": round(mg / n, 1)}
+                             for name, n, mg in sodium],
+        "allergens": [{"allergen": name, "labels": n} for name, n in allergens],
+    }
+
+
+def main(argv=None):
+    from engines import db
+
+    ap = argparse.ArgumentParser(description="Maintain the label history analytics tables.")
+    ap.add_argument("command", choices=["rebuild"])
+    ap.add_argument("--db", default=db.APP_DB, help="app database")
+    args = ap.parse_args(argv)
+
+    db.migrate(args.db, db.APP_MIGRATIONS)
+    conn = sqlite3.connect(args.db)
+    with conn:
+        count = rebuild(conn)
+    conn.close()
+    print(f"Rebuilt analytics from {count} history rows.", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import weakref
+
+import numpy as np
+from engines.ingredient_store import get_store, NUTRIENTS
+
+# store -> (store.version, matrix); dropped with the store
+_matrix_cache = weakref.WeakKeyDictionary()
+
+
+def composition_matrix(store):
+    """Dense ingredient x nutrient matrix (rows follow the store's ids), cached per store version."""
+    cached = _matrix_cache.get(store)
+    if cached is None or cached[0] != store.version:
+        # Under the store's lock: lookups resolved on other threads may add rows meanwhile
+        with store._lock:
+            cached = (store.version, np.array(store.values, dtype=np.float64).reshape(-1, len(NUTRIENTS)))
+        _matrix_cache[store] = cached
+    return cached[1]
+
+
+def calculate_nutrition_batch(recipes, store=None):
+    """
+    Vectorised calculate_nutrition for many recipes at once.
+
+    `recipes` is a list of dicts with keys "ingredients" (output of
+    standardize_units), "final_yield_weight" and "serving_size_g".
+
+    Each recipe is laid out as a row of a recipe x slot quantity matrix with a
+    matching matrix of ingredient ids; rows of the composition matrix are
+    gathered per slot and accumulated slot by slot for all recipes at once.
+    Accumulating in recipe order keeps the floating point summation identical
+    to calculate_nutrition, so the vectors match it bit for bit.
+
+    Returns {"nutrients", "per_100g", "per_serving", "total_yield_weight",
+    "show_disclaimer", "errors"}; per_100g / per_serving are (len(recipes), 9)
+    arrays. Recipes with an ingredient the store cannot resolve get NaN rows
+    and an entry in "errors" (recipe index -> message) instead of failing
+    the whole batch.
+    """
+    store = get_store() if store is None else store
+    matrix = composition_matrix(store)
+    n_recipes = len(recipes)
+    width = max((len(r["ingredients"]) for r in recipes), default=0)
+
+    ids = np.zeros((n_recipes, width), dtype=np.intp)
+    qty = np.zeros((n_recipes, width), dtype=np.float64)
+    errors = {}
+    resolved = {}
+
+    for r, recipe in enumerate(recipes):
+        for s, item in enumerate(recipe["ingredients"]):
+            name = item["name"]
+            if name not in resolved:
+                data = store.resolve(name)
+                resolved[name] = None if data is None else store.index[data["name"]]
+            idx = resolved[name]
+            if idx is None:
+                errors[r] = f"Ingredient '{name}' not found locally."
+                break
+            ids[r, s] = idx
+            qty[r, s] = item["quantity"]
+
+    totals = np.zeros((n_recipes, len(NUTRIENTS)), dtype=np.float64)
+    raw_weight = np.zeros(n_recipes, dtype=np.float64)
+    # An empty store has no rows to gather: every recipe with ingredients is in errors
+    for s in range(width if len(matrix) else 0):
+        q = qty[:, s]
+        totals += (matrix[ids[:, s]] * q[:, None]) / 100
+        raw_weight += q
+
+    final_yield = np.array([r["final_yield_weight"] for r in recipes], dtype=np.float64)
+    serving = np.array([r["serving_size_g"] for r in recipes], dtype=np.float64)
+
+    normalization = np.where(final_yield > 0, final_yield, raw_weight)
+    normalization = np.where(normalization <= 0, 1.0, normalization)
+
+    per_100g = (totals / normalization[:, None]) * 100
+    per_serving = (per_100g * serving[:, None]) / 100
+
+    if errors:
+        bad = list(errors)
+        per_100g[bad] = np.nan
+        per_serving[bad] = np.nan
+
+    return {
+        "nutrients": list(NUTRIENTS),
+        "per_100g": per_100g,
+        "per_serving": per_serving,
+        "total_yield_weight": normalization,
+        "show_disclaimer": final_yield <= 0,
+        "errors": errors
+    }
+
+
+def batch_row(result, i):
+    """Per-recipe {nutrient: value} dicts, shaped like calculate_nutrition's output."""
+    nutrients = result["nutrients"]
+    return {
+        "per_100g": dict(zip(nutrients, result["per_100g"][i].tolist())),
+        "per_serving": dict(zip(nutrients, result["per_serving"][i].tolist()))
+    }
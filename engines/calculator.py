@@ -1,101 +1,160 @@
-import sqlite3
-import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from engines.ingredient_store import get_store, NUTRIENTS
+
+# Upper bound on simultaneous external lookups for one recipe
+MAX_LOOKUP_WORKERS = 8
+
+def resolve_missing_ingredients(names, store):
+    """
+    Look up names the local DB doesn't know via the external API, all at once
+    on a bounded thread pool, then persist the hits with a single bulk insert.
+    Returns {name: record or None}.
+    """
+    from engines.external_api import search_ingredient_nutrition
+
+    if not names:
+        return {}
+    workers = min(MAX_LOOKUP_WORKERS, len(names))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = dict(zip(names, pool.map(search_ingredient_nutrition, names)))
+
+    # Insert the fetched data into the DB to cache it for the future
+    store.insert([r for r in results.values() if r])
+    return results
+
+class RecipeAccumulator:
+    """
+    Running nutrient totals for a recipe that is edited one ingredient line
+    at a time: add(), remove(), scale() and set_quantity() are O(1) updates
+    of the nine totals, the raw weight, the allergen multiset and the count
+    of non-veg lines. result() produces calculate_nutrition's output dict.
+
+    Lines are identified by the key add() returns, so the same ingredient can
+    appear more than once. Totals built by add() alone, in recipe order, are
+    bit-identical to calculate_nutrition (which uses this class); removals and
+    rescaling subtract from the running sums, so they can differ from a fresh
+    calculation in the last few bits.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or get_store()
+        self.totals = {n: 0 for n in NUTRIENTS}
+        self.raw_weight = 0
+        self.allergens = Counter()
+        self.non_veg = 0
+        self._lines = {}
+        self._next_key = 0
+
+    def add(self, name, quantity, data=None):
+        """Add an ingredient line (`data` is its store record if already resolved); returns its key."""
+        if data is None:
+            data = self.store.resolve(name)
+            if data is None:
+                data = resolve_missing_ingredients([name], self.store)[name]
+            if data is None:
+                raise ValueError(f"Ingredient '{name}' not found locally or via external database.")
+        allergens = data["allergen"].split(",") if data["allergen"] and data["allergen"] != "none" else []
+        line = {
+            "name": name,
+            "quantity": quantity,
+            "values": [data[n] for n in NUTRIENTS],
+            "allergens": allergens,
+            "non_veg": data["veg_type"] == "non-veg"
+        }
+        self._apply(line["values"], quantity)
+        self.raw_weight += quantity
+        self.allergens.update(allergens)
+        self.non_veg += line["non_veg"]
+
+        key = self._next_key
+        self._next_key += 1
+        self._lines[key] = line
+        return key
+
+    def remove(self, key):
+        """Take an ingredient line back out."""
+        line = self._lines.pop(key)
+        self._apply(line["values"], -line["quantity"])
+        self.raw_weight -= line["quantity"]
+        self.allergens.subtract(line["allergens"])
+        self.allergens += Counter()  # drop allergens no line contributes any more
+        self.non_veg -= line["non_veg"]
+        if not self._lines:
+            # Nothing left: clear the rounding residue of the running sums
+            self.totals = {n: 0 for n in NUTRIENTS}
+            self.raw_weight = 0
+
+    def set_quantity(self, key, quantity):
+        """Change the quantity of one line."""
+        line = self._lines[key]
+        self._apply(line["values"], quantity - line["quantity"])
+        self.raw_weight += quantity - line["quantity"]
+        line["quantity"] = quantity
+
+    def scale(self, key, factor):
+        """Multiply the quantity of one line by `factor`."""
+        self.set_quantity(key, self._lines[key]["quantity"] * factor)
+
+    def _apply(self, values, quantity):
+        totals = self.totals
+        for n, value in zip(NUTRIENTS, values):
+            totals[n] += (value * quantity) / 100
+
+    def __len__(self):
+        return len(self._lines)
+
+    def result(self, final_yield_weight, serving_size_g):
+        """The nutrition dict apply_compliance() expects, for the current lines."""
+        # Determine normalization weight
+        normalization_weight = final_yield_weight if final_yield_weight > 0 else self.raw_weight
+        if normalization_weight <= 0:
+            normalization_weight = 1  # Prevent division by zero
+        show_disclaimer = final_yield_weight <= 0
+
+        # FSSAI requires values normalized per 100g of final yield matching weight
+        per_100g = {n: (self.totals[n] / normalization_weight) * 100 for n in NUTRIENTS}
+
+        # Calculate per serving
+        per_serving = {n: (per_100g[n] * serving_size_g) / 100 for n in NUTRIENTS}
+
+        # Sort ingredients descending by weight
+        ingredient_list = [{"name": line["name"], "quantity": line["quantity"]} for line in self._lines.values()]
+        ingredient_list.sort(key=lambda x: x["quantity"], reverse=True)
+
+        return {
+            "per_100g": per_100g,
+            "per_serving": per_serving,
+            "allergens": list(self.allergens),
+            "veg_type": "non-veg" if self.non_veg else "veg",
+            "ingredients": ingredient_list,
+            "serving_size_g": serving_size_g,
+            "show_disclaimer": show_disclaimer,
+            "total_yield_weight": normalization_weight
+        }
 
-def get_db_path():
-    return os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'nutrition.db')
 
 def calculate_nutrition(standardized_ingredients, final_yield_weight, serving_size_g):
-    conn = sqlite3.connect(get_db_path())
-    cursor = conn.cursor()
-
-    nutrients = ["energy", "protein", "carbs", "sugar", "added_sugar",
-                 "fat", "sat_fat", "trans_fat", "sodium"]
-    totals = {n: 0 for n in nutrients}
-    allergens = set()
-    veg_type = "veg"
-    ingredient_list = []
-    
-    total_raw_weight = sum(item["quantity"] for item in standardized_ingredients)
+    store = get_store()
 
+    # Exact match first, then the ranked fuzzy match; collect everything still
+    # unknown so the external API is consulted for all of them concurrently.
+    resolved = {}
+    missing = []
     for item in standardized_ingredients:
         name = item["name"]
-        qty  = item["quantity"]
-
-        cursor.execute("SELECT * FROM ingredients WHERE name=?", (name,))
-        row = cursor.fetchone()
-
-        if row is None:
-            # Try a partial match (LIKE) before hitting the external API
-            cursor.execute("SELECT * FROM ingredients WHERE name LIKE ? LIMIT 1", (f"%{name}%",))
-            row = cursor.fetchone()
-
-        if row is None:
-            # Fallback to external API
-            from engines.external_api import search_ingredient_nutrition
-            ext_data = search_ingredient_nutrition(name)
-            
-            if ext_data:
-                # Insert the fetched data into the DB to cache it for the future
-                cursor.execute('''
-                    INSERT INTO ingredients (
-                        name, energy, protein, carbs, sugar, added_sugar, fat, sat_fat, trans_fat, sodium, allergen, veg_type, source
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    ext_data['name'], ext_data['energy'], ext_data['protein'], ext_data['carbs'], ext_data['sugar'],
-                    ext_data['added_sugar'], ext_data['fat'], ext_data['sat_fat'], ext_data['trans_fat'],
-                    ext_data['sodium'], ext_data['allergen'], ext_data['veg_type'], ext_data['source']
-                ))
-                conn.commit()
-                
-                # Create a row tuple equivalent to what the DB fetch would return
-                row = (
-                    ext_data['name'], ext_data['energy'], ext_data['protein'], ext_data['carbs'], ext_data['sugar'],
-                    ext_data['added_sugar'], ext_data['fat'], ext_data['sat_fat'], ext_data['trans_fat'],
-                    ext_data['sodium'], ext_data['allergen'], ext_data['veg_type'], ext_data['source']
-                )
-            else:
-                conn.close()
+        if name not in resolved:
+            resolved[name] = store.resolve(name)
+            if resolved[name] is None:
+                missing.append(name)
+
+    if missing:
+        resolved.update(resolve_missing_ingredients(missing, store))
+        for name in missing:
+            if resolved[name] is None:
                 raise ValueError(f"Ingredient '{name}' not found locally or via external database.")
 
-        cols = ["name", "energy", "protein", "carbs", "sugar", "added_sugar",
-                "fat", "sat_fat", "trans_fat", "sodium", "allergen", "veg_type", "source"]
-        data = dict(zip(cols, row))
-
-        for n in nutrients:
-            totals[n] += (data[n] * qty) / 100
-
-        if data["allergen"] and data["allergen"] != "none":
-            allergens.update(data["allergen"].split(","))
-
-        if data["veg_type"] == "non-veg":
-            veg_type = "non-veg"
-
-        ingredient_list.append({"name": name, "quantity": qty})
-
-    conn.close()
-
-    # Determine normalization weight
-    normalization_weight = final_yield_weight if final_yield_weight > 0 else total_raw_weight
-    if normalization_weight <= 0:
-        normalization_weight = 1  # Prevent division by zero
-    show_disclaimer = final_yield_weight <= 0
-
-    # FSSAI requires values normalized per 100g of final yield matching weight
-    per_100g = {n: (totals[n] / normalization_weight) * 100 for n in nutrients}
-
-    # Calculate per serving
-    per_serving = {n: (per_100g[n] * serving_size_g) / 100 for n in nutrients}
-
-    # Sort ingredients descending by weight
-    ingredient_list.sort(key=lambda x: x["quantity"], reverse=True)
-
-    return {
-        "per_100g": per_100g,
-        "per_serving": per_serving,
-        "allergens": list(allergens),
-        "veg_type": veg_type,
-        "ingredients": ingredient_list,
-        "serving_size_g": serving_size_g,
-        "show_disclaimer": show_disclaimer,
-        "total_yield_weight": normalization_weight
-    }
+    recipe = RecipeAccumulator(store)
+    for item in standardized_ingredients:
+        recipe.add(item["name"], item["quantity"], resolved[item["name"]])
+    return recipe.result(final_yield_weight, serving_size_g)
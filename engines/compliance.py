@@ -1,3 +1,6 @@
+import re
+from functools import lru_cache
+
 # ─── Allergen Keyword Mapping (FSSAI 8 Major Allergen Categories) ───
 ALLERGEN_KEYWORDS = {
     "Gluten": [
@@ -43,16 +46,55 @@ ALLERGEN_KEYWORDS = {
 }
 
 
-def detect_allergens(ingredient_name):
-    """Detect allergens using case-insensitive substring matching."""
-    detected = []
-    name_lower = ingredient_name.lower()
-    for allergen, keywords in ALLERGEN_KEYWORDS.items():
+# Words that contain a keyword without containing the allergen. Everything
+# else matches by substring, so compounds like "soymilk", "peanutbutter" or
+# "eggnog" are still declared.
+ALLERGEN_EXCLUSIONS = [
+    "nutmeg", "coconut", "butternut", "nutritional",
+    "lentil", "distilled", "tortilla", "tilapia",
+    "buckwheat", "eggless", "eggplant", "codling"
+]
+
+
+def compile_allergen_pattern(keyword_table, exclusions=()):
+    """
+    Regexes for the whole keyword table, so a single scan of a name finds
+    every category. Returns (pattern, exclusion_pattern, {keyword: category}).
+
+    pattern finds every keyword occurrence, overlapping ones included, as a
+    substring (longest keyword first at each position); exclusion_pattern
+    matches the whole words (optionally pluralised) to blank out first.
+    """
+    categories = {}
+    for allergen, keywords in keyword_table.items():
         for keyword in keywords:
-            if keyword.lower() in name_lower:
-                detected.append(allergen)
-                break
-    return detected
+            categories.setdefault(" ".join(keyword.lower().split()), allergen)
+    alternation = "|".join(re.escape(k) for k in sorted(categories, key=len, reverse=True))
+    excluded = "|".join(re.escape(w.lower()) for w in sorted(exclusions, key=len, reverse=True)) or "(?!)"
+    return (re.compile(rf"(?=({alternation}))"), re.compile(rf"\b(?:{excluded})(?:s|es)?\b"),
+            categories)
+
+
+ALLERGEN_PATTERN, EXCLUSION_PATTERN, KEYWORD_CATEGORY = compile_allergen_pattern(
+    ALLERGEN_KEYWORDS, ALLERGEN_EXCLUSIONS)
+CATEGORY_ORDER = {allergen: i for i, allergen in enumerate(ALLERGEN_KEYWORDS)}
+
+
+@lru_cache(maxsize=16384)
+def _allergens_in(name):
+    name = EXCLUSION_PATTERN.sub(" ", name)
+    found = {KEYWORD_CATEGORY[m.group(1)] for m in ALLERGEN_PATTERN.finditer(name)}
+    return tuple(sorted(found, key=CATEGORY_ORDER.get))
+
+
+def detect_allergens(ingredient_name):
+    """
+    Allergen categories named in an ingredient, in ALLERGEN_KEYWORDS order.
+    Keywords match anywhere in the name, except inside the words listed in
+    ALLERGEN_EXCLUSIONS ("nutmeg" is not a nut, "lentil" is not sesame).
+    Results are cached per normalised name.
+    """
+    return list(_allergens_in(" ".join(ingredient_name.lower().split())))
 
 
 def apply_compliance(calculated_data):
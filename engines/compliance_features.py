@@ -1,107 +1,178 @@
-import sqlite3
 import os
+import json
+from functools import lru_cache
 
-def get_db_path():
-    return os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'nutrition.db')
+import numpy as np
+from engines.ingredient_store import get_store, NUTRIENTS
+from engines.reformulation import reformulate
 
-def validate_health_claims(per_100g: dict) -> dict:
+CLAIMS_FILE = os.path.join(os.path.dirname(__file__), 'data', 'health_claims.json')
+CLAIMS_FORMAT_VERSION = 1
+
+# Operator codes used in the compiled claim table
+LESS_THAN, GREATER_THAN, EQUAL = 0, 1, 2
+OPERATORS = {"<": LESS_THAN, ">": GREATER_THAN, "==": EQUAL}
+
+
+class ClaimTable:
+    """
+    The health claim thresholds compiled into parallel arrays: one entry per
+    claim with its threshold, operator code and the index of the nutrient it
+    tests in a per-100g vector laid out like NUTRIENTS.
+    """
+
+    def __init__(self, claims, version=CLAIMS_FORMAT_VERSION):
+        unknown = [c["nutrient"] for c in claims if c["nutrient"] not in NUTRIENTS]
+        if unknown:
+            raise ValueError(f"Unknown nutrient(s) in health claims: {', '.join(unknown)}")
+        self.version = version
+        self.claims = [c["claim"] for c in claims]
+        self.units = [c["unit"] for c in claims]
+        self.tips = [c["tip"] for c in claims]
+        # As written in the data file (3 stays 3), for the disqualified entries
+        self.threshold_values = [c["threshold"] for c in claims]
+        self.thresholds = np.array(self.threshold_values, dtype=np.float64)
+        self.operator_symbols = [c["operator"] for c in claims]
+        self.nutrients = [c["nutrient"] for c in claims]
+        self.operators = np.array([OPERATORS[c["operator"]] for c in claims], dtype=np.int8)
+        self.nutrient_index = np.array([NUTRIENTS.index(c["nutrient"]) for c in claims], dtype=np.intp)
+
+    def __len__(self):
+        return len(self.claims)
+
+    def evaluate(self, per_100g):
+        """
+        Check every claim against a (recipes, len(NUTRIENTS)) matrix of per-100g
+        vectors (a single vector works too). Returns (qualifies, gap): boolean
+        and float arrays of shape (recipes, claims), gap being how far each
+        value is from its threshold (0 where the claim qualifies).
+        """
+        values = np.atleast_2d(np.asarray(per_100g, dtype=np.float64))[:, self.nutrient_index]
+        diff = values - self.thresholds
+        less = self.operators == LESS_THAN
+        greater = self.operators == GREATER_THAN
+        qualifies = np.where(less, diff < 0, np.where(greater, diff > 0, diff == 0))
+        gap = np.where(less, np.fmax(0, diff), np.where(greater, np.fmax(0, -diff), np.abs(diff)))
+        return qualifies, gap
+
+
+def load_claim_table(path=None):
+    """Compile a health claims data file (CLAIMS_FILE by default) into a ClaimTable."""
+    with open(path or CLAIMS_FILE, encoding='utf-8') as f:
+        data = json.load(f)
+    version = data.get("version")
+    if version != CLAIMS_FORMAT_VERSION:
+        raise ValueError(f"Unsupported health claims file version: {version!r}")
+    return ClaimTable(data["claims"], version)
+
+
+@lru_cache(maxsize=1)
+def get_claim_table():
+    return load_claim_table()
+
+
+def evaluate_claims_batch(per_100g, table=None):
+    """
+    Vectorised health claim check for many recipes, e.g. the per_100g matrix
+    of calculate_nutrition_batch. Returns the (qualifies, gap) arrays of
+    ClaimTable.evaluate; columns follow table.claims.
+    """
+    return (table or get_claim_table()).evaluate(per_100g)
+
+
+def validate_health_claims(per_100g: dict, table=None) -> dict:
     """
     Validates the 13 FSSAI Health Claims against calculated per_100g values.
     Returns: { 'qualified': [...], 'disqualified': [...] }
     """
+    table = table or get_claim_table()
+
     qualified = []
     disqualified = []
-    
-    fat = per_100g.get('fat', 0)
-    sat_fat = per_100g.get('sat_fat', 0)
-    sodium = per_100g.get('sodium', 0)
-    energy = per_100g.get('energy', 0)
-    protein = per_100g.get('protein', 0)
-    added_sugar = per_100g.get('added_sugar', 0)
-    sugar = per_100g.get('sugar', 0)
-    trans_fat = per_100g.get('trans_fat', 0)
-
-    claims_registry = [
-        {"claim": "Low Fat", "value": fat, "threshold": 3, "operator": "<", "unit": "g", "tip": "Reduce butter, oil or ghee"},
-        {"claim": "Fat Free", "value": fat, "threshold": 0.5, "operator": "<", "unit": "g", "tip": "Remove all added fats"},
-        {"claim": "Low Saturated Fat", "value": sat_fat, "threshold": 1.5, "operator": "<", "unit": "g", "tip": "Replace butter/ghee with sunflower oil"},
-        {"claim": "Low Sodium", "value": sodium, "threshold": 120, "operator": "<", "unit": "mg", "tip": "Reduce or eliminate salt"},
-        {"claim": "Very Low Sodium", "value": sodium, "threshold": 40, "operator": "<", "unit": "mg", "tip": "Remove all sodium-containing ingredients"},
-        {"claim": "Sodium Free", "value": sodium, "threshold": 5, "operator": "<", "unit": "mg", "tip": "No salt or sodium additives allowed"},
-        {"claim": "Low Calorie", "value": energy, "threshold": 40, "operator": "<", "unit": "kcal", "tip": "Significantly reduce fats and sugars"},
-        {"claim": "High Protein", "value": protein, "threshold": 10, "operator": ">", "unit": "g", "tip": "Add whey powder, besan or soy protein isolate"},
-        {"claim": "Source of Protein", "value": protein, "threshold": 5, "operator": ">", "unit": "g", "tip": "Add eggs, milk solids or legume flour"},
-        {"claim": "No Added Sugar", "value": added_sugar, "threshold": 0, "operator": "==", "unit": "g", "tip": "Remove all sweeteners (sugar, jaggery, honey, syrups)"},
-        {"claim": "Low Sugar", "value": sugar, "threshold": 5, "operator": "<", "unit": "g", "tip": "Reduce all sweeteners in recipe"},
-        {"claim": "Sugar Free", "value": sugar, "threshold": 0.5, "operator": "<", "unit": "g", "tip": "Remove all sugars including natural fruit sugars"},
-        {"claim": "Trans Fat Free", "value": trans_fat, "threshold": 0.2, "operator": "<", "unit": "g", "tip": "Remove vanaspati and hydrogenated oils"}
-    ]
-    
-    for c in claims_registry:
-        val = c["value"]
-        thresh = c["threshold"]
-        
-        if c["operator"] == "==":
-            qualifies = (val == thresh)
-            gap = abs(val - thresh)
-        elif c["operator"] == "<":
-            qualifies = (val < thresh)
-            gap = max(0, val - thresh)
-        else: # ">"
-            qualifies = (val > thresh)
-            gap = max(0, thresh - val)
-            
-        if qualifies:
+
+    # One recipe: plain floats beat building arrays (same arithmetic as ClaimTable.evaluate)
+    for i, claim in enumerate(table.claims):
+        val = per_100g.get(table.nutrients[i], 0)
+        threshold = table.threshold_values[i]
+        diff = float(val) - float(threshold)
+        operator = table.operator_symbols[i]
+        if operator == "<":
+            ok, gap = diff < 0, max(0.0, diff)
+        elif operator == ">":
+            ok, gap = diff > 0, max(0.0, -diff)
+        else:
+            ok, gap = diff == 0, abs(diff)
+        if ok:
             qualified.append({
-                "claim": c["claim"],
+                "claim": claim,
                 "value": round(val, 2),
-                "unit": c["unit"]
+                "unit": table.units[i]
             })
         else:
             disqualified.append({
-                "claim": c["claim"],
+                "claim": claim,
                 "value": round(val, 2),
-                "threshold": thresh,
-                "gap": abs(round(gap, 2)),
-                "unit": c["unit"],
-                "tip": c["tip"]
+                "threshold": threshold,
+                "gap": round(gap, 2),
+                "unit": table.units[i],
+                "tip": table.tips[i]
             })
-            
+
     return {
         "qualified": qualified,
         "disqualified": disqualified
     }
 
-def suggest_sodium_fix(ingredients, per_100g_sodium, final_yield_weight, target_sodium=600):
+def claim_targets(claims, table=None):
+    """
+    (nutrient, operator, threshold) reformulation targets for health claim
+    names (case-insensitive), e.g. ["Low Sodium", "High Protein"].
+    """
+    table = table or get_claim_table()
+    by_name = {name.lower(): i for i, name in enumerate(table.claims)}
+    targets = []
+    for claim in claims:
+        i = by_name.get(claim.strip().lower())
+        if i is None:
+            raise ValueError(f"Unknown health claim: '{claim}'")
+        targets.append((NUTRIENTS[table.nutrient_index[i]], table.operator_symbols[i], table.threshold_values[i]))
+    return targets
+
+
+def suggest_sodium_fix(ingredients, per_100g_sodium, final_yield_weight, target_sodium=600, plan=None):
+    """
+    Sodium contributors and ingredient trims that bring sodium down to
+    `target_sodium` mg per 100g, or None if it is already there. The trims
+    are the smallest relative cuts, unless `plan` (a reformulate() result for
+    the same ingredients, with its "quantities") only trims and already meets
+    the target: then its cuts are the fix, which saves a second solve and
+    keeps the fix in line with the label's reformulation.
+    """
     if per_100g_sodium <= target_sodium:
         return None
-        
-    conn = sqlite3.connect(get_db_path())
-    cursor = conn.cursor()
-    
-    total_sodium_mg = (per_100g_sodium * final_yield_weight) / 100
-    target_total_sodium = (target_sodium * final_yield_weight) / 100
-    sodium_to_remove = total_sodium_mg - target_total_sodium
-    
+
+    store = get_store()
+
+    # No yield given: values are per 100g of the raw ingredients
+    total_weight = final_yield_weight if final_yield_weight > 0 else sum(i["quantity"] for i in ingredients)
+    total_sodium_mg = (per_100g_sodium * total_weight) / 100
+
     contributors = []
-    
+    sodium_per_100g = {}
+
     for item in ingredients:
         name = item["name"]
         qty = item["quantity"]
-        
-        # Query DB to get sodium for this exact ingredient name
-        cursor.execute("SELECT sodium FROM ingredients WHERE name=?", (name,))
-        row = cursor.fetchone()
-        if row is None:
-            # Fallback for LIKE query matches
-            cursor.execute("SELECT sodium FROM ingredients WHERE name LIKE ? LIMIT 1", (f"%{name}%",))
-            row = cursor.fetchone()
-            
-        if row and row[0] is not None:
-            ing_sodium_per_100g = row[0]
+
+        # Same exact-then-ranked-fuzzy resolution as calculate_nutrition
+        data = store.resolve(name)
+
+        if data is not None:
+            ing_sodium_per_100g = data["sodium"]
+            sodium_per_100g[name] = ing_sodium_per_100g
             if ing_sodium_per_100g > 0:
                 contribution_mg = (ing_sodium_per_100g * qty) / 100
-                percentage = (contribution_mg / total_sodium_mg) * 100
+                percentage = (contribution_mg / total_sodium_mg) * 100 if total_sodium_mg > 0 else 0
                 contributors.append({
                     "name": name,
                     "quantity": qty,
@@ -109,52 +180,34 @@ def suggest_sodium_fix(ingredients, per_100g_sodium, final_yield_weight, target_
                     "contribution_mg": contribution_mg,
                     "percentage": percentage
                 })
-                
-    conn.close()
-    
+
     # Sort descending by contribution
     contributors.sort(key=lambda x: x["contribution_mg"], reverse=True)
-    
+
+    reuse = plan is not None and plan["per_100g"]["sodium"] <= target_sodium and all(
+        new_qty <= item["quantity"] for item, new_qty in zip(ingredients, plan["quantities"]))
+    if not reuse:
+        # Trim only (max_scale=1): the smallest relative cuts that bring sodium to target
+        plan = reformulate(ingredients, final_yield_weight, [("sodium", "<=", target_sodium)],
+                           store=store, max_scale=1.0)
+
     fixes = []
-    remaining_to_remove = sodium_to_remove
-    
-    for c in contributors:
-        if remaining_to_remove <= 0.05: # practically 0
-            break
-            
-        name = c["name"]
-        current_amount = c["quantity"]
-        current_cont = c["contribution_mg"]
-        ing_sodium_per_100g = c["sodium_per_100g"]
-        
-        # We cap the reduction such that minimum amount is 0.1g
-        min_allowed_contribution = (ing_sodium_per_100g * 0.1) / 100
-        max_possible_removal = current_cont - min_allowed_contribution
-        
-        if max_possible_removal <= 0: # Can't remove any meaningful amount staying >= 0.1g
-             new_qty = 0.1
-             removed_from_this = max(0, current_cont - min_allowed_contribution)
-        else:
-            amount_to_remove_from_this = min(remaining_to_remove, max_possible_removal)
-            new_contribution = current_cont - amount_to_remove_from_this
-            new_qty = (new_contribution * 100) / ing_sodium_per_100g
-            removed_from_this = amount_to_remove_from_this
-            
-        remaining_to_remove -= removed_from_this
-        
-        fixes.append({
-            "name": name,
-            "old_qty": round(current_amount, 2),
-            "new_qty": round(new_qty, 2),
-            "sodium_removed": round(removed_from_this, 2),
-            "is_primary": "salt" in name.lower()
-        })
-        
-    # Check if fixed
-    new_total_sodium = total_sodium_mg - sum(f["sodium_removed"] for f in fixes)
-    new_sodium_per_100g = (new_total_sodium / final_yield_weight) * 100 if final_yield_weight > 0 else 0
+    for item, new_qty in zip(ingredients, plan["quantities"]):
+        name = item["name"]
+        removed = ((item["quantity"] - new_qty) * sodium_per_100g.get(name, 0)) / 100
+        if round(removed, 2) > 0:
+            fixes.append({
+                "name": name,
+                "old_qty": round(item["quantity"], 2),
+                "new_qty": round(new_qty, 2),
+                "sodium_removed": round(removed, 2),
+                "is_primary": "salt" in name.lower()
+            })
+    fixes.sort(key=lambda f: f["sodium_removed"], reverse=True)
+
+    new_sodium_per_100g = plan["per_100g"]["sodium"]
     is_fully_fixed = round(new_sodium_per_100g, 1) <= target_sodium
-    
+
     return {
         "current_sodium_100g": round(per_100g_sodium, 1),
         "contributors": contributors,
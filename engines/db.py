@@ -0,0 +1,489 @@
+"""
+Data layer: where the databases live, how connections are set up, and the
+schema of both.
+
+User data (accounts, history, settings, jobs) lives in the app database and
+the nutrient composition data (ingredients plus the USDA and parse caches)
+in the composition database, which seed_db.py / import_usda.py rebuild. The
+app connection ATTACHes the composition database, so one pooled connection
+per thread serves both. Paths are absolute and can be overridden with
+NUTRITION_APP_DB / NUTRITION_COMPOSITION_DB.
+
+Each database carries its schema version in PRAGMA user_version; migrate()
+brings it up to date once at startup instead of every request issuing
+CREATE TABLE IF NOT EXISTS.
+"""
+import os
+import json
+import zlib
+import sqlite3
+import threading
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DB = os.path.abspath(os.getenv("NUTRITION_APP_DB", os.path.join(PROJECT_ROOT, 'nutrition.db')))
+COMPOSITION_DB = os.path.abspath(os.getenv("NUTRITION_COMPOSITION_DB",
+                                           os.path.join(PROJECT_ROOT, 'database', 'nutrition.db')))
+COMPOSITION_SCHEMA = 'composition'
+
+# Applied once to every pooled connection (and every attached database). WAL
+# lets readers run alongside a writer; synchronous=NORMAL is durable across
+# app crashes in WAL mode and only skips the fsync per commit.
+PRAGMAS = (
+    "PRAGMA {schema}.journal_mode = WAL",
+    "PRAGMA {schema}.synchronous = NORMAL",
+    "PRAGMA {schema}.cache_size = -16384",      # 16 MiB page cache per connection
+    "PRAGMA {schema}.mmap_size = 268435456",    # 256 MiB memory-mapped reads
+)
+BUSY_TIMEOUT = 30
+CACHED_STATEMENTS = 256
+
+
+# ─── Schema ────────────────────────────────────────────────────
+# Append-only: entry N upgrades a database from user_version N to N + 1.
+# The first entries use IF NOT EXISTS so databases created before
+# versioning are adopted as they are.
+
+def _add_label_history_pdf_hash(conn):
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(label_history)')]
+    if 'pdf_hash' not in columns:
+        conn.execute('ALTER TABLE label_history ADD COLUMN pdf_hash TEXT')
+
+
+HISTORY_LIST_INDEX = '''
+    CREATE INDEX IF NOT EXISTS idx_label_history_user_created ON label_history (
+        user_id, created_at DESC, id DESC, product_name, compliance_score
+    )
+    '''
+LABEL_COUNTS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS label_counts (
+        user_id INTEGER PRIMARY KEY,
+        total INTEGER NOT NULL
+    )
+    '''
+LABEL_COUNTS_BACKFILL = '''
+    INSERT OR REPLACE INTO label_counts (user_id, total)
+    SELECT user_id, COUNT(*) FROM label_history GROUP BY user_id
+    '''
+LABEL_COUNTS_TRIGGERS = ('''
+    CREATE TRIGGER IF NOT EXISTS label_history_count_insert AFTER INSERT ON label_history
+    BEGIN
+        INSERT INTO label_counts (user_id, total) VALUES (NEW.user_id, 1)
+        ON CONFLICT(user_id) DO UPDATE SET total = total + 1;
+    END
+    ''', '''
+    CREATE TRIGGER IF NOT EXISTS label_history_count_delete AFTER DELETE ON label_history
+    BEGIN
+        UPDATE label_counts SET total = total - 1 WHERE user_id = OLD.user_id;
+    END
+    ''')
+
+
+# Migration 5's copy of engines/history_store.py's encoder as it stood when the
+# columnar layout was introduced. The live encoder may change with later
+# versions; this one must keep producing the version 5 layout.
+_V5_NUTRIENTS = ["energy", "protein", "carbs", "sugar", "added_sugar", "fat", "sat_fat", "trans_fat", "sodium"]
+_V5_SECTIONS = {"per_100g": "p100", "per_serving": "psrv"}
+_V5_COLUMNS = [f"{prefix}_{n}" for prefix in _V5_SECTIONS.values() for n in _V5_NUTRIENTS]
+_V5_DISPLAY_TYPES = {n: "int" if n in ("energy", "sodium") else "float" for n in _V5_NUTRIENTS}
+_V5_DISPLAY_TYPES.update(sat_fat="istr", trans_fat="istr")
+_V5_DEFAULT_ORDER = {
+    "per_100g": ["energy", "protein", "carbs", "sugar", "added_sugar", "fat", "sodium", "trans_fat", "sat_fat"],
+    "per_serving": ["energy", "protein", "carbs", "sugar", "added_sugar", "fat", "sodium", "sat_fat", "trans_fat"],
+}
+_V5_DECODERS = {
+    "int": int,
+    "float": float,
+    "istr": lambda number: str(int(number)) if number.is_integer() else repr(number),
+    "str": repr,
+}
+
+
+def _v5_encode_value(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        candidates = [(float(value), "int")]
+    elif isinstance(value, float):
+        candidates = [(value, "float")]
+    elif isinstance(value, str):
+        try:
+            number = float(value)
+        except ValueError:
+            return None
+        candidates = [(number, "istr"), (number, "str")]
+    else:
+        return None
+    for number, kind in candidates:
+        try:
+            decoded = _V5_DECODERS[kind](number)
+            if decoded == value and type(decoded) is type(value):
+                return number, kind
+        except (OverflowError, ValueError):
+            pass
+    return None
+
+
+def _v5_encode_label(label_data):
+    rest = dict(label_data)
+    rest.pop("pdf_url", None)
+    values = []
+    types = {}
+    order = {}
+    for section in _V5_SECTIONS:
+        table = label_data.get(section)
+        if not isinstance(table, dict):
+            values.extend([None] * len(_V5_NUTRIENTS))
+            continue
+        leftover = dict(table)
+        for n in _V5_NUTRIENTS:
+            encoded = _v5_encode_value(table[n]) if n in table else None
+            if encoded is None:
+                values.append(None)
+                continue
+            number, kind = encoded
+            values.append(number)
+            del leftover[n]
+            if kind != _V5_DISPLAY_TYPES[n]:
+                types[f"{section}.{n}"] = kind
+        rest[section] = leftover
+        rebuilt = [k for k in _V5_DEFAULT_ORDER[section] if k in table and k not in leftover] + list(leftover)
+        if list(table) != rebuilt:
+            order[section] = list(table)
+    if types:
+        rest["_types"] = types
+    if order:
+        rest["_order"] = order
+    blob = json.dumps(rest, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return tuple(values), zlib.compress(blob, 6)
+
+
+def _rebuild_label_history_columnar(conn):
+    """Re-encode every row's nutrition_json into the columnar layout (see engines/history_store.py)."""
+    conn.execute(f'''
+    CREATE TABLE label_history_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        product_name TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        compliance_score INTEGER NOT NULL,
+        pdf_filename TEXT NOT NULL,
+        pdf_hash TEXT,
+        {" ".join(f"{c} REAL," for c in _V5_COLUMNS)}
+        payload BLOB NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+    insert = (f"INSERT INTO label_history_new (id, user_id, product_name, created_at, compliance_score, "
+              f"pdf_filename, pdf_hash, {', '.join(_V5_COLUMNS)}, payload) "
+              f"VALUES ({', '.join('?' for _ in range(len(_V5_COLUMNS) + 8))})")
+    cursor = conn.execute('''
+        SELECT id, user_id, product_name, created_at, compliance_score, pdf_filename, pdf_hash, nutrition_json
+        FROM label_history ORDER BY id
+    ''')
+    while True:
+        rows = cursor.fetchmany(500)
+        if not rows:
+            break
+        batch = []
+        for row in rows:
+            values, blob = _v5_encode_label(json.loads(row[7]))
+            batch.append((*row[:7], *values, blob))
+        conn.executemany(insert, batch)
+    # Keep AUTOINCREMENT from reusing ids of rows deleted before the rebuild
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'label_history'").fetchone()
+    conn.execute('DROP TABLE label_history')
+    conn.execute('ALTER TABLE label_history_new RENAME TO label_history')
+    if seq:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'label_history'", (seq[0],))
+
+
+
+def _rebuild_analytics(conn):
+    from engines.analytics import rebuild
+    rebuild(conn)
+
+
+APP_MIGRATIONS = [
+    # 1: accounts, label history and per-user settings
+    ('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''', '''
+    CREATE TABLE IF NOT EXISTS label_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        product_name TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        compliance_score INTEGER NOT NULL,
+        pdf_filename TEXT NOT NULL,
+        nutrition_json TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''', '''
+    CREATE TABLE IF NOT EXISTS user_settings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER UNIQUE NOT NULL,
+        default_license TEXT DEFAULT '',
+        default_serving_size REAL DEFAULT 0,
+        default_company_name TEXT DEFAULT '',
+        default_address TEXT DEFAULT '',
+        email_notifications INTEGER DEFAULT 0,
+        score_alert INTEGER DEFAULT 1,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    '''),
+    # 2: durable queue for async label generation
+    ('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''',
+     'CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)'),
+    # 3: content-addressed label PDFs shared between history rows
+    ('''
+    CREATE TABLE IF NOT EXISTS label_blobs (
+        hash TEXT PRIMARY KEY,
+        refcount INTEGER NOT NULL,
+        size INTEGER NOT NULL
+    )
+    ''', _add_label_history_pdf_hash),
+    # 4: keyset pagination of history - covering index for the list columns
+    # and per-user row counts kept up to date by triggers
+    (HISTORY_LIST_INDEX, LABEL_COUNTS_TABLE, LABEL_COUNTS_BACKFILL, *LABEL_COUNTS_TRIGGERS),
+    # 5: typed nutrient columns + compressed payload instead of nutrition_json
+    (_rebuild_label_history_columnar, HISTORY_LIST_INDEX, *LABEL_COUNTS_TRIGGERS),
+    # 6: analytics aggregates (engines/analytics.py), backfilled from history
+    ('''
+    CREATE TABLE IF NOT EXISTS analytics_weekly (
+        user_id INTEGER NOT NULL,
+        week TEXT NOT NULL,
+        labels INTEGER NOT NULL,
+        score_sum INTEGER NOT NULL,
+        PRIMARY KEY (user_id, week)
+    )
+    ''', '''
+    CREATE TABLE IF NOT EXISTS analytics_sodium (
+        user_id INTEGER NOT NULL,
+        ingredient TEXT NOT NULL,
+        labels INTEGER NOT NULL,
+        contribution_mg REAL NOT NULL,
+        PRIMARY KEY (user_id, ingredient)
+    )
+    ''', '''
+    CREATE TABLE IF NOT EXISTS analytics_allergens (
+        user_id INTEGER NOT NULL,
+        allergen TEXT NOT NULL,
+        labels INTEGER NOT NULL,
+        PRIMARY KEY (user_id, allergen)
+    )
+    ''', _rebuild_analytics),
+    # 7: job leases - a job is only reclaimed once its worker stops renewing it
+    ('ALTER TABLE jobs ADD COLUMN worker_id TEXT',
+     'ALTER TABLE jobs ADD COLUMN lease_expires REAL'),
+]
+
+COMPOSITION_MIGRATIONS = [
+    # 1: per-100g composition data (IFCT 2017 seed + USDA imports)
+    ('''
+    CREATE TABLE IF NOT EXISTS ingredients (
+        name          TEXT PRIMARY KEY NOT NULL,
+        energy        REAL NOT NULL DEFAULT 0,
+        protein       REAL NOT NULL DEFAULT 0,
+        carbs         REAL NOT NULL DEFAULT 0,
+        sugar         REAL NOT NULL DEFAULT 0,
+        added_sugar   REAL NOT NULL DEFAULT 0,
+        fat           REAL NOT NULL DEFAULT 0,
+        sat_fat       REAL NOT NULL DEFAULT 0,
+        trans_fat     REAL NOT NULL DEFAULT 0,
+        sodium        REAL NOT NULL DEFAULT 0,
+        allergen      TEXT NOT NULL DEFAULT 'none',
+        veg_type      TEXT NOT NULL DEFAULT 'veg',
+        source        TEXT NOT NULL DEFAULT 'IFCT 2017'
+    )
+    ''',
+     'CREATE INDEX IF NOT EXISTS idx_ingredient_name ON ingredients(name)'),
+    # 2: USDA lookups (a NULL payload remembers a miss)
+    ('''
+    CREATE TABLE IF NOT EXISTS usda_cache (
+        query      TEXT PRIMARY KEY NOT NULL,
+        payload    TEXT,
+        fetched_at REAL NOT NULL
+    )
+    ''',),
+    # 3: LLM parse results
+    ('''
+    CREATE TABLE IF NOT EXISTS parse_cache (
+        key        TEXT PRIMARY KEY NOT NULL,
+        provider   TEXT NOT NULL,
+        model      TEXT NOT NULL,
+        result     TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used  REAL NOT NULL
+    )
+    ''',
+     'CREATE INDEX IF NOT EXISTS idx_parse_cache_last_used ON parse_cache(last_used)'),
+    # 4: standardized ingredient lists kept for /recalculate, moved out of
+    # parse_cache so they don't compete with LLM parses for its cap
+    ('''
+    CREATE TABLE IF NOT EXISTS recipe_cache (
+        key        TEXT PRIMARY KEY NOT NULL,
+        provider   TEXT NOT NULL,
+        model      TEXT NOT NULL,
+        result     TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used  REAL NOT NULL
+    )
+    ''',
+     'CREATE INDEX IF NOT EXISTS idx_recipe_cache_last_used ON recipe_cache(last_used)',
+     "INSERT OR IGNORE INTO recipe_cache SELECT * FROM parse_cache WHERE provider = 'standardized'",
+     "DELETE FROM parse_cache WHERE provider = 'standardized'"),
+]
+
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+
+def migrate(db_path, migrations):
+    """Apply any migrations newer than the database's user_version, in one transaction."""
+    path = os.path.abspath(db_path)
+    with _migrate_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version > len(migrations):
+                raise RuntimeError(f"{path} has schema version {version}, newer than this code "
+                                   f"({len(migrations)})")
+            for target, steps in enumerate(migrations[version:], start=version + 1):
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(f'PRAGMA user_version = {target}')
+            conn.execute('COMMIT')
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        _migrated.add(path)
+    return len(migrations)
+
+
+def ensure_schema(db_path, migrations):
+    """migrate() the first time a database is used in this process; a set lookup afterwards."""
+    if os.path.abspath(db_path) not in _migrated:
+        migrate(db_path, migrations)
+
+
+def init(app_db=None, composition_db=None):
+    """Startup: bring both databases to the current schema."""
+    migrate(app_db or APP_DB, APP_MIGRATIONS)
+    migrate(composition_db or COMPOSITION_DB, COMPOSITION_MIGRATIONS)
+
+
+# ─── Connections ───────────────────────────────────────────────
+
+_local = threading.local()
+# Pools a forked child inherited from its parent. SQLite handles must not be
+# used across fork(), nor closed in the child, so they are only kept alive here.
+_inherited = []
+
+
+def _reset_after_fork():
+    global _local
+    _inherited.append(_local)
+    _local = threading.local()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    A connection owned by one thread and reused for every query it makes.
+    close() only rolls back whatever the caller left uncommitted, so the
+    existing open/use/close call sites keep working unchanged; the real
+    close happens in close_all() or when the thread exits.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def really_close(self):
+        super().close()
+
+
+def connect(db_path, row_factory=None, attach=None):
+    """
+    Per-thread pooled connection to `db_path`, optionally with the database
+    at `attach` attached as `composition`. Prepared statements are kept in
+    the connection's statement cache, so repeated queries skip parsing.
+    A forked child (e.g. a batch worker) starts with an empty pool.
+    """
+    pool = getattr(_local, "pool", None)
+    if pool is None:
+        pool = _local.pool = {}
+    key = (os.path.abspath(db_path), row_factory, attach and os.path.abspath(attach))
+    conn = pool.get(key)
+    if conn is None:
+        conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, factory=PooledConnection,
+                               cached_statements=CACHED_STATEMENTS)
+        schemas = ['main']
+        if attach:
+            conn.execute(f'ATTACH DATABASE ? AS {COMPOSITION_SCHEMA}', (attach,))
+            schemas.append(COMPOSITION_SCHEMA)
+        for schema in schemas:
+            for pragma in PRAGMAS:
+                conn.execute(pragma.format(schema=schema))
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.row_factory = row_factory
+        pool[key] = conn
+    return conn
+
+
+def app_connection():
+    """The thread's connection to user data, with the composition tables attached."""
+    ensure_schema(APP_DB, APP_MIGRATIONS)
+    ensure_schema(COMPOSITION_DB, COMPOSITION_MIGRATIONS)
+    return connect(APP_DB, row_factory=sqlite3.Row, attach=COMPOSITION_DB)
+
+
+def composition_connection(db_path=None):
+    """
+    Connection for the composition tables. The configured composition
+    database is reached through the shared app connection (unqualified
+    names resolve to the attached schema); any other file - e.g. a test
+    fixture - gets its own pooled connection.
+    """
+    if db_path is None or os.path.abspath(db_path) == COMPOSITION_DB:
+        return app_connection()
+    ensure_schema(db_path, COMPOSITION_MIGRATIONS)
+    return connect(db_path)
+
+
+def close_all():
+    """Close every connection the calling thread holds (e.g. before deleting a database file)."""
+    pool = getattr(_local, "pool", None) or {}
+    for conn in pool.values():
+        conn.really_close()
+    pool.clear()
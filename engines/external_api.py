@@ -1,27 +1,123 @@
-import requests
+import os
+import json
+import time
+import threading
+from concurrent.futures import Future
+from engines import http_client
+from engines import db
+from engines.ingredient_store import get_db_path
+
+# Endpoint and key are overridable so tests (or a self-hosted mirror) can
+# point the fallback at a local server.
+USDA_API_URL = os.getenv("USDA_API_URL", "https://api.nal.usda.gov/fdc/v1/foods/search")
+USDA_API_KEY = os.getenv("USDA_API_KEY", "DEMO_KEY")
+
+# "Not found" answers are remembered for this long (seconds) before we ask again.
+NEGATIVE_TTL = float(os.getenv("USDA_NEGATIVE_TTL", 7 * 24 * 3600))
+
+
+class LookupCache:
+    """
+    On-disk cache of USDA search results, keyed by normalised query.
+    A NULL payload records a definitive miss; transport errors are never cached.
+    """
+
+    def __init__(self, db_path=None, negative_ttl=None):
+        self.db_path = db_path or get_db_path()
+        self.negative_ttl = NEGATIVE_TTL if negative_ttl is None else negative_ttl
+
+    def get(self, query):
+        """Return (cached, payload). payload is None for a remembered miss."""
+        conn = db.composition_connection(self.db_path)
+        row = conn.execute("SELECT payload, fetched_at FROM usda_cache WHERE query = ?", (query,)).fetchone()
+        conn.close()
+        if row is None:
+            return False, None
+        payload, fetched_at = row
+        if payload is None:
+            if time.time() - fetched_at > self.negative_ttl:
+                return False, None
+            return True, None
+        return True, json.loads(payload)
+
+    def put(self, query, payload):
+        conn = db.composition_connection(self.db_path)
+        conn.execute(
+            "INSERT OR REPLACE INTO usda_cache (query, payload, fetched_at) VALUES (?, ?, ?)",
+            (query, None if payload is None else json.dumps(payload), time.time())
+        )
+        conn.commit()
+        conn.close()
+
+
+_cache = None
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = LookupCache()
+    return _cache
+
 
 def search_ingredient_nutrition(ingredient_name):
     """
-    Queries the USDA FoodData Central API for the given ingredient name.
+    Looks up an ingredient in USDA FoodData Central, consulting the on-disk
+    cache first. Concurrent calls for the same name share one upstream request.
     Returns a dictionary mapping FSSAI fields to per-100g values, or None if not found.
     """
-    # Using the USDA DEMO_KEY. In a real production app, users should supply their own key.
+    query = ingredient_name.lower().strip()
+    cache = get_cache()
+    cached, payload = cache.get(query)
+    if cached:
+        return payload
+
+    with _inflight_lock:
+        future = _inflight.get(query)
+        leader = future is None
+        if leader:
+            future = _inflight[query] = Future()
+    if not leader:
+        return future.result()
+
+    try:
+        found, payload = _fetch_from_usda(ingredient_name)
+        if found is not None:
+            cache.put(query, payload)
+        future.set_result(payload)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(query, None)
+    return payload
+
+
+def _fetch_from_usda(ingredient_name):
+    """
+    Queries the USDA FoodData Central API for the given ingredient name.
+    Returns (found, payload): found is True/False for a definitive answer and
+    None when the request itself failed (so the miss is not cached).
+    """
+    # Using the USDA DEMO_KEY by default. In a real production app, users should supply their own key.
     # The DEMO_KEY has strict rate limits (30 requests/hr) but is sufficient for fallback test testing.
-    url = "https://api.nal.usda.gov/fdc/v1/foods/search"
     params = {
-        "api_key": "DEMO_KEY",
+        "api_key": USDA_API_KEY,
         "query": ingredient_name,
         "pageSize": 1, # Only get the top result to save bandwidth
         "dataType": "Foundation,SR Legacy" # Reliable, well-structured data types
     }
 
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = http_client.get("usda", USDA_API_URL, params=params)
         response.raise_for_status()
         data = response.json()
 
         if not data.get("foods") or len(data["foods"]) == 0:
-            return None
+            return False, None
 
         # Take the top matched product
         product = data["foods"][0]
@@ -59,7 +155,7 @@ def search_ingredient_nutrition(ingredient_name):
         # We'll default to 'none' and veg_type 'veg' as a conservative fallback payload
         # For a full commercial app, an NLP pass over the ingredient list string would be required.
         
-        return {
+        return True, {
             "name": ingredient_name.lower().strip(),
             "energy": round(energy, 2),
             "protein": round(protein, 2),
@@ -77,4 +173,4 @@ def search_ingredient_nutrition(ingredient_name):
 
     except Exception as e:
         print(f"Warning: Could not fetch from USDA API for '{ingredient_name}': {e}")
-        return None
+        return None, None
@@ -0,0 +1,175 @@
+import json
+import zlib
+from datetime import datetime, timezone
+from engines import analytics
+from engines.ingredient_store import NUTRIENTS
+
+# Nutrient tables stored as typed REAL columns; everything else in the label
+# payload goes into a zlib-compressed JSON blob.
+SECTIONS = {"per_100g": "p100", "per_serving": "psrv"}
+COLUMNS = [f"{prefix}_{n}" for prefix in SECTIONS.values() for n in NUTRIENTS]
+
+# How apply_compliance() emits each displayed value. A value of another
+# type is recorded as an override in the blob, so decoding is lossless.
+DISPLAY_TYPES = {n: "int" if n in ("energy", "sodium") else "float" for n in NUTRIENTS}
+DISPLAY_TYPES.update(sat_fat="istr", trans_fat="istr")
+# Key order apply_compliance() produces; any other order is recorded too.
+DEFAULT_ORDER = {
+    "per_100g": ["energy", "protein", "carbs", "sugar", "added_sugar", "fat", "sodium", "trans_fat", "sat_fat"],
+    "per_serving": ["energy", "protein", "carbs", "sugar", "added_sugar", "fat", "sodium", "sat_fat", "trans_fat"],
+}
+COMPRESSION_LEVEL = 6
+
+
+def _istr(number):
+    # "0" / "1.2" as rendered by apply_compliance for the fat thresholds
+    return str(int(number)) if number.is_integer() else repr(number)
+
+
+DECODERS = {"int": int, "float": float, "istr": _istr, "str": repr}
+
+
+def _encode_value(value):
+    """(number, type) that decodes back to exactly `value`, or None if it can't be a column."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        candidates = [(float(value), "int")]
+    elif isinstance(value, float):
+        candidates = [(value, "float")]
+    elif isinstance(value, str):
+        try:
+            number = float(value)
+        except ValueError:
+            return None
+        candidates = [(number, "istr"), (number, "str")]
+    else:
+        return None
+    for number, kind in candidates:
+        try:
+            decoded = DECODERS[kind](number)
+            if decoded == value and type(decoded) is type(value):
+                return number, kind
+        except (OverflowError, ValueError):
+            pass
+    return None
+
+
+def encode_label(label_data):
+    """
+    Split a label payload into (column values, compressed blob). Values that
+    don't fit a typed column (or aren't there) stay in the blob unchanged.
+    """
+    rest = dict(label_data)
+    rest.pop("pdf_url", None)
+    values = []
+    types = {}
+    order = {}
+    for section in SECTIONS:
+        table = label_data.get(section)
+        if not isinstance(table, dict):
+            values.extend([None] * len(NUTRIENTS))
+            continue
+        leftover = dict(table)
+        for n in NUTRIENTS:
+            encoded = _encode_value(table[n]) if n in table else None
+            if encoded is None:
+                values.append(None)
+                continue
+            number, kind = encoded
+            values.append(number)
+            del leftover[n]
+            if kind != DISPLAY_TYPES[n]:
+                types[f"{section}.{n}"] = kind
+        rest[section] = leftover
+        # decode_label() rebuilds column values in default order, then the leftovers
+        rebuilt = [k for k in DEFAULT_ORDER[section] if k in table and k not in leftover] + list(leftover)
+        if list(table) != rebuilt:
+            order[section] = list(table)
+    if types:
+        rest["_types"] = types
+    if order:
+        rest["_order"] = order
+    blob = json.dumps(rest, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return tuple(values), zlib.compress(blob, COMPRESSION_LEVEL)
+
+
+# Per section, in default key order: (name, index into the column values, default decoder)
+SECTION_FIELDS = {
+    section: [(n, i * len(NUTRIENTS) + NUTRIENTS.index(n), DECODERS[DISPLAY_TYPES[n]])
+              for n in DEFAULT_ORDER[section]]
+    for i, section in enumerate(SECTIONS)
+}
+
+
+def decode_label(values, blob):
+    """Inverse of encode_label()."""
+    data = json.loads(zlib.decompress(blob))
+    types = data.pop("_types", None)
+    order = data.pop("_order", None)
+    for section, fields in SECTION_FIELDS.items():
+        leftover = data.get(section)
+        if leftover is None:
+            continue
+        table = {}
+        for n, idx, decode in fields:
+            number = values[idx]
+            if number is not None:
+                if types and f"{section}.{n}" in types:
+                    decode = DECODERS[types[f"{section}.{n}"]]
+                table[n] = decode(number)
+        table.update(leftover)
+        if order and section in order:
+            table = {k: table[k] for k in order[section]}
+        data[section] = table
+    return data
+
+
+def label_from_row(row):
+    """Decode the label payload of a label_history row selected with `COLUMNS` and `payload`."""
+    return decode_label([row[c] for c in COLUMNS], row["payload"])
+
+
+INSERT_SQL = f'''
+    INSERT INTO label_history (user_id, product_name, created_at, compliance_score, pdf_filename, pdf_hash,
+                               {", ".join(COLUMNS)}, payload)
+    VALUES (?, ?, ?, ?, ?, ?, {", ".join("?" for _ in COLUMNS)}, ?)
+'''
+
+
+def utc_timestamp():
+    """Now, in the format SQLite's CURRENT_TIMESTAMP uses."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def history_row(user_id, product_name, compliance_score, pdf_filename, pdf_hash, label_data, created_at=None):
+    values, blob = encode_label(label_data)
+    return (user_id, product_name, created_at or utc_timestamp(), compliance_score, pdf_filename, pdf_hash,
+            *values, blob)
+
+
+def insert_label(conn, user_id, product_name, compliance_score, pdf_filename, pdf_hash, label_data):
+    """Insert one history row and count it in the analytics aggregates; returns its id."""
+    row = history_row(user_id, product_name, compliance_score, pdf_filename, pdf_hash, label_data)
+    cursor = conn.execute(INSERT_SQL, row)
+    analytics.record(conn, user_id, row[2], compliance_score, label_data)
+    return cursor.lastrowid
+
+
+def insert_labels(conn, user_id, entries):
+    """
+    Bulk insert_label(): `entries` are (product_name, compliance_score,
+    pdf_filename, pdf_hash, label_data) tuples, written with one executemany.
+    """
+    rows = [history_row(user_id, *entry) for entry in entries]
+    conn.executemany(INSERT_SQL, rows)
+    for row, entry in zip(rows, entries):
+        analytics.record(conn, user_id, row[2], entry[1], entry[4])
+    return len(rows)
+
+
+def delete_label(conn, record):
+    """Delete a history row (a full label_history row) and take it back out of the aggregates."""
+    conn.execute('DELETE FROM label_history WHERE id = ?', (record["id"],))
+    analytics.record(conn, record["user_id"], record["created_at"], record["compliance_score"],
+                     label_from_row(record), sign=-1)
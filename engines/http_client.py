@@ -0,0 +1,193 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+
+class ProviderPolicy:
+    """Timeouts, retry/backoff and circuit breaker settings for one upstream."""
+
+    def __init__(self, connect_timeout=3.05, read_timeout=30, max_retries=3,
+                 backoff_base=0.5, backoff_cap=8, max_retry_after=30,
+                 failure_threshold=5, reset_timeout=30):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_retry_after = max_retry_after
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed calls and rejects calls
+    for `reset_timeout` seconds; then lets a single trial call through
+    (half-open) and closes again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record(self, success):
+        with self._lock:
+            self._trial_in_flight = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if self.opened_at is not None or self.failures >= self.failure_threshold:
+                    self.opened_at = time.monotonic()
+
+
+POLICIES = {
+    "groq": ProviderPolicy(read_timeout=30),
+    "gemini": ProviderPolicy(read_timeout=30),
+    "usda": ProviderPolicy(read_timeout=10, max_retries=2),
+}
+_breakers = {}
+_session = None
+_lock = threading.Lock()
+
+
+def configure(provider, **settings):
+    """Register or replace the policy for a provider (also resets its breaker)."""
+    POLICIES[provider] = ProviderPolicy(**settings)
+    _breakers.pop(provider, None)
+
+
+def reset():
+    """Forget every circuit breaker's state (e.g. between tests)."""
+    with _lock:
+        _breakers.clear()
+
+
+def get_breaker(provider):
+    with _lock:
+        if provider not in _breakers:
+            policy = POLICIES[provider]
+            _breakers[provider] = CircuitBreaker(policy.failure_threshold, policy.reset_timeout)
+        return _breakers[provider]
+
+
+def get_session():
+    """Process-wide keep-alive session shared by every engine."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def retry_after_seconds(response):
+    """Seconds requested by a Retry-After header (delta or HTTP date), or None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(policy, attempt):
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(policy.backoff_cap, policy.backoff_base * (2 ** attempt)))
+
+
+def request(provider, method, url, **kwargs):
+    """
+    Send a request to `provider` through the shared session. Connection errors,
+    timeouts, 429 and 5xx responses are retried with jittered exponential
+    backoff (429/503 honour Retry-After). The final response is returned as
+    is, so callers keep using raise_for_status().
+    """
+    policy = POLICIES[provider]
+    breaker = get_breaker(provider)
+    if not breaker.allow():
+        raise CircuitOpenError(f"{provider} is temporarily unavailable (circuit open)")
+
+    kwargs.setdefault("timeout", policy.timeout)
+    session = get_session()
+    # Recorded however the call ends, so an unexpected exception (InvalidURL,
+    # ...) in a half-open trial does not leave the breaker waiting for it forever
+    success = False
+    try:
+        attempt = 0
+        while True:
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= policy.max_retries:
+                    raise
+                time.sleep(backoff_delay(policy, attempt))
+                attempt += 1
+                continue
+
+            if response.status_code not in RETRY_STATUSES:
+                success = True
+                return response
+
+            delay = backoff_delay(policy, attempt)
+            if response.status_code in (429, 503):
+                requested = retry_after_seconds(response)
+                if requested is not None:
+                    if requested > policy.max_retry_after:
+                        attempt = policy.max_retries  # not worth waiting; give up now
+                    delay = requested
+            if attempt >= policy.max_retries:
+                return response
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+    finally:
+        breaker.record(success)
+
+
+def get(provider, url, **kwargs):
+    return request(provider, "GET", url, **kwargs)
+
+
+def post(provider, url, **kwargs):
+    return request(provider, "POST", url, **kwargs)
@@ -0,0 +1,201 @@
+import sqlite3
+import threading
+from array import array
+from engines import db
+from engines.name_index import NameIndex
+
+NUTRIENTS = ["energy", "protein", "carbs", "sugar", "added_sugar",
+             "fat", "sat_fat", "trans_fat", "sodium"]
+COLUMNS = ["name"] + NUTRIENTS + ["allergen", "veg_type", "source"]
+
+
+def get_db_path():
+    return db.COMPOSITION_DB
+
+
+class _Columns:
+    """One generation of the store's data; load() builds a new one and swaps it in."""
+
+    __slots__ = ("names", "values", "allergens", "veg_types", "sources", "index", "name_index")
+
+    def __init__(self):
+        self.names = []
+        self.values = array('d')
+        self.allergens = []
+        self.veg_types = []
+        self.sources = []
+        self.index = {}
+        self.name_index = None
+
+    def append(self, row):
+        name = row[0]
+        if name in self.index:
+            # Keep the first row for a name, like `WHERE name=?` on a PK would.
+            return
+        self.index[name] = len(self.names)
+        self.names.append(name)
+        self.values.extend(float(v or 0) for v in row[1:1 + len(NUTRIENTS)])
+        self.allergens.append(row[1 + len(NUTRIENTS)])
+        self.veg_types.append(row[2 + len(NUTRIENTS)])
+        self.sources.append(row[3 + len(NUTRIENTS)])
+        if self.name_index is not None:
+            self.name_index.add(name)
+
+
+class IngredientStore:
+    """
+    Process-wide, read-mostly copy of the `ingredients` table.
+
+    Nutrient values live in a single row-major array('d') (len(NUTRIENTS)
+    doubles per ingredient) and the text columns in parallel lists, so a
+    lookup is one dict probe plus a slice - no SQL on the request path.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or get_db_path()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Bumped on every load/add so derived structures (e.g. the batch
+        # engine's NumPy matrix) know when to rebuild.
+        self.version = 0
+        self._columns = _Columns()
+
+    # The current generation's columns; a reload swaps in new ones rather than clearing these
+    names = property(lambda self: self._columns.names)
+    values = property(lambda self: self._columns.values)
+    allergens = property(lambda self: self._columns.allergens)
+    veg_types = property(lambda self: self._columns.veg_types)
+    sources = property(lambda self: self._columns.sources)
+    index = property(lambda self: self._columns.index)
+
+    def load(self):
+        """(Re)load every ingredient row from the database."""
+        conn = db.composition_connection(self.db_path)
+        try:
+            rows = conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM ingredients ORDER BY rowid"
+            ).fetchall()
+        except sqlite3.OperationalError:
+            # Composition DB not seeded yet; serve an empty store.
+            rows = []
+        finally:
+            conn.close()
+
+        # Built off to the side: lookups keep reading the old columns until the swap
+        columns = _Columns()
+        for row in rows:
+            columns.append(row)
+        with self._lock:
+            self._columns = columns
+            self.version += 1
+        return len(rows)
+
+    def add(self, record):
+        """Register a row that was just inserted into the DB (e.g. from the USDA fallback)."""
+        row = tuple(record[c] for c in COLUMNS)
+        with self._lock:
+            self._columns.append(row)
+            self.version += 1
+
+    def insert(self, records):
+        """Persist new rows with one executemany and make them visible in memory."""
+        if not records:
+            return
+        conn = db.composition_connection(self.db_path)
+        try:
+            with conn:
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO ingredients ({', '.join(COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                    [tuple(r[c] for c in COLUMNS) for r in records]
+                )
+        finally:
+            conn.close()
+        for record in records:
+            self.add(record)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def _record(self, idx, columns):
+        width = len(NUTRIENTS)
+        data = dict(zip(NUTRIENTS, columns.values[idx * width:(idx + 1) * width]))
+        data["name"] = columns.names[idx]
+        data["allergen"] = columns.allergens[idx]
+        data["veg_type"] = columns.veg_types[idx]
+        data["source"] = columns.sources[idx]
+        return data
+
+    def _count(self, found):
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, name):
+        """Exact-name lookup. Returns a column dict or None."""
+        columns = self._columns
+        idx = columns.index.get(name)
+        self._count(idx is not None)
+        return None if idx is None else self._record(idx, columns)
+
+    def _name_index(self, columns):
+        """Trigram index over the names, built on the first fuzzy lookup."""
+        if columns.name_index is None:
+            with self._lock:
+                if columns.name_index is None:
+                    columns.name_index = NameIndex(columns.names)
+        return columns.name_index
+
+    @property
+    def name_index(self):
+        return self._name_index(self._columns)
+
+    def candidates(self, name, limit=5):
+        """Ranked fuzzy matches for a name that has no exact row."""
+        columns = self._columns
+        return [(self._record(idx, columns), score) for idx, score in self._name_index(columns).search(name, limit)]
+
+    def match(self, name):
+        """Best fuzzy match for `name` (see NameIndex.search for the ranking), or None."""
+        columns = self._columns
+        found = self._name_index(columns).search(name, limit=1)
+        self._count(bool(found))
+        return self._record(found[0][0], columns) if found else None
+
+    def resolve(self, name):
+        """Exact lookup, falling back to the best fuzzy match."""
+        data = self.get(name)
+        if data is None:
+            data = self.match(name)
+        return data
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.names),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the shared store, loading it from the database on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = IngredientStore()
+                store.load()
+                _store = store
+    return _store
@@ -3,125 +3,174 @@ from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import mm
-import os
-
-def generate_pdf(label_data, output_path):
-    doc = SimpleDocTemplate(output_path, pagesize=A4,
-                            leftMargin=20*mm, rightMargin=20*mm,
-                            topMargin=20*mm, bottomMargin=20*mm)
-    styles = getSampleStyleSheet()
-    elements = []
-
-    # Title
-    title_style = ParagraphStyle("Title", fontSize=14, fontName="Helvetica-Bold",
-                                  alignment=1, spaceAfter=6)
-    elements.append(Paragraph("NUTRITION INFORMATION", title_style))
-    
-    # Check servings per pack safely
-    servings_per_pack = label_data.get('servings_per_pack', '1')
-    serving_size_g = label_data.get('serving_size_g', 100)
-    
-    elements.append(Paragraph(
-        f"Serving Size: {serving_size_g}g | Servings Per Pack: ~{servings_per_pack}",
-        styles["Normal"]
-    ))
-    elements.append(Spacer(1, 4*mm))
-
-    # Nutrition table data
-    per_100g = label_data.get('per_100g_display', {})
-    if not per_100g:
-        # Fallback if the key name is slightly different
-        per_100g = label_data.get('per_100g', {})
+import io
+import threading
+
+class LabelTemplate:
+    """
+    Everything about the label that doesn't depend on the product: paragraph
+    and table styles, column widths and the static flowables (title,
+    spacers, disclaimer). Built once and reused; only the values are filled
+    in per label.
+    """
+
+    def __init__(self):
+        styles = getSampleStyleSheet()
+        self.normal_style = styles["Normal"]
+        self.title_style = ParagraphStyle("Title", fontSize=14, fontName="Helvetica-Bold",
+                                          alignment=1, spaceAfter=6)
+        self.ingredients_style = ParagraphStyle("Ingredients", fontSize=10, leading=14)
+        self.bottom_style = ParagraphStyle("Bottom", fontSize=10, fontName="Helvetica-Bold", leading=14)
+        self.company_style = ParagraphStyle("Company", fontSize=9, leading=12)
+        self.disclaimer_style = ParagraphStyle("Disclaimer", fontSize=7, textColor=colors.grey)
+
+        self.col_widths = [90*mm, 40*mm, 50*mm]
+        self.table_style = TableStyle([
+            ("BACKGROUND",   (0,0), (-1,0), colors.HexColor("#1B3A6B")),
+            ("TEXTCOLOR",    (0,0), (-1,0), colors.white),
+            ("FONTNAME",     (0,0), (-1,0), "Helvetica-Bold"),
+            ("FONTSIZE",     (0,0), (-1,-1), 9),
+            ("GRID",         (0,0), (-1,-1), 0.5, colors.grey),
+            ("ROWBACKGROUNDS",(0,1), (-1,-1), [colors.white, colors.HexColor("#E8EEF6")]),
+            ("FONTNAME",     (0,1), (0,-1), "Helvetica-Bold"),
+            ("LEFTPADDING",  (0,4), (0,5), 16),   # Indent Sat Fat + Trans Fat
+            ("LEFTPADDING",  (0,7), (0,8), 16),   # Indent Total Sugars + Added Sugars
+        ])
+
+        self.title = Paragraph("NUTRITION INFORMATION", self.title_style)
+        self.gap_4mm = Spacer(1, 4*mm)
+        self.gap_2mm = Spacer(1, 2*mm)
+        self.disclaimer = Paragraph(
+            "* Nutritional values are estimated based on raw ingredient weights. "
+            "For certified accuracy, use lab-tested final product weight.",
+            self.disclaimer_style
+        )
+
+    def flowables(self, label_data):
+        elements = [self.title]
+
+        # Check servings per pack safely
+        servings_per_pack = label_data.get('servings_per_pack', '1')
+        serving_size_g = label_data.get('serving_size_g', 100)
+
+        elements.append(Paragraph(
+            f"Serving Size: {serving_size_g}g | Servings Per Pack: ~{servings_per_pack}",
+            self.normal_style
+        ))
+        elements.append(self.gap_4mm)
+
+        # Nutrition table data
+        per_100g = label_data.get('per_100g_display', {})
+        if not per_100g:
+            # Fallback if the key name is slightly different
+            per_100g = label_data.get('per_100g', {})
+            
+        per_serving = label_data.get('per_serving_display', {})
+        if not per_serving:
+            per_serving = label_data.get('per_serving', {})
+
+        table_data = [
+            ["Nutrient", "Per 100g", f"Per Serving ({serving_size_g}g)"],
+            ["Energy", f"{per_100g.get('energy', 0)} kcal", f"{per_serving.get('energy', 0)} kcal"],
+            ["Protein", f"{per_100g.get('protein', 0)} g", f"{per_serving.get('protein', 0)} g"],
+            ["Total Fat", f"{per_100g.get('fat', 0)} g", f"{per_serving.get('fat', 0)} g"],
+            ["  of which Saturated Fat", f"{per_100g.get('sat_fat', 0)} g", f"{per_serving.get('sat_fat', 0)} g"],
+            ["  of which Trans Fat", f"{per_100g.get('trans_fat', 0)} g", f"{per_serving.get('trans_fat', 0)} g"],
+            ["Carbohydrate", f"{per_100g.get('carbs', 0)} g", f"{per_serving.get('carbs', 0)} g"],
+            ["  of which Total Sugars", f"{per_100g.get('sugar', 0)} g", f"{per_serving.get('sugar', 0)} g"],
+            ["    of which Added Sugars", f"{per_100g.get('added_sugar', 0)} g", f"{per_serving.get('added_sugar', 0)} g"],
+            ["Sodium", f"{per_100g.get('sodium', 0)} mg", f"{per_serving.get('sodium', 0)} mg"],
+        ]
+
+        t = Table(table_data, colWidths=self.col_widths)
+        t.setStyle(self.table_style)
+        elements.append(t)
+        elements.append(self.gap_4mm)
+
+        # Ingredient list
+        ingredients_list = label_data.get("ingredients", [])
+        total_q = sum(x.get('quantity', 0) for x in ingredients_list)
+        if total_q == 0: total_q = 1  # prevent div by zero
         
-    per_serving = label_data.get('per_serving_display', {})
-    if not per_serving:
-        per_serving = label_data.get('per_serving', {})
-
-    table_data = [
-        ["Nutrient", "Per 100g", f"Per Serving ({serving_size_g}g)"],
-        ["Energy", f"{per_100g.get('energy', 0)} kcal", f"{per_serving.get('energy', 0)} kcal"],
-        ["Protein", f"{per_100g.get('protein', 0)} g", f"{per_serving.get('protein', 0)} g"],
-        ["Total Fat", f"{per_100g.get('fat', 0)} g", f"{per_serving.get('fat', 0)} g"],
-        ["  of which Saturated Fat", f"{per_100g.get('sat_fat', 0)} g", f"{per_serving.get('sat_fat', 0)} g"],
-        ["  of which Trans Fat", f"{per_100g.get('trans_fat', 0)} g", f"{per_serving.get('trans_fat', 0)} g"],
-        ["Carbohydrate", f"{per_100g.get('carbs', 0)} g", f"{per_serving.get('carbs', 0)} g"],
-        ["  of which Total Sugars", f"{per_100g.get('sugar', 0)} g", f"{per_serving.get('sugar', 0)} g"],
-        ["    of which Added Sugars", f"{per_100g.get('added_sugar', 0)} g", f"{per_serving.get('added_sugar', 0)} g"],
-        ["Sodium", f"{per_100g.get('sodium', 0)} mg", f"{per_serving.get('sodium', 0)} mg"],
-    ]
-
-    t = Table(table_data, colWidths=[90*mm, 40*mm, 50*mm])
-    t.setStyle(TableStyle([
-        ("BACKGROUND",   (0,0), (-1,0), colors.HexColor("#1B3A6B")),
-        ("TEXTCOLOR",    (0,0), (-1,0), colors.white),
-        ("FONTNAME",     (0,0), (-1,0), "Helvetica-Bold"),
-        ("FONTSIZE",     (0,0), (-1,-1), 9),
-        ("GRID",         (0,0), (-1,-1), 0.5, colors.grey),
-        ("ROWBACKGROUNDS",(0,1), (-1,-1), [colors.white, colors.HexColor("#E8EEF6")]),
-        ("FONTNAME",     (0,1), (0,-1), "Helvetica-Bold"),
-        ("LEFTPADDING",  (0,4), (0,5), 16),   # Indent Sat Fat + Trans Fat
-        ("LEFTPADDING",  (0,7), (0,8), 16),   # Indent Total Sugars + Added Sugars
-    ]))
-    elements.append(t)
-    elements.append(Spacer(1, 4*mm))
-
-    # Ingredient list
-    ingredients_list = label_data.get("ingredients", [])
-    total_q = sum(x.get('quantity', 0) for x in ingredients_list)
-    if total_q == 0: total_q = 1  # prevent div by zero
-    
-    item_strings = []
-    for i in ingredients_list:
-        name = i.get('name', '').title()
-        pct = round(i.get('quantity', 0) / total_q * 100)
-        item_strings.append(f"{name} ({pct}%)")
+        item_strings = []
+        for i in ingredients_list:
+            name = i.get('name', '').title()
+            pct = round(i.get('quantity', 0) / total_q * 100)
+            item_strings.append(f"{name} ({pct}%)")
+            
+        ingredient_text = "Ingredients: " + ", ".join(item_strings)
+        
+        elements.append(Paragraph(ingredient_text, self.ingredients_style))
+        elements.append(self.gap_2mm)
+
+        # Allergen statement
+        elements.append(Paragraph(label_data.get("allergen_statement", "No known allergens"), self.ingredients_style))
+        elements.append(self.gap_2mm)
+
+        # Veg symbol + License
+        veg_type = label_data.get("veg_type", "veg")
+        veg_symbol_color = "🟢" if veg_type == "veg" else "🟤"
+        veg_symbol_text = "VEGETARIAN" if veg_type == "veg" else "NON-VEGETARIAN"
+        
+        fssai_license = label_data.get('fssai_license', '')
+        if not fssai_license or not fssai_license.strip():
+            fssai_license = 'To Be Updated'
         
-    ingredient_text = "Ingredients: " + ", ".join(item_strings)
-    
-    ingredients_style = ParagraphStyle("Ingredients", fontSize=10, leading=14)
-    elements.append(Paragraph(ingredient_text, ingredients_style))
-    elements.append(Spacer(1, 2*mm))
-
-    # Allergen statement
-    elements.append(Paragraph(label_data.get("allergen_statement", "No known allergens"), ingredients_style))
-    elements.append(Spacer(1, 2*mm))
-
-    # Veg symbol + License
-    veg_type = label_data.get("veg_type", "veg")
-    veg_symbol_color = "🟢" if veg_type == "veg" else "🟤"
-    veg_symbol_text = "VEGETARIAN" if veg_type == "veg" else "NON-VEGETARIAN"
-    
-    fssai_license = label_data.get('fssai_license', '')
-    if not fssai_license or not fssai_license.strip():
-        fssai_license = 'To Be Updated'
-    
-    bottom_style = ParagraphStyle("Bottom", fontSize=10, fontName="Helvetica-Bold", leading=14)
-    elements.append(Paragraph(
-        f"{veg_symbol_color} {veg_symbol_text}          FSSAI Lic. No.: {fssai_license}",
-        bottom_style
-    ))
-    
-    # Company name and manufacturer address
-    company_name = label_data.get('company_name', '')
-    manufacturer_address = label_data.get('manufacturer_address', '')
-    
-    if company_name or manufacturer_address:
-        elements.append(Spacer(1, 2*mm))
-        company_style = ParagraphStyle("Company", fontSize=9, leading=12)
-        if company_name:
-            elements.append(Paragraph(f"<b>Manufactured by:</b> {company_name}", company_style))
-        if manufacturer_address:
-            elements.append(Paragraph(f"<b>Address:</b> {manufacturer_address}", company_style))
-
-    # Disclaimer if raw weight used
-    if label_data.get("show_disclaimer"):
-        disclaimer_style = ParagraphStyle("Disclaimer", fontSize=7, textColor=colors.grey)
-        elements.append(Spacer(1, 4*mm))
         elements.append(Paragraph(
-            "* Nutritional values are estimated based on raw ingredient weights. "
-            "For certified accuracy, use lab-tested final product weight.",
-            disclaimer_style
+            f"{veg_symbol_color} {veg_symbol_text}          FSSAI Lic. No.: {fssai_license}",
+            self.bottom_style
         ))
+        
+        # Company name and manufacturer address
+        company_name = label_data.get('company_name', '')
+        manufacturer_address = label_data.get('manufacturer_address', '')
+        
+        if company_name or manufacturer_address:
+            elements.append(self.gap_2mm)
+            if company_name:
+                elements.append(Paragraph(f"<b>Manufactured by:</b> {company_name}", self.company_style))
+            if manufacturer_address:
+                elements.append(Paragraph(f"<b>Address:</b> {manufacturer_address}", self.company_style))
+
+        # Disclaimer if raw weight used
+        if label_data.get("show_disclaimer"):
+            elements.append(self.gap_4mm)
+            elements.append(self.disclaimer)
+
+        return elements
+
+    def render(self, label_data, output):
+        """
+        Build the label into `output` (a path or a writable binary file object).
+        Invariant mode pins the creation date and document id, so the same
+        label data always renders to the same bytes.
+        """
+        doc = SimpleDocTemplate(output, pagesize=A4,
+                                leftMargin=20*mm, rightMargin=20*mm,
+                                topMargin=20*mm, bottomMargin=20*mm,
+                                invariant=1)
+        doc.build(self.flowables(label_data))
+        return output
+
+
+# Flowables carry layout state while a document is being built, so each
+# thread gets its own template rather than sharing one across threads.
+_templates = threading.local()
+
+
+def get_template():
+    template = getattr(_templates, "template", None)
+    if template is None:
+        template = _templates.template = LabelTemplate()
+    return template
+
+
+def generate_pdf(label_data, output_path, template=None):
+    return (template or get_template()).render(label_data, output_path)
+
 
-    doc.build(elements)
-    return output_path
+def render_pdf_bytes(label_data, template=None):
+    """Render a label entirely in memory and return the PDF bytes."""
+    buffer = io.BytesIO()
+    generate_pdf(label_data, buffer, template)
+    return buffer.getvalue()
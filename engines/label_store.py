@@ -0,0 +1,182 @@
+import os
+import json
+import uuid
+import sqlite3
+import hashlib
+import threading
+from engines import db
+
+# Default location of the PDF store, and the cap on PDFs no history row references.
+# With LABEL_CACHE_MAX_MB=0 unreferenced PDFs are dropped straight away.
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance', 'label_cache')
+MAX_BYTES = int(float(os.getenv("LABEL_CACHE_MAX_MB", 256)) * 1024 * 1024)
+
+
+def label_hash(label_data):
+    """Content address of a label: SHA-256 of the canonical JSON of everything the PDF is rendered from."""
+    payload = {k: v for k, v in label_data.items() if k != 'pdf_url'}
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def retain_blob(conn, key, size):
+    """Count one more history row pointing at blob `key` (inside the caller's transaction)."""
+    conn.execute('''
+        INSERT INTO label_blobs (hash, refcount, size) VALUES (?, 1, ?)
+        ON CONFLICT(hash) DO UPDATE SET refcount = refcount + 1
+    ''', (key, size))
+
+
+def release_blob(conn, key):
+    """Drop one reference to blob `key`; True when that was the last one."""
+    conn.execute('UPDATE label_blobs SET refcount = refcount - 1 WHERE hash = ?', (key,))
+    row = conn.execute('SELECT refcount FROM label_blobs WHERE hash = ?', (key,)).fetchone()
+    if row is not None and row[0] > 0:
+        return False
+    conn.execute('DELETE FROM label_blobs WHERE hash = ?', (key,))
+    return True
+
+
+class LabelCache:
+    """
+    Content-addressed PDF store: one `<hash>.pdf` file per distinct label,
+    shared by every history row with the same content.
+
+    Blobs referenced from `label_blobs` (in the app database at `db_path`)
+    are pinned and only go away when their last reference is released.
+    Everything else is cache: reads touch the file's mtime, and writes evict
+    the least recently used unpinned files once they pass `max_bytes`.
+    Anything evicted can be re-rendered from the stored label payload.
+
+    The unpinned total is kept as a running count (one directory scan when
+    the cache is first used), so a put costs a single refcount lookup; the
+    directory is only rescanned, and the count resynced, when it is time to
+    evict.
+    """
+
+    def __init__(self, directory=None, max_bytes=None, db_path=None):
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # key -> (size, pinned) for the files this process knows about
+        self._files = None
+        self._unpinned_bytes = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, data):
+        """Store `data` under `key`; an existing blob is reused (same hash, same bytes)."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            # Write to a temp name and rename so readers never see a partial PDF
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+            size = len(data)
+        # Looked up on every put, which also picks up a retain_blob() since
+        # the file was first written
+        pinned = self.is_pinned(key)
+        with self._lock:
+            self._load()
+            self._forget(key)
+            self._files[key] = (size, pinned)
+            if not pinned:
+                self._unpinned_bytes += size
+            over = self._unpinned_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def remove(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            if self._files is not None:
+                self._forget(key)
+
+    def _forget(self, key):
+        size, pinned = self._files.pop(key, (0, True))
+        if not pinned:
+            self._unpinned_bytes -= size
+
+    def _load(self):
+        if self._files is None:
+            self._files, self._unpinned_bytes, _ = self._scan()
+
+    def _scan(self):
+        """({key: (size, pinned)}, unpinned bytes, {key: mtime}) from the directory and label_blobs."""
+        pinned = self.pinned()
+        files, mtimes = {}, {}
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pdf'):
+                key = entry.name[:-4]
+                st = entry.stat()
+                files[key] = (st.st_size, key in pinned)
+                mtimes[key] = st.st_mtime
+        return files, sum(size for size, is_pinned in files.values() if not is_pinned), mtimes
+
+    def is_pinned(self, key):
+        if self.db_path is None:
+            return False
+        conn = db.connect(self.db_path)
+        try:
+            row = conn.execute('SELECT refcount FROM label_blobs WHERE hash = ?', (key,)).fetchone()
+            return row is not None and row[0] > 0
+        except sqlite3.OperationalError:
+            return False
+        finally:
+            conn.close()
+
+    def pinned(self):
+        if self.db_path is None:
+            return set()
+        conn = db.connect(self.db_path)
+        try:
+            return {row[0] for row in conn.execute('SELECT hash FROM label_blobs WHERE refcount > 0')}
+        except sqlite3.OperationalError:
+            return set()
+        finally:
+            conn.close()
+
+    def evict(self):
+        """Drop least recently used unpinned files until they fit in max_bytes, resyncing the count."""
+        with self._lock:
+            files, total, mtimes = self._scan()
+            entries = sorted((mtimes[key], key) for key, (_, pinned) in files.items() if not pinned)
+            for _, key in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self.path(key))
+                except FileNotFoundError:
+                    pass
+                total -= files.pop(key)[0]
+            self._files, self._unpinned_bytes = files, total
+
+
+_cache = None
+
+
+def get_label_cache():
+    global _cache
+    if _cache is None:
+        _cache = LabelCache(db_path=db.APP_DB)
+    return _cache
@@ -0,0 +1,133 @@
+import re
+from engines.parser import UNIT_MAP
+from engines.ingredient_store import get_store
+
+# Spellings we accept for each unit in UNIT_MAP
+UNIT_ALIASES = {
+    "g": ["g", "gm", "gms", "gram", "grams", "gr"],
+    "kg": ["kg", "kgs", "kilo", "kilos", "kilogram", "kilograms"],
+    "mg": ["mg", "milligram", "milligrams"],
+    "l": ["l", "ltr", "ltrs", "litre", "litres", "liter", "liters"],
+    "ml": ["ml", "millilitre", "millilitres", "milliliter", "milliliters"],
+    "tbsp": ["tbsp", "tbsps", "tbs", "tablespoon", "tablespoons"],
+    "tsp": ["tsp", "tsps", "teaspoon", "teaspoons"],
+    "cup": ["cup", "cups"],
+    "piece": ["piece", "pieces", "pc", "pcs"],
+    "whole": ["whole"],
+}
+UNITS = {alias: unit for unit, aliases in UNIT_ALIASES.items() for alias in aliases}
+assert set(UNIT_ALIASES) == set(UNIT_MAP)
+
+# Preparation words the LLM is told to drop from names
+PREP_WORDS = {
+    "chopped", "diced", "sliced", "minced", "grated", "fresh", "finely",
+    "roughly", "roasted", "toasted", "raw", "peeled", "crushed", "powdered"
+}
+
+UNICODE_FRACTIONS = {"½": 0.5, "¼": 0.25, "¾": 0.75, "⅓": 1 / 3, "⅔": 2 / 3}
+
+_QTY = r"(?:\d+(?:\.\d+)?\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?\s*[½¼¾⅓⅔]?|[½¼¾⅓⅔])"
+_UNIT = r"[a-z]+\.?"
+
+# "500g almonds", "2 tbsp of ghee", "1 1/2 cups milk"
+QTY_FIRST = re.compile(rf"^(?P<qty>{_QTY})\s*(?P<unit>{_UNIT})\s+(?:of\s+)?(?P<name>[^\d].*?)$")
+# "almonds 500g", "salt - 10 g", "ghee: 2 tbsp"
+NAME_FIRST = re.compile(rf"^(?P<name>[^\d].*?)\s*[:\-–]?\s+(?P<qty>{_QTY})\s*(?P<unit>{_UNIT})$")
+
+# Lines are split on newlines and semicolons; a line is only split further on
+# commas that aren't decimal separators when every piece parses locally
+_LINE_SPLIT = re.compile(r"[\n;]")
+_COMMA_SPLIT = re.compile(r",(?!\d)")
+
+
+def parse_quantity(text):
+    text = text.strip()
+    total = 0.0
+    for part in text.split():
+        if part[-1] in UNICODE_FRACTIONS:
+            total += UNICODE_FRACTIONS[part[-1]]
+            part = part[:-1]
+            if not part:
+                continue
+        if "/" in part:
+            num, den = part.split("/")
+            if float(den) == 0:
+                return None
+            total += float(num) / float(den)
+        else:
+            total += float(part)
+    return total
+
+
+def canonical_name(name, store):
+    """Map a raw name onto an exact `ingredients` row name, or None if we aren't sure."""
+    words = [w for w in re.sub(r"[^a-z\s]", " ", name.lower()).split() if w not in PREP_WORDS]
+    if not words:
+        return None
+    candidate = " ".join(words)
+    forms = [candidate]
+    if candidate.endswith("es"):
+        forms.append(candidate[:-2])
+    if candidate.endswith("s"):
+        forms.append(candidate[:-1])
+    for form in forms:
+        if form in store:
+            return form
+    return None
+
+
+def parse_line(line, store=None):
+    """
+    Parse one ingredient line into the LLM output format
+    ({"name", "quantity", "unit"}), or return None when it is not a
+    form we handle with certainty (the caller then asks the LLM).
+    """
+    store = store or get_store()
+    text = " ".join(line.strip().strip(".").lower().split())
+    if not text:
+        return None
+    for pattern in (QTY_FIRST, NAME_FIRST):
+        m = pattern.match(text)
+        if not m:
+            continue
+        unit = UNITS.get(m.group("unit").rstrip("."))
+        if unit is None:
+            continue
+        qty = parse_quantity(m.group("qty"))
+        if not qty or qty <= 0:
+            continue
+        name = canonical_name(m.group("name"), store)
+        if name is None:
+            continue
+        return {"name": name, "quantity": round(qty, 4), "unit": unit}
+    return None
+
+
+def split_items(raw_text):
+    return [item.strip() for item in _LINE_SPLIT.split(raw_text) if item.strip()]
+
+
+def parse_locally(raw_text, store=None):
+    """
+    Returns (parsed, leftovers): `parsed` is a list of (position, item) for
+    the lines handled locally, `leftovers` a list of (position, line) that
+    still need the LLM.
+
+    "500g almonds, 10g salt" is two items, but in "200g paneer, cubed" the
+    comma belongs to the ingredient: a line with a piece we can't parse goes
+    to the LLM whole, so it keeps that context.
+    """
+    store = store or get_store()
+    parsed, leftovers = [], []
+    pos = 0
+    for line in split_items(raw_text):
+        pieces = [piece.strip() for piece in _COMMA_SPLIT.split(line) if piece.strip()]
+        items = [parse_line(piece, store) for piece in pieces]
+        if items and all(item is not None for item in items):
+            for item in items:
+                parsed.append((pos, item))
+                pos += 1
+        else:
+            leftovers.append((pos, line))
+            pos += 1
+    return parsed, leftovers
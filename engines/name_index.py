@@ -0,0 +1,115 @@
+import heapq
+
+# Candidates whose trigram similarity to the query falls below this are not
+# considered a match (same idea as pg_trgm's similarity_threshold, but stricter
+# since a wrong match silently produces a wrong label). Every word of the query
+# must also be this similar to some word of the name, so "brown sugar" is not
+# taken for "sugar": an unknown name goes to the external lookup instead.
+SIMILARITY_THRESHOLD = 0.6
+
+# Trigrams shared by more names than this carry almost no signal ("  s", "ed ")
+# and are skipped when gathering fuzzy candidates.
+MAX_POSTINGS = 5000
+
+
+def trigrams(text, padded=True):
+    """Return the set of character trigrams of `text`, word by word."""
+    grams = set()
+    for word in text.lower().split():
+        if padded:
+            word = f"  {word} "
+        for i in range(len(word) - 2):
+            grams.add(word[i:i + 3])
+    return grams
+
+
+def _word_similarity(a, b):
+    return len(a & b) / len(a | b)
+
+
+def _substring_grams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class NameIndex:
+    """
+    Trigram inverted index over ingredient names.
+
+    `search()` ranks candidates deterministically:
+      1. names containing the query as a substring (what `LIKE '%q%'` matched),
+         whole-word matches first, then the closest in length, then alphabetical;
+      2. otherwise names whose trigram similarity is >= SIMILARITY_THRESHOLD
+         and that have a similar word for every word of the query, highest
+         similarity first, then shortest, then alphabetical.
+    """
+
+    def __init__(self, names=()):
+        self.names = []
+        self.postings = {}     # unpadded trigram -> set of ids (substring search)
+        self.word_postings = {}  # padded trigram -> set of ids (similarity search)
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        idx = len(self.names)
+        self.names.append(name)
+        for g in _substring_grams(name):
+            self.postings.setdefault(g, set()).add(idx)
+        for g in trigrams(name):
+            self.word_postings.setdefault(g, set()).add(idx)
+        return idx
+
+    def __len__(self):
+        return len(self.names)
+
+    def _substring_candidates(self, query):
+        grams = _substring_grams(query)
+        if not grams:
+            # Too short to index; fall back to a scan.
+            return [i for i, n in enumerate(self.names) if query in n.lower()]
+        lists = sorted((self.postings.get(g, set()) for g in grams), key=len)
+        if not lists[0]:
+            return []
+        ids = set(lists[0])
+        for posting in lists[1:]:
+            ids &= posting
+            if not ids:
+                return []
+        return [i for i in ids if query in self.names[i].lower()]
+
+    def search(self, query, limit=5):
+        """Return up to `limit` (id, score) pairs, best first."""
+        query = " ".join(query.lower().split())
+        if not query:
+            return []
+
+        hits = self._substring_candidates(query)
+        if hits:
+            def substring_rank(i):
+                name = self.names[i].lower()
+                whole_word = query in name.split() or f" {query} " in f" {name} "
+                return (not whole_word, len(name) - len(query), name)
+            ranked = heapq.nsmallest(limit, hits, key=substring_rank)
+            return [(i, 1.0) for i in ranked]
+
+        query_grams = trigrams(query)
+        shared = {}
+        for g in query_grams:
+            posting = self.word_postings.get(g)
+            if not posting or len(posting) > MAX_POSTINGS:
+                continue
+            for i in posting:
+                shared[i] = shared.get(i, 0) + 1
+
+        query_words = [trigrams(word) for word in query.split()]
+        scored = []
+        for i, common in shared.items():
+            name_grams = trigrams(self.names[i])
+            score = common / len(query_grams | name_grams)
+            if score < SIMILARITY_THRESHOLD:
+                continue
+            name_words = [trigrams(word) for word in self.names[i].split()]
+            if all(any(_word_similarity(q, n) >= SIMILARITY_THRESHOLD for n in name_words) for q in query_words):
+                scored.append((-score, len(self.names[i]), self.names[i], i))
+        return [(i, round(-neg, 4)) for neg, _, _, i in heapq.nsmallest(limit, scored)]
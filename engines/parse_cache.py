@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from engines import db
+from engines.ingredient_store import get_db_path
+
+# Maximum number of cached parses kept on disk; least recently used go first.
+MAX_ENTRIES = int(os.getenv("PARSE_CACHE_MAX_ENTRIES", 5000))
+# Same for the standardized ingredient lists kept for /recalculate
+RECIPE_MAX_ENTRIES = int(os.getenv("RECIPE_CACHE_MAX_ENTRIES", 1000))
+
+
+def normalize_recipe_text(raw_text):
+    """Canonical form used for hashing: NFC, lowercase, one space between words, no blank lines."""
+    text = unicodedata.normalize("NFC", raw_text).lower()
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def cache_key(raw_text, provider, model):
+    payload = f"{provider}\x00{model}\x00{normalize_recipe_text(raw_text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ParseCache:
+    """
+    SQLite-backed LRU cache of LLM parse results keyed by content hash.
+    `table` is parse_cache, or recipe_cache for the standardized lists kept
+    by engines/pipeline.py, which has its own cap and counters.
+    """
+
+    def __init__(self, db_path=None, max_entries=None, table="parse_cache"):
+        self.db_path = db_path or get_db_path()
+        self.max_entries = MAX_ENTRIES if max_entries is None else max_entries
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        conn = db.composition_connection(self.db_path)
+        row = conn.execute(f"SELECT result FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            conn.execute(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+        conn.close()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if row is None else json.loads(row[0])
+
+    def put(self, key, provider, model, result):
+        now = time.time()
+        conn = db.composition_connection(self.db_path)
+        with conn:
+            conn.execute(f'''
+                INSERT OR REPLACE INTO {self.table} (key, provider, model, result, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (key, provider, model, json.dumps(result), now, now))
+            # Evict least recently used entries beyond the cap
+            conn.execute(f'''
+                DELETE FROM {self.table} WHERE key IN (
+                    SELECT key FROM {self.table} ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,))
+        conn.close()
+
+    def __len__(self):
+        conn = db.composition_connection(self.db_path)
+        count = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        conn.close()
+        return count
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+_cache = None
+_recipe_cache = None
+
+
+def get_parse_cache():
+    global _cache
+    if _cache is None:
+        _cache = ParseCache()
+    return _cache
+
+
+def get_recipe_cache():
+    global _recipe_cache
+    if _recipe_cache is None:
+        _recipe_cache = ParseCache(max_entries=RECIPE_MAX_ENTRIES, table="recipe_cache")
+    return _recipe_cache
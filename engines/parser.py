@@ -1,7 +1,8 @@
 import os
 import json
-import requests
+from engines import http_client
 from dotenv import load_dotenv
+from engines.parse_cache import get_parse_cache, cache_key
 
 load_dotenv()
 
@@ -9,13 +10,55 @@ load_dotenv()
 # The original guide specified Groq, which uses OpenAI-compatible endpoints.
 LLM_API_KEY = os.getenv("LLM_API_KEY")
 
+GROQ_MODEL = "llama-3.1-8b-instant" # Updated reliable Groq model
+GEMINI_MODEL = "gemini-1.5-flash"
+
+def llm_provider():
+    """Return (provider, model) for the configured key: Groq keys start with gsk_."""
+    if LLM_API_KEY and LLM_API_KEY.startswith("gsk_"):
+        return "groq", GROQ_MODEL
+    return "gemini", GEMINI_MODEL
+
+def parse_cache_key(raw_text):
+    """Content hash identifying a parse of `raw_text` by the configured provider/model."""
+    return cache_key(raw_text, *llm_provider())
+
 def retry_parse(raw_text):
-    return parse_ingredients(raw_text, retries=1)
+    return parse_with_llm(raw_text, retries=1)
+
+def parse_ingredients(raw_text):
+    """
+    Parse a free-text recipe into [{"name", "quantity", "unit"}, ...].
+    Lines in a simple "<qty> <unit> <known ingredient>" form are handled by the
+    local rule-based parser; only the remaining lines are sent to the LLM.
+    """
+    from engines.local_parser import parse_locally
+
+    parsed, leftovers = parse_locally(raw_text)
+    if not leftovers:
+        return [item for _, item in parsed]
 
-def parse_ingredients(raw_text, retries=0):
+    llm_items = parse_with_llm("\n".join(line for _, line in leftovers))
+
+    # Put the LLM's items where the first line it handled used to be
+    merged = [(pos, [item]) for pos, item in parsed]
+    merged.append((leftovers[0][0], llm_items))
+    merged.sort(key=lambda x: x[0])
+    return [item for _, items in merged for item in items]
+
+def parse_with_llm(raw_text, retries=0):
     if not LLM_API_KEY:
         raise ValueError("LLM API key missing. Please check your .env configuration.")
 
+    # Unchanged ingredient text (e.g. only serving size was tweaked) skips the LLM entirely
+    provider, model = llm_provider()
+    key = cache_key(raw_text, provider, model)
+    cache = get_parse_cache()
+    if retries == 0:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
     prompt = f"""
 You are a precise food ingredient parser.
 Extract: ingredient name, numeric quantity, unit.
@@ -28,13 +71,14 @@ Input:
 """
     try:
         # Check if it's a Gemini key or Groq key
-        if LLM_API_KEY.startswith("gsk_"):
+        if provider == "groq":
             # It's a Groq key
-            response = requests.post(
+            response = http_client.post(
+                provider,
                 "https://api.groq.com/openai/v1/chat/completions",
                 headers={"Authorization": f"Bearer {LLM_API_KEY}"},
                 json={
-                    "model": "llama-3.1-8b-instant", # Updated reliable Groq model
+                    "model": model,
                     "messages": [{"role": "user", "content": prompt}],
                     "temperature": 0
                 }
@@ -43,8 +87,9 @@ Input:
             result = response.json()["choices"][0]["message"]["content"]
         else:
             # Assume it's a Gemini key using the Google Generative AI REST endpoint
-            response = requests.post(
-                f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={LLM_API_KEY}",
+            response = http_client.post(
+                provider,
+                f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={LLM_API_KEY}",
                 headers={"Content-Type": "application/json"},
                 json={
                     "contents": [{"parts":[{"text": prompt}]}],
@@ -71,6 +116,7 @@ Input:
             if float(item["quantity"]) <= 0:
                 raise ValueError(f"Invalid quantity for {item['name']}. Must be greater than 0.")
                 
+        cache.put(key, provider, model, parsed_data)
         return parsed_data
 
     except json.JSONDecodeError:
@@ -85,19 +131,22 @@ Input:
             error_details += f" | Details: {e.response.text}"
         raise ValueError(f"Error communicating with LLM logic: {error_details}")
 
+# Grams per unit; shared with the local fast-path parser
+UNIT_MAP = {
+    "kg": 1000, 
+    "mg": 0.001, 
+    "l": 1000,
+    "tbsp": 15, 
+    "tsp": 5, 
+    "cup": 200,
+    "piece": 50, 
+    "whole": 50,
+    "ml": 1,
+    "g": 1
+}
+
 def standardize_units(parsed_list):
-    unit_map = {
-        "kg": 1000, 
-        "mg": 0.001, 
-        "l": 1000,
-        "tbsp": 15, 
-        "tsp": 5, 
-        "cup": 200,
-        "piece": 50, 
-        "whole": 50,
-        "ml": 1,
-        "g": 1
-    }
+    unit_map = UNIT_MAP
     
     standardized = []
     for item in parsed_list:
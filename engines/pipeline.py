@@ -0,0 +1,345 @@
+import os
+import copy
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from engines.parser import parse_ingredients, standardize_units, llm_provider
+from engines.parse_cache import get_recipe_cache, cache_key
+from engines.calculator import calculate_nutrition, RecipeAccumulator
+from engines.compliance import apply_compliance
+from engines.compliance_features import validate_health_claims, suggest_sodium_fix, claim_targets
+from engines.ingredient_store import get_store
+from engines.reformulation import reformulate
+
+# Recipes whose per-100g analysis is kept in memory for /recalculate
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", 256))
+# Parsed recipes whose running totals are kept for /recalculate quantity edits
+WHAT_IF_CACHE_SIZE = int(os.getenv("WHAT_IF_CACHE_SIZE", 64))
+# recipe_cache provider tag for standardized ingredient lists (see remember_parse)
+PARSE_PROVIDER = "standardized"
+
+
+def label_inputs(form):
+    """
+    Everything compute_label reads from the form except the recipe text:
+    validated product details, serving/pack/yield weights and the
+    reformulation targets. Raises ValueError for bad input.
+    """
+    product_name = form.get('product_name', 'Unnamed Product')
+    try:
+        serving_size_g = float(form.get('serving_size', 30) or 30)
+        net_weight_g = float(form.get('net_weight', 100) or 100)
+    except TypeError:
+        raise ValueError("Serving size and net weight must be numbers.")
+    # JSON bodies (/recalculate) may send the number itself
+    fssai_license = str(form.get('fssai_license') or '')
+
+    # Validate FSSAI license: if provided, must be exactly 14 digits
+    if fssai_license.strip() and not (fssai_license.strip().isdigit() and len(fssai_license.strip()) == 14):
+        raise ValueError("FSSAI License Number must be exactly 14 digits if provided.")
+
+    target_claims = form.get('target_claims') or ''
+    if isinstance(target_claims, str):
+        target_claims = target_claims.split(',')
+    if not isinstance(target_claims, list) or not all(isinstance(c, str) for c in target_claims):
+        raise ValueError("target_claims must be claim names, e.g. \"Low Fat, Low Sugar\".")
+    target_claims = [c for c in target_claims if c.strip()]
+    # Sodium limit plus any requested claims; unknown claim names are a ValueError
+    targets = [("sodium", "<=", 600)] + claim_targets(target_claims)
+
+    use_raw_weight = form.get('use_raw_weight') in ('on', True)
+    yield_weight_str = form.get('total_weight', form.get('yield_weight', '0'))
+    try:
+        final_yield_weight = 0 if use_raw_weight else float(yield_weight_str or 0)
+    except TypeError:
+        raise ValueError("Total weight must be a number.")
+
+    # Guard against division by zero
+    if serving_size_g <= 0:
+        serving_size_g = 30
+    if net_weight_g <= 0:
+        net_weight_g = 100
+
+    return {
+        "product_name": product_name,
+        "serving_size_g": serving_size_g,
+        "net_weight_g": net_weight_g,
+        "fssai_license": fssai_license,
+        "final_yield_weight": final_yield_weight,
+        "targets": targets
+    }
+
+
+def compute_label(form, company_name='', manufacturer_address='', keep_parse=False):
+    """
+    Pure label pipeline for one product: parse, standardize, calculate,
+    comply, claims, sodium fix and compliance score. `form` is anything with
+    a dict-style .get() using the /generate form field names; the optional
+    `target_claims` field (comma-separated claim names) adds those claims to
+    the reformulation targets.
+    No PDF, no database writes - callers (the web app, the job workers and
+    the batch runner) decide where the PDF and history row go. With
+    `keep_parse` the standardized ingredients are remembered for
+    /recalculate and the label gets their "parse_id".
+    Returns (compliant_data, compliance_score). Raises ValueError for bad input.
+    """
+    # 1. Collect inputs
+    inputs = label_inputs(form)
+    raw_recipe = form.get('ingredients', '')
+
+    if not raw_recipe.strip():
+        raise ValueError("Ingredients are required")
+
+    # 2. Parse and Standardize
+    parsed_json = parse_ingredients(raw_recipe)
+    standardized_ingredients = standardize_units(parsed_json)
+
+    compliant_data, compliance_score = label_from_ingredients(
+        standardized_ingredients, inputs, company_name, manufacturer_address)
+    if keep_parse:
+        compliant_data["parse_id"] = remember_parse(raw_recipe, standardized_ingredients)
+    return compliant_data, compliance_score
+
+
+def remember_parse(raw_recipe, standardized_ingredients):
+    """Keep a standardized ingredient list in the recipe cache; returns its parse id."""
+    model = "/".join(llm_provider())
+    parse_id = cache_key(raw_recipe, PARSE_PROVIDER, model)
+    get_recipe_cache().put(parse_id, PARSE_PROVIDER, model, standardized_ingredients)
+    return parse_id
+
+
+def load_parse(parse_id):
+    """Standardized ingredients remembered under `parse_id`, or None once evicted."""
+    return get_recipe_cache().get(parse_id)
+
+
+def recipe_ingredients(payload):
+    """
+    The standardized ingredient list for a /recalculate payload: its
+    "ingredients" ([{"name", "quantity"}] in grams, or that list as JSON text)
+    or the list remembered under its "parse_id", with the optional
+    "quantities" edits ({name: grams}; 0 drops the ingredient) applied.
+    Raises ValueError for bad input.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Send a JSON object.")
+    if payload.get('parse_id'):
+        if not isinstance(payload['parse_id'], str):
+            raise ValueError("parse_id must be the string /generate returned.")
+        ingredients = load_parse(payload['parse_id'])
+        if ingredients is None:
+            raise ValueError("Unknown or expired parse_id; send the ingredients instead.")
+    else:
+        ingredients = payload.get('ingredients')
+        if isinstance(ingredients, str):
+            try:
+                ingredients = json.loads(ingredients)
+            except json.JSONDecodeError:
+                raise ValueError("ingredients must be a JSON list of {name, quantity} objects.")
+        if not isinstance(ingredients, list) or not ingredients:
+            raise ValueError("Send a parse_id or a non-empty ingredients list.")
+
+    edits = payload.get('quantities') or {}
+    if isinstance(edits, str):
+        try:
+            edits = json.loads(edits)
+        except json.JSONDecodeError:
+            raise ValueError("quantities must be a JSON object of {name: grams}.")
+
+    standardized = []
+    try:
+        for item in ingredients:
+            name = str(item["name"]).lower().strip()
+            standardized.append({"name": name, "quantity": float(item["quantity"])})
+        edits = {str(name).lower().strip(): float(qty) for name, qty in edits.items()}
+    except (KeyError, TypeError, ValueError, AttributeError):
+        raise ValueError("Ingredients need a name and a numeric quantity in grams.")
+
+    unknown = set(edits) - {item["name"] for item in standardized}
+    if unknown:
+        raise ValueError(f"Not in this recipe: {', '.join(sorted(unknown))}")
+    for item in standardized:
+        item["quantity"] = edits.get(item["name"], item["quantity"])
+    if any(item["quantity"] < 0 for item in standardized):
+        raise ValueError("Quantities cannot be negative.")
+    standardized = [item for item in standardized if item["quantity"] > 0]
+    if not standardized:
+        raise ValueError("Ingredients are required")
+    return standardized
+
+
+# parse_id -> (store version, RecipeAccumulator, [name, grams, line key or None] per parsed line)
+_what_if = OrderedDict()
+_what_if_lock = threading.Lock()
+
+
+def edited_nutrition(parse_id, standardized_ingredients, final_yield_weight, serving_size_g):
+    """
+    calculate_nutrition for recipe_ingredients()'s edit of the recipe
+    remembered under `parse_id`. The parsed recipe's RecipeAccumulator is
+    kept (LRU, WHAT_IF_CACHE_SIZE) and only the lines whose quantity changed
+    since the previous edit are updated. Falls back to a full calculation
+    when the parse has been evicted or the list is not an edit of it.
+    """
+    store = get_store()
+    with _what_if_lock:
+        entry = _what_if.get(parse_id)
+        if entry is None or entry[0] != store.version:
+            base = load_parse(parse_id)
+            if not base:
+                return calculate_nutrition(standardized_ingredients, final_yield_weight, serving_size_g)
+            recipe = RecipeAccumulator(store)
+            entry = (store.version, recipe,
+                     [[str(item["name"]).lower().strip(), 0, None] for item in base])
+            _what_if[parse_id] = entry
+            if len(_what_if) > WHAT_IF_CACHE_SIZE:
+                _what_if.popitem(last=False)
+        _what_if.move_to_end(parse_id)
+        _, recipe, lines = entry
+
+        # recipe_ingredients keeps the parsed order and only drops lines
+        quantities = []
+        edited = iter(standardized_ingredients)
+        item = next(edited, None)
+        for name, _, _ in lines:
+            if item is not None and item["name"] == name:
+                quantities.append(item["quantity"])
+                item = next(edited, None)
+            else:
+                quantities.append(0)
+        if item is not None:
+            return calculate_nutrition(standardized_ingredients, final_yield_weight, serving_size_g)
+
+        for line, quantity in zip(lines, quantities):
+            name, current, key = line
+            if quantity == current:
+                continue
+            if key is None and quantity:
+                line[2] = recipe.add(name, quantity)
+            elif key is not None and not quantity:
+                recipe.remove(key)
+                line[2] = None
+            elif key is not None:
+                recipe.set_quantity(key, quantity)
+            line[1] = quantity
+        return recipe.result(final_yield_weight, serving_size_g)
+
+
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def _analyse(ingredients, final_yield_weight, targets, store_version, parse_id=None):
+    standardized_ingredients = [{"name": name, "quantity": qty} for name, qty in ingredients]
+    # Per-serving values are derived per call; 100g makes them equal to per_100g here
+    if parse_id:
+        calc_data = edited_nutrition(parse_id, standardized_ingredients, final_yield_weight, 100)
+    else:
+        calc_data = calculate_nutrition(standardized_ingredients, final_yield_weight, 100)
+
+    health_claims = validate_health_claims(calc_data['per_100g'])
+
+    # Minimal-change recipe meeting the targets (no changes if it already does)
+    reformulation = reformulate(standardized_ingredients, final_yield_weight, list(targets))
+
+    sodium_fix = None
+    if calc_data['per_100g']['sodium'] > 600:
+        # Solves again only if the reformulation does not already trim sodium below the limit
+        sodium_fix = suggest_sodium_fix(
+            standardized_ingredients,
+            calc_data['per_100g']['sodium'],
+            final_yield_weight,
+            plan=reformulation
+        )
+    reformulation.pop("quantities")
+    return calc_data, health_claims, sodium_fix, reformulation
+
+
+def analyse_recipe(standardized_ingredients, final_yield_weight, targets, parse_id=None):
+    """
+    Everything that depends only on the recipe, its yield and the targets:
+    per-100g nutrition, health claims, sodium fix and reformulation. Results
+    are memoised (per ingredient store version), so edits that only touch
+    serving size, pack weight or product details skip all of it. With the
+    `parse_id` the recipe came from, quantity edits update its running
+    totals (edited_nutrition) instead of recalculating every line.
+    Returns fresh copies the caller may modify.
+    """
+    key = tuple((item["name"], item["quantity"]) for item in standardized_ingredients)
+    return copy.deepcopy(_analyse(key, final_yield_weight, tuple(targets), get_store().version, parse_id))
+
+
+def label_from_ingredients(standardized_ingredients, inputs, company_name='', manufacturer_address='',
+                           parse_id=None):
+    """
+    Steps 3-5 of compute_label for an already standardized ingredient list
+    and label_inputs(). Used directly by /recalculate, which never re-parses
+    and passes the parse_id its list was edited from (see analyse_recipe).
+    Returns (compliant_data, compliance_score).
+    """
+    serving_size_g = inputs["serving_size_g"]
+    final_yield_weight = inputs["final_yield_weight"]
+
+    # Calculate servings per pack
+    servings_per_pack = max(1, round(inputs["net_weight_g"] / serving_size_g))
+
+    # 3. Calculate Nutrition
+    calc_data, health_claims, sodium_fix, reformulation = analyse_recipe(
+        standardized_ingredients, final_yield_weight, inputs["targets"], parse_id)
+    calc_data['serving_size_g'] = serving_size_g
+    calc_data['per_serving'] = {n: (v * serving_size_g) / 100 for n, v in calc_data['per_100g'].items()}
+
+    # 4. Apply Compliance (Rounding, formatting, allergens)
+    compliant_data = apply_compliance(calc_data)
+
+    # Merge form data with compliant data
+    compliant_data.update({
+        "product_name": inputs["product_name"],
+        "serving_size_g": serving_size_g,
+        "servings_per_pack": servings_per_pack,
+        "net_weight_g": inputs["net_weight_g"],
+        "fssai_license": inputs["fssai_license"],
+        "final_yield_weight": final_yield_weight,
+        "health_claims": health_claims,
+        "sodium_fix": sodium_fix,
+        "reformulation": reformulation
+    })
+    
+    compliant_data["company_name"] = company_name
+    compliant_data["manufacturer_address"] = manufacturer_address
+
+    # 5. Calculate Compliance Score
+    compliance_score = 100
+    compliance_warnings = []
+    
+    # Subtract 20 if sodium > 600mg per 100g
+    if float(calc_data['per_100g'].get('sodium', 0)) > 600:
+        compliance_score -= 20
+        compliance_warnings.append('Sodium exceeds 600mg per 100g')
+        
+    # Subtract 10 if trans fat > 0.2g per serving
+    if float(calc_data['per_serving'].get('trans_fat', 0)) > 0.2:
+        compliance_score -= 10
+        compliance_warnings.append('Trans fat exceeds 0.2g per serving')
+        
+    # Subtract 10 if any mandatory nutrient value is missing or zero.
+    mandatory = ['energy', 'protein', 'carbs', 'sugar', 'fat', 'sat_fat', 'trans_fat', 'sodium']
+    missing_or_zero = False
+    for n in mandatory:
+        val = float(calc_data['per_100g'].get(n, 0))
+        if val == 0:
+            missing_or_zero = True
+            break
+    
+    if missing_or_zero:
+        compliance_score -= 10
+        compliance_warnings.append('One or more mandatory nutrients are missing or zero')
+        
+    # Subtract 10 if FSSAI license number was not provided
+    if not inputs["fssai_license"].strip():
+        compliance_score -= 10
+        compliance_warnings.append('Add your FSSAI license number before printing on final packaging')
+        
+    compliance_score = max(0, compliance_score)
+    compliant_data['compliance_warnings'] = compliance_warnings
+    
+    return compliant_data, compliance_score
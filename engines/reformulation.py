@@ -0,0 +1,268 @@
+"""
+Minimal-change recipe reformulation.
+
+Given a recipe and per-100g targets ("sodium <= 600", "protein > 10", ...),
+find the ingredient quantities closest to the original that meet all of
+them. Closeness is the sum of squared relative changes, so trimming 1g of
+a 2g pinch costs as much as trimming 100g of a 200g base.
+
+Per-100g values are taken over the final yield, and the cooking loss (or
+water gain) of the recipe is assumed to stay the same in grams. Each target
+is then an affine constraint on the quantities:
+
+    sum(q_i * n_i) / (yield - raw + sum(q_i)) <= T
+    <=>  sum(q_i * (n_i - T)) <= T * (yield - raw)
+
+which makes the problem a small QP with a diagonal objective, box bounds
+and a handful of affine constraints. It is solved in the dual: for fixed
+multipliers every quantity has a closed form (the unconstrained optimum
+clipped to its bounds), and the multipliers are maximised one at a time
+(exactly - the dual is piecewise quadratic along each of them), cycling
+until they settle.
+"""
+from itertools import combinations
+
+import numpy as np
+from engines.ingredient_store import get_store, NUTRIENTS
+from engines.batch_calculator import composition_matrix
+
+# Smallest amount an ingredient is trimmed to (it stays in the recipe)
+MIN_QUANTITY = 0.1
+# How far an ingredient may be scaled up to meet a ">" target
+MAX_SCALE = 2.0
+# Targets are solved for with this much room per 100g, so "<" / ">" hold
+# strictly and "<=" / ">=" survive rounding in the solve
+MARGIN = 1e-3
+
+MAX_SWEEPS = 20
+TOLERANCE = 1e-9
+# Cap on the (row-normalised) multipliers. Bounded multipliers turn an
+# infeasible set of targets into the smallest achievable total violation
+# instead of a diverging solve.
+MAX_MULTIPLIER = 1e9
+# Largest number of constraints whose model step is solved exactly
+MAX_EXACT_MODEL = 6
+
+
+def _line_max(c, step, a, b, lower, upper):
+    """
+    The t in [0, MAX_MULTIPLIER] where a @ clip(c - step * t) - b reaches 0,
+    i.e. the exact maximiser of the dual along one multiplier. That function
+    is piecewise linear and non-increasing in t, so it is evaluated at its
+    breakpoints and interpolated inside the piece that crosses zero.
+    """
+    def violation(t):
+        return np.clip(c[:, None] - step[:, None] * t, lower[:, None], upper[:, None]).T @ a - b
+
+    if violation(np.zeros(1))[0] <= 0:
+        return 0.0
+    moving = step != 0
+    knots = np.concatenate([(c - lower)[moving] / step[moving], (c - upper)[moving] / step[moving]])
+    knots = np.unique(np.clip(knots[knots > 0], 0, MAX_MULTIPLIER))
+    knots = np.concatenate([[0.0], knots, [MAX_MULTIPLIER]])
+    values = violation(knots)
+    k = np.argmax(values <= 0)
+    if values[k] > 0:
+        return MAX_MULTIPLIER
+    t0, t1, v0, v1 = knots[k - 1], knots[k], values[k - 1], values[k]
+    return float(t0 + (t1 - t0) * v0 / (v0 - v1))
+
+
+def _model_multipliers(hessian, rhs):
+    """
+    argmax of rhs @ x - x @ hessian @ x / 2 over x >= 0: the dual's quadratic
+    model for a fixed set of clipped quantities. There are only a handful of
+    constraints, so every support set is tried and the best non-negative
+    stationary point kept.
+    """
+    best, best_value = np.zeros(len(rhs)), 0.0
+    if len(rhs) > MAX_EXACT_MODEL:
+        candidates = [range(len(rhs))]
+    else:
+        candidates = (support for k in range(1, len(rhs) + 1) for support in combinations(range(len(rhs)), k))
+    for support in candidates:
+        support = list(support)
+        x = np.zeros(len(rhs))
+        x[support] = np.linalg.lstsq(hessian[np.ix_(support, support)], rhs[support], rcond=None)[0]
+        x = np.maximum(x, 0)
+        value = rhs @ x - x @ hessian @ x / 2
+        if value > best_value:
+            best, best_value = x, value
+    return best
+
+
+def solve_min_change(q0, A, b, lower, upper):
+    """
+    min sum(((q - q0) / q0)**2)  s.t.  A @ q <= b,  lower <= q <= upper
+
+    Returns (q, ok); ok is False when the constraints could not all be met,
+    in which case q is the closest compromise the solver reached.
+    """
+    q0 = np.asarray(q0, dtype=np.float64)
+    A = np.atleast_2d(np.asarray(A, dtype=np.float64))
+    b = np.asarray(b, dtype=np.float64)
+    lower = np.asarray(lower, dtype=np.float64)
+    upper = np.asarray(upper, dtype=np.float64)
+    # Inverse of the objective's diagonal Hessian, 2 / q0**2
+    scale = np.where(q0 > 0, q0 * q0, 1.0) / 2
+
+    # Rows normalised so the multipliers and tolerances are unit-free
+    norm = np.abs(A).max(axis=1)
+    norm[norm == 0] = 1.0
+    A = A / norm[:, None]
+    b = b / norm
+    tol = TOLERANCE * (1 + np.abs(A) @ np.abs(q0))
+
+    if np.all(A @ q0 - b <= tol):
+        return q0.copy(), True
+
+    def dual(lam):
+        q = np.clip(q0 - scale * (A.T @ lam), lower, upper)
+        return np.sum((q - q0) ** 2 / (2 * scale)) + lam @ (A @ q - b)
+
+    lam = np.zeros(len(A))
+    shift = np.zeros_like(q0)  # A.T @ lam, kept up to date
+    for _ in range(MAX_SWEEPS):
+        previous = lam.copy()
+        for j in range(len(A)):
+            rest = shift - A[j] * lam[j]
+            lam[j] = _line_max(q0 - scale * rest, scale * A[j], A[j], b[j], lower, upper)
+            shift = rest + A[j] * lam[j]
+
+        # Coordinate steps crawl when targets pull on the same ingredients, so
+        # also jump to the optimum of the dual's quadratic model for the
+        # current set of clipped quantities, backtracking until it improves
+        # the dual (the set may change along the way).
+        q = np.clip(q0 - scale * shift, lower, upper)
+        free = (q > lower) & (q < upper)
+        if free.any():
+            A_free = A[:, free]
+            hessian = (A_free * scale[free]) @ A_free.T
+            rhs = A_free @ q0[free] + A[:, ~free] @ q[~free] - b
+            target = np.minimum(_model_multipliers(hessian, rhs), MAX_MULTIPLIER)
+            current = dual(lam)
+            for step in (1.0, 0.5, 0.25, 0.125):
+                trial = lam + step * (target - lam)
+                if dual(trial) > current:
+                    lam = trial
+                    shift = A.T @ lam
+                    break
+
+        if np.all(np.abs(lam - previous) <= TOLERANCE * (1 + lam)):
+            break
+    q = np.clip(q0 - scale * shift, lower, upper)
+    return q, bool(np.all(A @ q - b <= tol))
+
+
+def _target_rows(target, nutrient_values, cooking_delta):
+    """The (a, b) constraint rows, a @ q <= b, for one (nutrient, operator, threshold) target."""
+    nutrient, operator, threshold = target
+    column = nutrient_values[:, NUTRIENTS.index(nutrient)]
+    margin = MARGIN if operator != "==" else 0.0
+    rows = []
+    if operator in ("<", "<=", "=="):
+        limit = threshold - margin
+        rows.append((column - limit, limit * cooking_delta))
+    if operator in (">", ">=", "=="):
+        limit = threshold + margin
+        rows.append((limit - column, -limit * cooking_delta))
+    if not rows:
+        raise ValueError(f"Unknown target operator: {operator!r}")
+    return rows
+
+
+def _per_100g(nutrient_values, q, cooking_delta):
+    weight = cooking_delta + q.sum()
+    if weight <= 0:
+        return np.zeros(len(NUTRIENTS))
+    return (q @ nutrient_values) / weight
+
+
+def _meets(value, operator, threshold):
+    if operator == "<":
+        return value < threshold
+    if operator == "<=":
+        return value <= threshold
+    if operator == ">":
+        return value > threshold
+    if operator == ">=":
+        return value >= threshold
+    # "==" is solved with no margin: equal up to the solver's rounding
+    return abs(value - threshold) <= TOLERANCE * (1 + abs(threshold))
+
+
+def reformulate(ingredients, final_yield_weight, targets, store=None, min_quantity=MIN_QUANTITY,
+                max_scale=MAX_SCALE):
+    """
+    Smallest change to `ingredients` (standardize_units output) that meets
+    every per-100g target. `targets` are (nutrient, operator, threshold)
+    tuples with operator one of <, <=, >, >=, ==.
+
+    Each ingredient stays between min(quantity, min_quantity) and
+    quantity * max_scale. Targets that cannot be met even alone within those
+    bounds are left out of the solve and reported with "met": False.
+
+    Returns {"targets", "changes", "quantities", "per_100g",
+    "total_yield_weight", "is_feasible"}; "changes" lists only ingredients
+    whose quantity moved (rounded to 0.01g).
+    """
+    store = store or get_store()
+    matrix = composition_matrix(store)
+    ids = []
+    for item in ingredients:
+        data = store.resolve(item["name"])
+        if data is None:
+            raise ValueError(f"Ingredient '{item['name']}' not found locally.")
+        ids.append(store.index[data["name"]])
+    nutrient_values = matrix[ids] if ids else np.zeros((0, len(NUTRIENTS)))
+
+    q0 = np.array([item["quantity"] for item in ingredients], dtype=np.float64)
+    raw_weight = q0.sum()
+    yield_weight = final_yield_weight if final_yield_weight > 0 else raw_weight
+    # Yield minus raw weight: moisture lost (< 0) or gained in cooking, held fixed
+    cooking_delta = yield_weight - raw_weight
+    lower = np.minimum(q0, min_quantity)
+    upper = np.maximum(q0 * max_scale, lower)
+
+    rows = []
+    reachable = []
+    for target in targets:
+        target_rows = _target_rows(target, nutrient_values, cooking_delta)
+        # Best case for each row alone: every quantity at the bound that helps it
+        ok = all(np.minimum(a * lower, a * upper).sum() <= b for a, b in target_rows)
+        reachable.append(ok)
+        if ok:
+            rows.extend(target_rows)
+
+    if rows:
+        q, converged = solve_min_change(q0, [a for a, _ in rows], [b for _, b in rows], lower, upper)
+    else:
+        q, converged = q0.copy(), True
+
+    before = _per_100g(nutrient_values, q0, cooking_delta)
+    after = _per_100g(nutrient_values, q, cooking_delta)
+    target_report = []
+    for (nutrient, operator, threshold), ok in zip(targets, reachable):
+        i = NUTRIENTS.index(nutrient)
+        target_report.append({
+            "nutrient": nutrient,
+            "operator": operator,
+            "threshold": threshold,
+            "before": round(float(before[i]), 2),
+            "after": round(float(after[i]), 2),
+            "met": ok and bool(_meets(after[i], operator, threshold))
+        })
+
+    changes = []
+    for item, old, new in zip(ingredients, q0.tolist(), q.tolist()):
+        if round(old, 2) != round(new, 2):
+            changes.append({"name": item["name"], "old_qty": round(old, 2), "new_qty": round(new, 2)})
+
+    return {
+        "targets": target_report,
+        "changes": changes,
+        "quantities": q.tolist(),
+        "per_100g": dict(zip(NUTRIENTS, after.tolist())),
+        "total_yield_weight": float(cooking_delta + q.sum()),
+        "is_feasible": converged and all(reachable)
+    }
@@ -1,135 +1,230 @@
+"""
+Import USDA FoodData Central foods into the ingredient composition database.
+
+    python import_usda.py                      # download the CSV release and import it
+    python import_usda.py --zip FoodData.zip   # import a local copy, offline
+
+The CSVs are read straight out of the zip in one pass, so memory stays flat
+however large the release is (the branded dataset's food_nutrient.csv is
+tens of millions of rows). food.csv is staged into a temp table, the nine
+nutrients we label are pivoted per fdc_id as food_nutrient.csv streams past,
+and the joined rows are added with INSERT OR IGNORE, so names already in the
+database (IFCT 2017) keep their values. Everything happens in one
+transaction: an interrupted import leaves the database untouched.
+"""
 import os
-import requests
-import zipfile
-import pandas as pd
+import io
+import sys
+import csv
+import time
 import sqlite3
+import zipfile
+import argparse
 import urllib.request
-import time
-
-url = "https://fdc.nal.usda.gov/fdc-datasets/FoodData_Central_csv_2025-12-18.zip"
-zip_path = "usda_data.zip"
+from engines import db
 
-print(f"Downloading USDA zip file from {url}...")
-start_time = time.time()
 try:
-    urllib.request.urlretrieve(url, zip_path)
-except Exception as e:
-    # Try another known recent one if 2025-12-18 fails
-    print(f"Failed to download: {e}")
-    print("Trying alternative Foundation Foods subset...")
-    url = "https://fdc.nal.usda.gov/fdc-datasets/FoodData_Central_foundation_food_csv_2025-12-18.zip"
-    try:
-        urllib.request.urlretrieve(url, zip_path)
-    except Exception as e2:
-        print(f"Failed to download alternative: {e2}")
-        exit(1)
-
-print(f"Downloaded in {time.time() - start_time:.2f} seconds. Unzipping...")
-with zipfile.ZipFile(zip_path, 'r') as z:
-    z.extractall("usda_data")
-
-# Find the csv files
-folder = "usda_data"
-food_csv = None
-nutrient_csv = None
-for root, dirs, files in os.walk(folder):
-    for f in files:
-        if f == "food.csv": food_csv = os.path.join(root, f)
-        if f == "food_nutrient.csv": nutrient_csv = os.path.join(root, f)
-
-if not food_csv or not nutrient_csv:
-    print("Could not find food.csv or food_nutrient.csv in the extracted files.")
-    exit(1)
-
-print(f"Loading {food_csv}...")
-df_food = pd.read_csv(food_csv, usecols=['fdc_id', 'description'], low_memory=False)
-
-print(f"Loading {nutrient_csv}...")
-# Nutrients:
-# 1008: Energy (kcal)
-# 1003: Protein (g)
-# 1004: Fat (g)
-# 1005: Carbs (g)
-# 1093: Sodium (mg)
-# 2000: Total Sugars (g)
-# 1235: Added Sugars (g)
-# 1258: Saturated Fat (g)
-# 1257: Trans Fat (g)
-relevant_nutrients = [1008, 1003, 1004, 1005, 1093, 2000, 1235, 1258, 1257]
-
-# Read in chunks to avoid blowing up memory if the branded dataset is huge
-print("Reading nutrient data in chunks...")
-chunk_list = []
-for chunk in pd.read_csv(nutrient_csv, usecols=['fdc_id', 'nutrient_id', 'amount'], chunksize=1000000, low_memory=False):
-    filtered_chunk = chunk[chunk['nutrient_id'].isin(relevant_nutrients)]
-    chunk_list.append(filtered_chunk)
-
-df_nutr = pd.concat(chunk_list)
-
-print("Pivoting data...")
-df_pivot = df_nutr.pivot_table(index='fdc_id', columns='nutrient_id', values='amount', aggfunc='first').fillna(0)
-df_pivot.reset_index(inplace=True)
-
-print("Merging with foods...")
-df_final = pd.merge(df_food, df_pivot, on='fdc_id', how='inner')
-
-rename_map = {
-    1008: 'energy',
-    1003: 'protein',
-    1005: 'carbs',
-    2000: 'sugar',
-    1235: 'added_sugar',
-    1004: 'fat',
-    1258: 'sat_fat',
-    1257: 'trans_fat',
-    1093: 'sodium'
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+URLS = [
+    "https://fdc.nal.usda.gov/fdc-datasets/FoodData_Central_csv_2025-12-18.zip",
+    # Much smaller Foundation Foods subset, if the full release is unavailable
+    "https://fdc.nal.usda.gov/fdc-datasets/FoodData_Central_foundation_food_csv_2025-12-18.zip",
+]
+DOWNLOAD_PATH = "usda_data.zip"
+
+# FDC nutrient id -> ingredients column
+NUTRIENT_COLUMNS = {
+    "1008": "energy",       # Energy (kcal)
+    "1003": "protein",      # Protein (g)
+    "1005": "carbs",        # Carbohydrate, by difference (g)
+    "2000": "sugar",        # Total Sugars (g)
+    "1235": "added_sugar",  # Added Sugars (g)
+    "1004": "fat",          # Total lipid (fat) (g)
+    "1258": "sat_fat",      # Fatty acids, total saturated (g)
+    "1257": "trans_fat",    # Fatty acids, total trans (g)
+    "1093": "sodium",       # Sodium, Na (mg)
 }
-df_final.rename(columns=rename_map, inplace=True)
-
-# Add missing columns with 0
-for col in rename_map.values():
-    if col not in df_final.columns:
-        df_final[col] = 0.0
-
-# Process fields
-df_final['name'] = df_final['description'].astype(str).str.lower().str.strip()
-df_final['allergen'] = 'none' # Need NLP or advanced parse for real allergens, default 'none'
-df_final['veg_type'] = 'veg' # Default 'veg'
-df_final['source'] = 'USDA'
-
-df_insert = df_final[['name', 'energy', 'protein', 'carbs', 'sugar', 'added_sugar', 'fat', 'sat_fat', 'trans_fat', 'sodium', 'allergen', 'veg_type', 'source']]
-
-# Drop duplicates if multiple foods have exact same name
-df_insert = df_insert.drop_duplicates(subset=['name'], keep='first')
-df_insert = df_insert.dropna(subset=['name'])
-
-print(f"Preparing to insert {len(df_insert)} ingredients into SQLite...")
-
-# Insert into database
-db_path = os.path.join(os.path.dirname(__file__), 'database', 'nutrition.db')
-conn = sqlite3.connect(db_path)
-
-# Insert ignoring duplicates (which might exist from IFCT 2017)
-# We can use pd.to_sql via a temp table
-df_insert.to_sql('usda_temp', conn, if_exists='replace', index=False)
-
-cursor = conn.cursor()
-cursor.execute('''
-    INSERT OR IGNORE INTO ingredients (name, energy, protein, carbs, sugar, added_sugar, fat, sat_fat, trans_fat, sodium, allergen, veg_type, source)
-    SELECT name, energy, protein, carbs, sugar, added_sugar, fat, sat_fat, trans_fat, sodium, allergen, veg_type, source FROM usda_temp
-''')
-
-conn.commit()
-cursor.execute('DROP TABLE usda_temp')
-conn.close()
-
-print("USDA database imported successfully!")
-
-# cleanup zip and extracted files
-try:
-    import shutil
-    shutil.rmtree("usda_data")
-    os.remove("usda_data.zip")
-    print("Cleaned up downloaded files.")
-except:
-    pass
+COLUMNS = list(NUTRIENT_COLUMNS.values())
+COLUMN_INDEX = {nutrient_id: i for i, nutrient_id in enumerate(NUTRIENT_COLUMNS)}
+
+# Rows per executemany batch
+BATCH_SIZE = 10000
+
+
+def download(path=DOWNLOAD_PATH):
+    for url in URLS:
+        print(f"Downloading USDA zip file from {url}...")
+        start = time.time()
+        try:
+            urllib.request.urlretrieve(url, path)
+        except Exception as e:
+            print(f"Failed to download: {e}")
+            continue
+        print(f"Downloaded in {time.time() - start:.2f} seconds.")
+        return path
+    return None
+
+
+def open_csv(archive, filename):
+    """csv.reader over a member of the zip, found by file name in any folder."""
+    for member in archive.namelist():
+        if member == filename or member.endswith("/" + filename):
+            return csv.reader(io.TextIOWrapper(archive.open(member), encoding="utf-8", newline=""))
+    raise FileNotFoundError(f"{filename} not found in the zip file")
+
+
+def _columns(reader, *names):
+    header = next(reader)
+    return [header.index(name) for name in names]
+
+
+def _batches(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_foods(reader):
+    """(fdc_id, name) for every food with a description, in file order."""
+    id_col, description_col = _columns(reader, "fdc_id", "description")
+    for row in reader:
+        name = row[description_col].strip().lower()
+        if name:
+            yield int(row[id_col]), name
+
+
+def pivot_nutrients(reader, stats):
+    """
+    One (fdc_id, energy, ..., sodium) row per run of food_nutrient.csv rows
+    with the same fdc_id; nutrients the food does not list are None.
+    The file is grouped by food, so this holds a single food at a time. A
+    food that does show up in two runs gets two rows, which the upsert in
+    stage_nutrients() folds together.
+    """
+    id_col, nutrient_col, amount_col = _columns(reader, "fdc_id", "nutrient_id", "amount")
+    current, values = None, None
+    for row in reader:
+        stats["rows"] += 1
+        i = COLUMN_INDEX.get(row[nutrient_col])
+        if i is None or not row[amount_col]:
+            continue
+        fdc_id = row[id_col]
+        if fdc_id != current:
+            if values is not None:
+                yield (int(current), *values)
+            current, values = fdc_id, [None] * len(COLUMNS)
+        # First amount listed for a nutrient wins
+        if values[i] is None:
+            values[i] = float(row[amount_col])
+    if values is not None:
+        yield (int(current), *values)
+
+
+def stage_foods(conn, foods):
+    # rowid keeps the food.csv order, which decides which of several foods
+    # with the same name is imported
+    conn.execute('CREATE TEMP TABLE usda_food (fdc_id INTEGER NOT NULL, name TEXT NOT NULL)')
+    count = 0
+    for batch in _batches(foods):
+        conn.executemany('INSERT INTO usda_food (fdc_id, name) VALUES (?, ?)', batch)
+        count += len(batch)
+    return count
+
+
+def stage_nutrients(conn, rows):
+    columns = ", ".join(COLUMNS)
+    conn.execute(f'CREATE TEMP TABLE usda_nutrient (fdc_id INTEGER PRIMARY KEY, {columns})')
+    placeholders = ", ".join("?" * (len(COLUMNS) + 1))
+    keep_first = ", ".join(f"{c} = COALESCE({c}, excluded.{c})" for c in COLUMNS)
+    sql = (f'INSERT INTO usda_nutrient (fdc_id, {columns}) VALUES ({placeholders}) '
+           f'ON CONFLICT(fdc_id) DO UPDATE SET {keep_first}')
+    for batch in _batches(rows):
+        conn.executemany(sql, batch)
+
+
+def import_zip(zip_path, db_path):
+    """Import the foods in an FDC CSV zip into db_path. Returns a stats dict."""
+    stats = {"foods": 0, "rows": 0, "inserted": 0}
+    db.migrate(db_path, db.COMPOSITION_MIGRATIONS)
+    conn = sqlite3.connect(db_path, timeout=db.BUSY_TIMEOUT, isolation_level=None)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        with zipfile.ZipFile(zip_path) as archive:
+            print("Reading food.csv...")
+            stats["foods"] = stage_foods(conn, read_foods(open_csv(archive, "food.csv")))
+            print("Streaming food_nutrient.csv...")
+            stage_nutrients(conn, pivot_nutrients(open_csv(archive, "food_nutrient.csv"), stats))
+
+        values = ", ".join(f"COALESCE(n.{c}, 0)" for c in COLUMNS)
+        before = conn.total_changes
+        # Foods with none of our nutrients are skipped; on duplicate names the
+        # first food wins, as does an existing ingredient of the same name
+        conn.execute(f'''
+            INSERT OR IGNORE INTO ingredients (name, {", ".join(COLUMNS)}, allergen, veg_type, source)
+            SELECT f.name, {values}, 'none', 'veg', 'USDA'
+            FROM usda_food f JOIN usda_nutrient n ON n.fdc_id = f.fdc_id
+            ORDER BY f.rowid
+        ''')
+        stats["inserted"] = conn.total_changes - before
+        conn.execute('DROP TABLE usda_food')
+        conn.execute('DROP TABLE usda_nutrient')
+        conn.execute('COMMIT')
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    return stats
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Import USDA FoodData Central foods into the ingredient database.")
+    ap.add_argument("--zip", help="local FoodData Central CSV zip (default: download the latest release)")
+    ap.add_argument("--db", default=db.COMPOSITION_DB, help="composition database to import into")
+    args = ap.parse_args(argv)
+
+    zip_path = args.zip or download()
+    if zip_path is None:
+        return 1
+
+    start = time.time()
+    try:
+        stats = import_zip(zip_path, args.db)
+    except (FileNotFoundError, ValueError, zipfile.BadZipFile) as e:
+        print(f"Import failed: {e}")
+        return 1
+    finally:
+        if not args.zip and os.path.exists(zip_path):
+            os.remove(zip_path)
+            print("Cleaned up downloaded file.")
+    elapsed = time.time() - start
+
+    print(f"Imported {stats['inserted']} new ingredients from {stats['foods']} foods "
+          f"({stats['rows']} nutrient rows) in {elapsed:.2f} seconds, "
+          f"{stats['rows'] / max(elapsed, 1e-9):,.0f} rows/sec.")
+    peak = peak_rss_mb()
+    if peak is not None:
+        print(f"Peak memory (RSS): {peak:.1f} MB")
+    print("USDA database imported successfully!")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
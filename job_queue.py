@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from engines import db
+
+
+class JobQueue:
+    """
+    Durable work queue stored in the `jobs` table (see APP_MIGRATIONS in
+    engines/db.py).
+
+    Workers are plain daemon threads that claim one job at a time with
+    BEGIN IMMEDIATE, so several processes can share the same database file
+    without an external broker. A claim is a lease held by this queue's
+    worker_id and renewed every lease_seconds / 3 while the job runs; a
+    'running' job is only claimed again once its lease has expired. Jobs
+    therefore survive a crash or restart, but a second live process (the
+    reloader, another gunicorn worker) never re-runs one still in progress.
+    """
+
+    def __init__(self, db_path, handler, workers=2, poll_interval=1.0, lease_seconds=60.0):
+        self.db_path = db_path
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _connect(self):
+        return db.connect(self.db_path, row_factory=sqlite3.Row)
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def stop(self):
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+        self._stop.clear()
+
+    def enqueue(self, user_id, payload, kind='generate'):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        conn.execute('''
+            INSERT INTO jobs (id, user_id, kind, payload, status, created_at, updated_at)
+            VALUES (?, ?, ?, ?, 'queued', ?, ?)
+        ''', (job_id, user_id, kind, json.dumps(payload), now, now))
+        conn.commit()
+        conn.close()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        conn = self._connect()
+        row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        conn.close()
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "user_id": row["user_id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+
+    def _claim(self):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            now = time.time()
+            # Queued jobs, and running ones whose worker stopped renewing its lease
+            # (jobs left running before leases existed have none)
+            row = conn.execute('''
+                SELECT * FROM jobs
+                WHERE status = 'queued' OR (status = 'running' AND (lease_expires IS NULL OR lease_expires < ?))
+                ORDER BY created_at LIMIT 1
+            ''', (now,)).fetchone()
+            if row is not None:
+                conn.execute('''
+                    UPDATE jobs SET status = 'running', worker_id = ?, lease_expires = ?, updated_at = ?
+                    WHERE id = ?
+                ''', (self.worker_id, now + self.lease_seconds, now, row["id"]))
+            conn.commit()
+            return row
+        finally:
+            conn.close()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        # Only while we still hold the lease: a job reclaimed by another worker is theirs now
+        conn = self._connect()
+        conn.execute('''
+            UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, lease_expires = NULL
+            WHERE id = ? AND worker_id = ?
+        ''', (status, None if result is None else json.dumps(result), error, time.time(), job_id,
+              self.worker_id))
+        conn.commit()
+        conn.close()
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            conn = self._connect()
+            conn.execute("UPDATE jobs SET lease_expires = ? WHERE status = 'running' AND worker_id = ?",
+                         (time.time() + self.lease_seconds, self.worker_id))
+            conn.commit()
+            conn.close()
+
+    def _work(self):
+        while not self._stop.is_set():
+            row = self._claim()
+            if row is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            try:
+                result = self.handler(row["kind"], row["user_id"], json.loads(row["payload"]))
+                self._finish(row["id"], 'done', result=result)
+            except Exception as e:
+                self._finish(row["id"], 'failed', error=str(e))
@@ -0,0 +1,52 @@
+import sys
+import os
+import sqlite3
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from engines import db, analytics
+from engines.history_store import INSERT_SQL, history_row, insert_label, delete_label
+from bench_label import LABEL
+
+SALTY = dict(LABEL, allergen_statement="Contains: Gluten, Milk", sodium_fix={
+    "contributors": [{"name": "salt", "contribution_mg": 900.0}, {"name": "cheese", "contribution_mg": 300.0}]
+})
+PLAIN = dict(LABEL, allergen_statement="No known allergens", sodium_fix=None)
+
+def tables(conn):
+    return [conn.execute(f"SELECT * FROM {t} ORDER BY 1, 2").fetchall()
+            for t in ("analytics_weekly", "analytics_sodium", "analytics_allergens")]
+
+def test_incremental_aggregates_match_rebuild():
+    with tempfile.TemporaryDirectory() as tmp:
+        app_path = os.path.join(tmp, "app.db")
+        db.migrate(app_path, db.APP_MIGRATIONS)
+        conn = sqlite3.connect(app_path)
+        conn.row_factory = sqlite3.Row
+        with conn:
+            # Two weeks of history for user 1, one label for user 2
+            conn.execute(INSERT_SQL, history_row(1, "Old", 60, "a.pdf", None, SALTY, "2026-03-04 10:00:00"))
+            analytics.record(conn, 1, "2026-03-04 10:00:00", 60, SALTY)
+            insert_label(conn, 1, "Chips", 70, "b.pdf", None, SALTY)
+            insert_label(conn, 1, "Rice", 100, "c.pdf", None, PLAIN)
+            plain_id = insert_label(conn, 1, "Rice 2", 90, "d.pdf", None, PLAIN)
+            insert_label(conn, 2, "Other", 50, "e.pdf", None, SALTY)
+
+        summary = analytics.summary(conn, 1)
+        assert summary["total_labels"] == 4
+        assert summary["weekly"][0] == {"week": "2026-03-02", "labels": 1, "avg_compliance_score": 60.0}
+        assert summary["weekly"][-1]["labels"] == 3 and summary["weekly"][-1]["avg_compliance_score"] == 86.7
+        assert summary["sodium_offenders"][0] == {"ingredient": "salt", "labels": 2, "avg_contribution_mg": 900.0}
+        assert summary["allergens"] == [{"allergen": "Gluten", "labels": 2}, {"allergen": "Milk", "labels": 2}]
+
+        with conn:
+            delete_label(conn, conn.execute("SELECT * FROM label_history WHERE id = ?", (plain_id,)).fetchone())
+        incremental = tables(conn)
+        with conn:
+            assert analytics.rebuild(conn) == 4
+        assert tables(conn) == incremental
+        conn.close()
+    print("test_incremental_aggregates_match_rebuild passed successfully!")
+
+if __name__ == "__main__":
+    test_incremental_aggregates_match_rebuild()
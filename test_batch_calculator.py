@@ -0,0 +1,72 @@
+import sys
+import os
+import gc
+import random
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from engines.calculator import calculate_nutrition
+from engines.batch_calculator import calculate_nutrition_batch, batch_row, composition_matrix, _matrix_cache
+from engines import db
+from engines.ingredient_store import get_store, IngredientStore
+
+def test_batch_matches_scalar():
+    rng = random.Random(42)
+    names = list(get_store().names)
+    recipes = []
+    for _ in range(200):
+        ingredients = [{"name": name, "quantity": round(rng.uniform(0.5, 500), 2)}
+                       for name in rng.sample(names, rng.randint(1, 12))]
+        recipes.append({
+            "ingredients": ingredients,
+            "final_yield_weight": rng.choice([0, round(rng.uniform(50, 2000), 1)]),
+            "serving_size_g": rng.choice([15, 30, 45.5, 100])
+        })
+
+    result = calculate_nutrition_batch(recipes)
+    assert result["errors"] == {}
+
+    for i, recipe in enumerate(recipes):
+        scalar = calculate_nutrition(recipe["ingredients"], recipe["final_yield_weight"], recipe["serving_size_g"])
+        row = batch_row(result, i)
+        assert row["per_100g"] == scalar["per_100g"], (i, row["per_100g"], scalar["per_100g"])
+        assert row["per_serving"] == scalar["per_serving"]
+        assert result["total_yield_weight"][i] == scalar["total_yield_weight"]
+        assert bool(result["show_disclaimer"][i]) == scalar["show_disclaimer"]
+    print("test_batch_matches_scalar passed successfully!")
+
+def test_batch_reports_unknown_ingredients():
+    recipes = [
+        {"ingredients": [{"name": "sugar", "quantity": 10}], "final_yield_weight": 0, "serving_size_g": 30},
+        {"ingredients": [{"name": "zzqx unobtainium", "quantity": 10}], "final_yield_weight": 0, "serving_size_g": 30}
+    ]
+    result = calculate_nutrition_batch(recipes)
+    assert list(result["errors"]) == [1]
+    assert result["per_100g"][0][0] == 400
+
+    # Nothing to resolve against: errors, not an IndexError
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "empty.db")
+        db.migrate(db_path, db.COMPOSITION_MIGRATIONS)
+        empty = IngredientStore(db_path)
+        empty.load()
+        result = calculate_nutrition_batch(recipes + [{"ingredients": [], "final_yield_weight": 0,
+                                                       "serving_size_g": 30}], store=empty)
+        db.close_all()
+    assert list(result["errors"]) == [0, 1]
+    assert np.isnan(result["per_100g"][:2]).all() and (result["per_100g"][2] == 0).all()
+
+    # The cached matrix follows the store's version and goes away with the store
+    assert empty in _matrix_cache
+    empty.add(dict(get_store().get("sugar"), name="test sugar"))
+    assert composition_matrix(empty)[0][0] == 400
+    cached = len(_matrix_cache)
+    del empty
+    gc.collect()
+    assert len(_matrix_cache) == cached - 1
+    print("test_batch_reports_unknown_ingredients passed successfully!")
+
+if __name__ == "__main__":
+    test_batch_matches_scalar()
+    test_batch_reports_unknown_ingredients()
@@ -0,0 +1,76 @@
+import sys
+import os
+import io
+import json
+import sqlite3
+import zipfile
+import tempfile
+import multiprocessing
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_init import init_db
+from batch_generate import read_products, run_batch, write_zip, save_history
+from engines.label_store import LabelCache
+
+CSV = """product_name,ingredients,serving_size,net_weight,use_raw_weight
+Sweet Biscuits,"100g wheat flour, 50g sugar, 20g ghee",30,150,on
+Plain Rice,500g rice,100,500,on
+Broken Row,,30,100,on
+"""
+
+def test_read_products():
+    csv_products = read_products(io.StringIO(CSV))
+    jsonl = "\n".join(json.dumps(p) for p in csv_products)
+    assert read_products(io.StringIO(jsonl)) == csv_products
+    assert csv_products[0]["ingredients"] == "100g wheat flour, 50g sugar, 20g ghee"
+
+    # A UTF-8 byte order mark does not hide the first column
+    assert read_products(io.TextIOWrapper(io.BytesIO(CSV.encode("utf-8-sig")), encoding="utf-8-sig")) == csv_products
+    assert read_products(io.StringIO("\ufeff" + CSV)) == csv_products
+
+    # Bad JSONL lines are reported with their line number
+    for bad, message in (('{"product_name": "A"}\n\n[1, 2]', "line 3 is not a JSON object"),
+                         ('{"product_name": "A"}\n"x"', "line 2 is not a JSON object"),
+                         ('{"product_name": "A"}\n{"product_name": ', "line 2 is not valid JSON")):
+        try:
+            read_products(io.StringIO(bad), 'jsonl')
+            assert False, f"expected a ValueError for {bad!r}"
+        except ValueError as e:
+            assert str(e).startswith(message), str(e)
+    print("test_read_products passed successfully!")
+
+def test_run_batch_zip_and_history():
+    products = read_products(io.StringIO(CSV))
+    results = list(run_batch(products, workers=2))
+    by_row = {r["row"]: r for r in results}
+    assert by_row[0]["status"] == "ok" and by_row[1]["status"] == "ok"
+    assert by_row[2]["status"] == "error" and "Ingredients are required" in by_row[2]["error"]
+
+    # Spawned workers (what the web app uses) give the same labels
+    spawned = list(run_batch(products[:1], workers=1, mp_context=multiprocessing.get_context("spawn")))
+    assert spawned[0]["data"] == by_row[0]["data"] and spawned[0]["pdf"] == by_row[0]["pdf"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, "labels.zip")
+        write_zip(results, zip_path)
+        with zipfile.ZipFile(zip_path) as zf:
+            assert zf.namelist() == ["0001_Sweet_Biscuits.pdf", "0002_Plain_Rice.pdf"]
+            assert zf.read("0001_Sweet_Biscuits.pdf").startswith(b"%PDF")
+
+        db_path = os.path.join(tmp, "app.db")
+        init_db(db_path)
+        cache = LabelCache(os.path.join(tmp, "labels"), max_bytes=0, db_path=db_path)
+        assert save_history(db_path, 1, results, cache) == 2
+        assert save_history(db_path, 1, results, cache) == 2
+        assert len(os.listdir(cache.directory)) == 2
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute("SELECT product_name FROM label_history ORDER BY id").fetchall()
+        refcounts = conn.execute("SELECT refcount FROM label_blobs").fetchall()
+        conn.close()
+        assert rows == [("Sweet Biscuits",), ("Plain Rice",)] * 2
+        assert refcounts == [(2,), (2,)]
+    print("test_run_batch_zip_and_history passed successfully!")
+
+if __name__ == "__main__":
+    test_read_products()
+    test_run_batch_zip_and_history()
@@ -3,7 +3,7 @@ import os
 import sqlite3
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from engines.calculator import calculate_nutrition
+from engines.calculator import calculate_nutrition, RecipeAccumulator
 
 def test_calculator():
     # Provide an ingredient that exists in the seeded DB
@@ -42,5 +42,73 @@ def test_calculator():
         import traceback
         traceback.print_exc()
 
+def test_unknown_ingredients_resolved_concurrently():
+    import time
+    import tempfile
+    from engines import external_api, ingredient_store
+
+    def slow_lookup(name):
+        time.sleep(0.3)
+        return {"name": name, "energy": 100, "protein": 1, "carbs": 20, "sugar": 0, "added_sugar": 0,
+                "fat": 1, "sat_fat": 0, "trans_fat": 0, "sodium": 10,
+                "allergen": "none", "veg_type": "veg", "source": "USDA FDC"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "nutrition.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE ingredients (name TEXT PRIMARY KEY, energy REAL, protein REAL, carbs REAL, sugar REAL, "
+                     "added_sugar REAL, fat REAL, sat_fat REAL, trans_fat REAL, sodium REAL, allergen TEXT, veg_type TEXT, source TEXT)")
+        conn.close()
+
+        old_store, old_lookup = ingredient_store._store, external_api.search_ingredient_nutrition
+        ingredient_store._store = ingredient_store.IngredientStore(db_path)
+        external_api.search_ingredient_nutrition = slow_lookup
+        try:
+            unknown = [{"name": f"mystery grain {i}", "quantity": 25} for i in range(4)]
+            start = time.perf_counter()
+            result = calculate_nutrition(unknown, 0, 30)
+            elapsed = time.perf_counter() - start
+            assert elapsed < 0.6, f"Lookups ran sequentially ({elapsed:.2f}s)"
+            assert round(result["per_100g"]["energy"]) == 100
+
+            conn = sqlite3.connect(db_path)
+            assert conn.execute("SELECT COUNT(*) FROM ingredients").fetchone()[0] == 4
+            conn.close()
+        finally:
+            ingredient_store._store, external_api.search_ingredient_nutrition = old_store, old_lookup
+    print("test_unknown_ingredients_resolved_concurrently passed successfully!")
+
+def test_recipe_accumulator():
+    recipe = RecipeAccumulator()
+    flour = recipe.add("wheat flour", 100)
+    sugar = recipe.add("sugar", 50)
+    expected = calculate_nutrition([{"name": "wheat flour", "quantity": 100}, {"name": "sugar", "quantity": 50}], 0, 30)
+    assert recipe.result(0, 30) == expected
+
+    # One-line edits match a fresh calculation of the edited recipe
+    ghee = recipe.add("ghee", 20)
+    recipe.scale(sugar, 0.5)
+    recipe.set_quantity(flour, 120)
+    edited = [{"name": "wheat flour", "quantity": 120}, {"name": "sugar", "quantity": 25}, {"name": "ghee", "quantity": 20}]
+    fresh = calculate_nutrition(edited, 150, 30)
+    result = recipe.result(150, 30)
+    for n, value in fresh["per_100g"].items():
+        assert abs(result["per_100g"][n] - value) < 1e-9
+    assert sorted(result["allergens"]) == sorted(fresh["allergens"])
+    assert result["ingredients"] == fresh["ingredients"]
+
+    # Removing the only milk ingredient takes its allergen with it
+    assert "milk" in recipe.result(0, 30)["allergens"]
+    recipe.remove(ghee)
+    assert "milk" not in recipe.result(0, 30)["allergens"]
+
+    recipe.remove(flour)
+    recipe.remove(sugar)
+    assert len(recipe) == 0
+    assert all(v == 0 for v in recipe.result(0, 30)["per_100g"].values())
+    print("test_recipe_accumulator passed successfully!")
+
 if __name__ == "__main__":
     test_calculator()
+    test_unknown_ingredients_resolved_concurrently()
+    test_recipe_accumulator()
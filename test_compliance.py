@@ -2,7 +2,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from engines.compliance import apply_compliance
+from engines.compliance import apply_compliance, detect_allergens, ALLERGEN_KEYWORDS
 
 def test_compliance():
     # Mock calculation engine output
@@ -54,5 +54,31 @@ def test_compliance():
     
     print("test_compliance passed successfully!")
 
+def test_detect_allergens():
+    # Every keyword in the table maps to its category, alone, pluralised and inside a longer name
+    for allergen, keywords in ALLERGEN_KEYWORDS.items():
+        for keyword in keywords:
+            assert allergen in detect_allergens(keyword), keyword
+            assert allergen in detect_allergens(f"Roasted {keyword.upper()}s, chopped"), keyword
+
+    # Keywords inside compound words still count
+    compounds = {"soymilk": ["Milk", "Soy"], "wheatflour": ["Gluten"], "cashewnuts": ["Nut"],
+                 "peanutbutter": ["Milk", "Nut"], "milkshake": ["Milk"], "eggnog": ["Egg"],
+                 "butterscotch": ["Milk"], "Milkmaid condensed milk": ["Milk"]}
+    for name, expected in compounds.items():
+        assert detect_allergens(name) == expected, name
+
+    # ...except inside the excluded words
+    for name in ["nutmeg", "red lentils", "eggless sponge", "buckwheat", "tilapia", "codling moth", "coconut"]:
+        assert detect_allergens(name) == [], name
+    assert detect_allergens("coconut milk with nutmeg and cashew") == ["Milk", "Nut"]
+
+    # Several categories in one name, reported in table order
+    assert detect_allergens("peanut butter") == ["Milk", "Nut"]
+    assert detect_allergens("egg and sesame  bun with soya") == ["Egg", "Soy", "Sesame"]
+    assert detect_allergens("Buttermilk") == ["Milk"] and detect_allergens("soybean oil") == ["Soy"]
+    print("test_detect_allergens passed successfully!")
+
 if __name__ == "__main__":
     test_compliance()
+    test_detect_allergens()
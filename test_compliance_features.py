@@ -1,8 +1,13 @@
 import sys
 import os
+import json
+import random
+import tempfile
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from engines.compliance_features import validate_health_claims, suggest_sodium_fix
+from engines.compliance_features import (validate_health_claims, suggest_sodium_fix, evaluate_claims_batch,
+                                         get_claim_table, load_claim_table, CLAIMS_FILE)
+from engines.ingredient_store import NUTRIENTS
 
 def test_sodium():
     print("--- Testing Sodium Fix ---")
@@ -36,8 +41,56 @@ def test_health_claims():
     assert "High Protein" in qualified
     assert "Low Sodium" in qualified
     assert "Low Calorie" in qualified
+
+    # Gaps are rounded floats whatever the input type
+    gaps = {c["claim"]: c["gap"] for c in validate_health_claims({"sodium": 130, "protein": 4})["disqualified"]}
+    assert gaps["Low Sodium"] == 10.0 and gaps["High Protein"] == 6.0 and gaps["Source of Protein"] == 1.0
+    assert all(type(gap) is float for gap in gaps.values())
     print("Claims validation passed.")
 
+def test_claims_batch_matches_scalar():
+    rng = random.Random(7)
+    rows = [[rng.choice([0.0, 0.5, 5.0, 40.0, 120.0, round(rng.uniform(0, 200), 2)]) for _ in NUTRIENTS]
+            for _ in range(500)]
+    qualifies, gaps = evaluate_claims_batch(rows)
+    table = get_claim_table()
+    assert qualifies.shape == gaps.shape == (len(rows), len(table))
+    for i, row in enumerate(rows):
+        claims = validate_health_claims(dict(zip(NUTRIENTS, row)))
+        expected = [c["claim"] for c in claims["qualified"]]
+        assert [table.claims[j] for j in range(len(table)) if qualifies[i, j]] == expected
+        by_claim = dict(zip(table.claims, gaps[i].tolist()))
+        for c in claims["disqualified"]:
+            assert c["gap"] == abs(round(by_claim[c["claim"]], 2))
+    print("Batch claims validation passed.")
+
+def test_claims_file():
+    with open(CLAIMS_FILE, encoding="utf-8") as f:
+        data = json.load(f)
+    assert len(load_claim_table()) == len(data["claims"]) == 13
+
+    data["claims"] = [dict(data["claims"][0], threshold=2)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "claims.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        table = load_claim_table(path)
+        claims = validate_health_claims({"fat": 2.5}, table=table)
+        assert claims["qualified"] == []
+        assert claims["disqualified"][0]["threshold"] == 2 and claims["disqualified"][0]["gap"] == 0.5
+
+        data["version"] = 99
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        try:
+            load_claim_table(path)
+            assert False, "expected an unsupported version error"
+        except ValueError:
+            pass
+    print("Claims file loading passed.")
+
 if __name__ == "__main__":
     test_sodium()
     test_health_claims()
+    test_claims_batch_matches_scalar()
+    test_claims_file()
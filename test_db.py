@@ -0,0 +1,104 @@
+import sys
+import os
+import sqlite3
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from engines import db
+from engines.history_store import INSERT_SQL, history_row
+
+def test_pooled_connection_per_thread():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "pool.db")
+        conn = db.connect(db_path)
+        assert db.connect(db_path) is conn
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert db.connect(db_path, row_factory=sqlite3.Row) is not conn
+
+        other = []
+        t = threading.Thread(target=lambda: other.append(db.connect(db_path)))
+        t.start()
+        t.join()
+        assert other[0] is not conn
+
+        # close() keeps the connection but drops uncommitted work
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.execute("INSERT INTO t VALUES (1)")
+        conn.close()
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
+        db.close_all()
+        assert db.connect(db_path) is not conn
+        db.close_all()
+
+        # A forked child never reuses the parent's handles
+        if hasattr(os, "fork"):
+            conn = db.connect(db_path)
+            pid = os.fork()
+            if pid == 0:
+                ok = db.connect(db_path) is not conn
+                ok = ok and db.connect(db_path).execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
+                os._exit(0 if ok else 1)
+            assert os.waitpid(pid, 0)[1] == 0
+            assert db.connect(db_path) is conn
+            db.close_all()
+    print("test_pooled_connection_per_thread passed successfully!")
+
+def test_migrations_and_attached_composition():
+    with tempfile.TemporaryDirectory() as tmp:
+        app_path = os.path.join(tmp, "app.db")
+        composition_path = os.path.join(tmp, "composition.db")
+
+        # A pre-versioning database is adopted and upgraded in place
+        legacy = sqlite3.connect(app_path)
+        legacy.execute("CREATE TABLE label_history (id INTEGER PRIMARY KEY, user_id INTEGER, product_name TEXT, "
+                       "created_at TIMESTAMP, compliance_score INTEGER, pdf_filename TEXT, nutrition_json TEXT)")
+        legacy.close()
+        assert db.migrate(app_path, db.APP_MIGRATIONS) == len(db.APP_MIGRATIONS)
+        assert db.migrate(app_path, db.APP_MIGRATIONS) == len(db.APP_MIGRATIONS)  # no-op the second time
+        conn = sqlite3.connect(app_path)
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(db.APP_MIGRATIONS)
+        assert "pdf_hash" in [row[1] for row in conn.execute("PRAGMA table_info(label_history)")]
+        conn.close()
+
+        db.migrate(composition_path, db.COMPOSITION_MIGRATIONS)
+        conn = sqlite3.connect(composition_path)
+        conn.execute("INSERT INTO ingredients (name, energy) VALUES ('rice', 346)")
+        conn.commit()
+        conn.close()
+
+        # One connection reaches both: composition tables resolve through the attachment
+        pooled = db.connect(app_path, row_factory=sqlite3.Row, attach=composition_path)
+        assert pooled.execute("SELECT energy FROM ingredients WHERE name = 'rice'").fetchone()["energy"] == 346
+        assert pooled.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0
+        db.close_all()
+
+        try:
+            db.migrate(app_path, db.APP_MIGRATIONS[:1])
+            assert False, "expected a newer-schema error"
+        except RuntimeError as e:
+            assert "newer than this code" in str(e)
+    print("test_migrations_and_attached_composition passed successfully!")
+
+def test_history_counts_maintained_by_triggers():
+    with tempfile.TemporaryDirectory() as tmp:
+        app_path = os.path.join(tmp, "app.db")
+        db.migrate(app_path, db.APP_MIGRATIONS)
+        conn = sqlite3.connect(app_path)
+        conn.executemany(INSERT_SQL, [history_row(user_id, "Biscuits", 90, "label.pdf", None, {})
+                                      for user_id in (1, 1, 2)])
+        conn.execute("DELETE FROM label_history WHERE id = 1")
+        conn.commit()
+        assert conn.execute("SELECT user_id, total FROM label_counts ORDER BY user_id").fetchall() == [(1, 1), (2, 1)]
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT id, product_name, created_at, compliance_score "
+                            "FROM label_history WHERE user_id = ? AND (created_at, id) < (?, ?) "
+                            "ORDER BY created_at DESC, id DESC LIMIT 11", (1, "2026-01-01", 5)).fetchall()
+        assert "COVERING INDEX idx_label_history_user_created" in plan[0][-1], plan
+        conn.close()
+    print("test_history_counts_maintained_by_triggers passed successfully!")
+
+if __name__ == "__main__":
+    test_pooled_connection_per_thread()
+    test_migrations_and_attached_composition()
+    test_history_counts_maintained_by_triggers()
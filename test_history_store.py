@@ -0,0 +1,71 @@
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from engines import db
+from engines.history_store import encode_label, decode_label, label_from_row, insert_label
+from bench_label import LABEL
+
+def same(a, b):
+    return json.dumps(a) == json.dumps(b)  # equal including key order and value types
+
+def test_roundtrip_is_lossless():
+    values, blob = encode_label(LABEL)
+    assert same(decode_label(values, blob), LABEL)
+    assert sum(v is not None for v in values) == 18
+
+    # Display values that don't follow apply_compliance's types or key order
+    odd = json.loads(json.dumps(LABEL))
+    odd["per_100g"]["sat_fat"] = "2.0"
+    odd["per_100g"]["energy"] = 412.5
+    odd["per_serving"]["sodium"] = "n/a"
+    odd["per_serving"]["fiber"] = 1.5
+    odd["per_100g"] = dict(reversed(list(odd["per_100g"].items())))
+    values, blob = encode_label(odd)
+    assert same(decode_label(values, blob), odd)
+
+    odd = json.loads(json.dumps(LABEL))
+    odd["per_100g"]["protein"] = None  # stays in the blob, in place
+    assert same(decode_label(*encode_label(odd)), odd)
+
+    assert same(decode_label(*encode_label(dict(LABEL, pdf_url="/download/3"))), LABEL)
+    assert len(blob) < len(json.dumps(odd))
+    print("test_roundtrip_is_lossless passed successfully!")
+
+def test_migration_rebuilds_existing_rows():
+    with tempfile.TemporaryDirectory() as tmp:
+        app_path = os.path.join(tmp, "app.db")
+        db.migrate(app_path, db.APP_MIGRATIONS[:4])
+        conn = sqlite3.connect(app_path)
+        insert = ("INSERT INTO label_history (user_id, product_name, compliance_score, pdf_filename, nutrition_json) "
+                  "VALUES (1, ?, 90, 'label.pdf', ?)")
+        conn.executemany(insert, [(f"Product {i}", json.dumps(dict(LABEL, product_name=f"Product {i}")))
+                                  for i in range(3)])
+        conn.execute("DELETE FROM label_history WHERE id = 3")
+        conn.commit()
+        conn.close()
+
+        db.migrate(app_path, db.APP_MIGRATIONS)
+        conn = sqlite3.connect(app_path)
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute("SELECT * FROM label_history ORDER BY id").fetchall()
+        assert [r["id"] for r in rows] == [1, 2]
+        assert same(label_from_row(rows[1]), dict(LABEL, product_name="Product 1"))
+        assert conn.execute("SELECT total FROM label_counts WHERE user_id = 1").fetchone()[0] == 2
+        # Deleted ids are not handed out again
+        assert insert_label(conn, 1, "New", 80, "label.pdf", None, LABEL) == 4
+        assert conn.execute("SELECT total FROM label_counts WHERE user_id = 1").fetchone()[0] == 3
+        conn.close()
+
+    # Migration 5 carries its own copy of the encoder; today it matches the live one
+    odd = dict(LABEL, per_100g=dict(LABEL["per_100g"], sat_fat="2.0", energy=412.5))
+    for label in (LABEL, odd):
+        assert db._v5_encode_label(label) == encode_label(label)
+    print("test_migration_rebuilds_existing_rows passed successfully!")
+
+if __name__ == "__main__":
+    test_roundtrip_is_lossless()
+    test_migration_rebuilds_existing_rows()
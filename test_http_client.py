@@ -0,0 +1,109 @@
+import sys
+import os
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+from engines import http_client
+
+class FakeUpstream(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    script = []          # list of (status, headers, delay) consumed per request
+    requests_seen = []
+    client_ports = set()
+
+    def do_GET(self):
+        FakeUpstream.requests_seen.append(self.path)
+        FakeUpstream.client_ports.add(self.client_address[1])
+        status, headers, delay = FakeUpstream.script.pop(0) if FakeUpstream.script else (200, {}, 0)
+        time.sleep(delay)
+        body = b'{"ok": true}'
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except OSError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+def run(fn):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeUpstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    FakeUpstream.script, FakeUpstream.requests_seen, FakeUpstream.client_ports = [], [], set()
+    try:
+        fn(f"http://127.0.0.1:{server.server_port}")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_keep_alive_and_retry_after():
+    http_client.reset()
+    def check(base):
+        http_client.configure("fake", max_retries=3, backoff_base=0.01, read_timeout=2)
+        FakeUpstream.script = [(429, {"Retry-After": "0.2"}, 0), (503, {}, 0)]
+        start = time.monotonic()
+        response = http_client.get("fake", base + "/a")
+        assert response.status_code == 200
+        assert len(FakeUpstream.requests_seen) == 3
+        assert time.monotonic() - start >= 0.2, "Retry-After was not honoured"
+        http_client.get("fake", base + "/b")
+        assert len(FakeUpstream.client_ports) == 1, "connections were not reused"
+    run(check)
+    print("test_keep_alive_and_retry_after passed successfully!")
+
+def test_timeout_and_circuit_breaker():
+    http_client.reset()
+    def check(base):
+        http_client.configure("fake", max_retries=1, backoff_base=0.01, read_timeout=0.1,
+                              failure_threshold=2, reset_timeout=0.3)
+        FakeUpstream.script = [(200, {}, 0.5)] * 2 + [(500, {}, 0)] * 2
+        try:
+            http_client.get("fake", base + "/slow")
+            assert False, "expected a timeout"
+        except requests.exceptions.Timeout:
+            pass
+        assert http_client.get("fake", base + "/err").status_code == 500
+        assert http_client.get_breaker("fake").state == "open"
+
+        seen = len(FakeUpstream.requests_seen)
+        try:
+            http_client.get("fake", base + "/blocked")
+            assert False, "expected the circuit to be open"
+        except http_client.CircuitOpenError:
+            pass
+        assert len(FakeUpstream.requests_seen) == seen
+
+        time.sleep(0.35)  # half-open: one trial call closes the circuit again
+        assert http_client.get("fake", base + "/ok").status_code == 200
+        assert http_client.get_breaker("fake").state == "closed"
+    run(check)
+    print("test_timeout_and_circuit_breaker passed successfully!")
+
+def test_failed_trial_reopens_circuit():
+    http_client.reset()
+    http_client.configure("fake", max_retries=0, failure_threshold=1, reset_timeout=0.1)
+    breaker = http_client.get_breaker("fake")
+    breaker.record(False)
+    time.sleep(0.15)
+    # A half-open trial that fails with an error we don't retry still reports back
+    try:
+        http_client.get("fake", "http://")
+        assert False, "expected an invalid URL error"
+    except requests.exceptions.InvalidURL:
+        pass
+    assert breaker.state == "open"
+    time.sleep(0.15)
+    assert breaker.allow(), "the breaker never let another trial through"
+    print("test_failed_trial_reopens_circuit passed successfully!")
+
+if __name__ == "__main__":
+    test_keep_alive_and_retry_after()
+    test_timeout_and_circuit_breaker()
+    test_failed_trial_reopens_circuit()
@@ -0,0 +1,68 @@
+import sys
+import os
+import sqlite3
+import tempfile
+import zipfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from engines import db
+from import_usda import import_zip, main
+
+FOOD_CSV = """"fdc_id","data_type","description","food_category_id","publication_date"
+"1","foundation_food","Chickpeas, Dry","16","2024-04-18"
+"2","foundation_food","  chickpeas, dry ","16","2024-04-18"
+"3","foundation_food","Cheddar Cheese","1","2024-04-18"
+"4","foundation_food","Tap Water","14","2024-04-18"
+"5","foundation_food","Sugar","19","2024-04-18"
+"""
+
+# Food 3 is split across two runs; food 4 has no nutrients we label
+NUTRIENT_CSV = """"id","fdc_id","nutrient_id","amount","data_points"
+"10","1","1008","378","3"
+"11","1","1003","20.5",""
+"12","1","1093","24",""
+"13","1","1008","999",""
+"20","2","1008","100",""
+"30","3","1004","33.1",""
+"31","3","1093","","1"
+"40","4","1051","99.9",""
+"32","3","1093","653",""
+"33","3","1004","50",""
+"50","5","1008","387",""
+"""
+
+def test_import_from_zip():
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, "fdc.zip")
+        with zipfile.ZipFile(zip_path, "w") as z:
+            z.writestr("FoodData_Central_csv/food.csv", FOOD_CSV)
+            z.writestr("FoodData_Central_csv/food_nutrient.csv", NUTRIENT_CSV)
+
+        db_path = os.path.join(tmp, "composition.db")
+        db.migrate(db_path, db.COMPOSITION_MIGRATIONS)
+        conn = sqlite3.connect(db_path)
+        conn.execute("INSERT INTO ingredients (name, energy) VALUES ('sugar', 400)")
+        conn.commit()
+
+        stats = import_zip(zip_path, db_path)
+        assert stats == {"foods": 5, "rows": 11, "inserted": 2}
+
+        rows = {r[0]: r[1:] for r in conn.execute(
+            "SELECT name, energy, protein, fat, sodium, allergen, veg_type, source FROM ingredients")}
+        # First food and first amount win; missing nutrients are 0
+        assert rows["chickpeas, dry"] == (378, 20.5, 0, 24, "none", "veg", "USDA")
+        assert rows["cheddar cheese"] == (0, 0, 33.1, 653, "none", "veg", "USDA")
+        assert "tap water" not in rows
+        assert rows["sugar"][:1] == (400,) and rows["sugar"][-1] == "IFCT 2017"
+
+        # Re-importing adds nothing, and a bad zip leaves the database as it was
+        assert import_zip(zip_path, db_path)["inserted"] == 0
+        with zipfile.ZipFile(zip_path, "w") as z:
+            z.writestr("food.csv", FOOD_CSV)
+        assert main(["--zip", zip_path, "--db", db_path]) == 1
+        assert conn.execute("SELECT COUNT(*) FROM ingredients").fetchone() == (3,)
+        conn.close()
+    print("test_import_from_zip passed successfully!")
+
+if __name__ == "__main__":
+    test_import_from_zip()
@@ -0,0 +1,69 @@
+import sys
+import os
+import sqlite3
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from engines import ingredient_store
+from engines.ingredient_store import IngredientStore, get_store
+from engines.calculator import calculate_nutrition
+
+def make_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+    CREATE TABLE ingredients (
+        name TEXT PRIMARY KEY NOT NULL, energy REAL, protein REAL, carbs REAL, sugar REAL,
+        added_sugar REAL, fat REAL, sat_fat REAL, trans_fat REAL, sodium REAL,
+        allergen TEXT, veg_type TEXT, source TEXT
+    )''')
+    conn.executemany('INSERT INTO ingredients VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', [
+        ('wheat flour', 341, 11.8, 69.4, 1, 0, 1.7, 0.3, 0, 2, 'gluten', 'veg', 'IFCT 2017'),
+        ('salt', 0, 0, 0, 0, 0, 0, 0, 0, 38758, 'none', 'veg', 'IFCT 2017'),
+    ])
+    conn.commit()
+    conn.close()
+
+def test_store_lookup_and_counters():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'nutrition.db')
+        make_db(db_path)
+        store = IngredientStore(db_path)
+        assert store.load() == 2
+
+        flour = store.get('wheat flour')
+        assert flour['energy'] == 341 and flour['allergen'] == 'gluten'
+        assert store.get('quinoa') is None
+        assert store.match('flour')['name'] == 'wheat flour'
+
+        stats = store.stats()
+        assert stats['hits'] == 2 and stats['misses'] == 1, stats
+
+        store.add({'name': 'quinoa', 'energy': 368, 'protein': 14.1, 'carbs': 64.2, 'sugar': 0,
+                   'added_sugar': 0, 'fat': 6.1, 'sat_fat': 0.7, 'trans_fat': 0, 'sodium': 5,
+                   'allergen': 'none', 'veg_type': 'veg', 'source': 'USDA FDC'})
+        assert store.get('quinoa')['protein'] == 14.1
+        assert len(store) == 3
+
+        # A reload builds new columns off to the side: lookups made meanwhile see the old ones
+        names, seen = store.names, []
+        append = ingredient_store._Columns.append
+        ingredient_store._Columns.append = lambda columns, row: seen.append(store.get('quinoa')) or append(columns, row)
+        try:
+            store.load()
+        finally:
+            ingredient_store._Columns.append = append
+        assert len(seen) == 2 and all(seen)
+        assert store.get('quinoa') is None  # only ever added in memory
+        assert names == ['wheat flour', 'salt', 'quinoa'] and store.names == ['wheat flour', 'salt']
+    print("test_store_lookup_and_counters passed successfully!")
+
+def test_calculator_uses_store():
+    store = get_store()
+    before = store.stats()['hits']
+    calculate_nutrition([{"name": "wheat flour", "quantity": 100}, {"name": "sugar", "quantity": 50}], 0, 30)
+    assert store.stats()['hits'] - before == 2
+    print("test_calculator_uses_store passed successfully!")
+
+if __name__ == "__main__":
+    test_store_lookup_and_counters()
+    test_calculator_uses_store()
@@ -0,0 +1,103 @@
+import sys
+import os
+import time
+import sqlite3
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_init import init_db
+from job_queue import JobQueue
+
+def wait_for(queue, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def handler(kind, user_id, payload):
+    if payload.get("fail"):
+        raise ValueError("Ingredients are required")
+    return {"user_id": user_id, "product_name": payload["product_name"]}
+
+def test_job_lifecycle():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "app.db")
+        init_db(db_path)
+        queue = JobQueue(db_path, handler, workers=2, poll_interval=0.05)
+        queue.start()
+        try:
+            ok = queue.enqueue(7, {"product_name": "Cookies"})
+            bad = queue.enqueue(7, {"fail": True})
+            assert wait_for(queue, ok)["result"] == {"user_id": 7, "product_name": "Cookies"}
+            failed = wait_for(queue, bad)
+            assert failed["status"] == "failed" and failed["error"] == "Ingredients are required"
+        finally:
+            queue.stop()
+    print("test_job_lifecycle passed successfully!")
+
+def test_jobs_survive_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "app.db")
+        init_db(db_path)
+
+        # Enqueued while no worker is running, one whose worker died mid-run
+        # (lease expired) and one another live process is still running
+        first = JobQueue(db_path, handler)
+        pending = first.enqueue(1, {"product_name": "Chips"})
+        interrupted = first.enqueue(1, {"product_name": "Namkeen"})
+        elsewhere = first.enqueue(1, {"product_name": "Bhujia"})
+        conn = sqlite3.connect(db_path)
+        conn.execute("UPDATE jobs SET status = 'running', worker_id = 'dead', lease_expires = ? WHERE id = ?",
+                     (time.time() - 1, interrupted))
+        conn.execute("UPDATE jobs SET status = 'running', worker_id = 'alive', lease_expires = ? WHERE id = ?",
+                     (time.time() + 60, elsewhere))
+        conn.commit()
+        conn.close()
+
+        restarted = JobQueue(db_path, handler, workers=1, poll_interval=0.05)
+        restarted.start()
+        try:
+            assert wait_for(restarted, pending)["status"] == "done"
+            assert wait_for(restarted, interrupted)["result"]["product_name"] == "Namkeen"
+            time.sleep(0.2)
+            assert restarted.get(elsewhere)["status"] == "running"
+        finally:
+            restarted.stop()
+    print("test_jobs_survive_restart passed successfully!")
+
+def test_running_job_is_not_stolen():
+    # A job outliving its lease keeps it through heartbeats, so a second
+    # process sharing the database never runs it again
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "app.db")
+        init_db(db_path)
+        runs = []
+
+        def slow(kind, user_id, payload):
+            runs.append(payload["product_name"])
+            time.sleep(0.6)
+            return {}
+
+        queues = [JobQueue(db_path, slow, workers=1, poll_interval=0.05, lease_seconds=0.15) for _ in range(2)]
+        queues[0].start()
+        try:
+            job_id = queues[0].enqueue(1, {"product_name": "Mathri"})
+            while not runs:
+                time.sleep(0.01)
+            # e.g. the reloader starting a second copy of the app mid-job
+            queues[1].start()
+            assert wait_for(queues[1], job_id)["status"] == "done"
+            time.sleep(0.2)
+            assert runs == ["Mathri"]
+        finally:
+            for queue in queues:
+                queue.stop()
+    print("test_running_job_is_not_stolen passed successfully!")
+
+if __name__ == "__main__":
+    test_job_lifecycle()
+    test_jobs_survive_restart()
+    test_running_job_is_not_stolen()
@@ -0,0 +1,108 @@
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_init import init_db
+from engines.label_store import LabelCache, label_hash, retain_blob, release_blob
+from engines.label_generator import render_pdf_bytes, generate_pdf
+from bench_label import LABEL
+
+def test_render_in_memory_is_deterministic():
+    pdf = render_pdf_bytes(LABEL)
+    assert pdf.startswith(b"%PDF")
+    # Re-rendering from the stored JSON must give the same bytes
+    stored = json.loads(json.dumps(LABEL))
+    assert render_pdf_bytes(stored) == pdf
+    assert label_hash(stored) == label_hash(dict(LABEL, pdf_url="/download/1"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "label.pdf")
+        generate_pdf(LABEL, path)
+        with open(path, 'rb') as f:
+            assert f.read() == pdf
+    print("test_render_in_memory_is_deterministic passed successfully!")
+
+def test_cache_evicts_least_recently_used():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = LabelCache(tmp, max_bytes=250)
+        cache.put("a", b"x" * 100)
+        cache.put("b", b"y" * 100)
+        os.utime(cache.path("a"), (1, 1))
+        os.utime(cache.path("b"), (2, 2))
+        assert cache.get("a") == b"x" * 100  # touch: "b" is now the oldest
+        cache.put("c", b"z" * 100)
+        assert cache.get("b") is None
+        assert cache.get("a") is not None and cache.get("c") is not None
+        assert not [n for n in os.listdir(tmp) if n.endswith(".tmp")]
+
+        # With no room for unreferenced PDFs only pinned blobs are kept
+        no_cache = LabelCache(os.path.join(tmp, "off"), max_bytes=0)
+        no_cache.put("a", b"x")
+        assert no_cache.get("a") is None
+    print("test_cache_evicts_least_recently_used passed successfully!")
+
+def test_shared_blobs_are_refcounted():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "app.db")
+        init_db(db_path)
+        cache = LabelCache(os.path.join(tmp, "labels"), max_bytes=0, db_path=db_path)
+        conn = sqlite3.connect(db_path)
+        with conn:
+            retain_blob(conn, "a", 100)
+            retain_blob(conn, "a", 100)
+        cache.put("a", b"x" * 100)
+        cache.put("a", b"x" * 100)  # second generation reuses the same file
+        cache.put("b", b"y" * 100)  # unreferenced: not kept with max_bytes=0
+        assert os.listdir(cache.directory) == ["a.pdf"]
+        assert conn.execute("SELECT refcount FROM label_blobs WHERE hash = 'a'").fetchone() == (2,)
+
+        with conn:
+            assert release_blob(conn, "a") is False
+        with conn:
+            assert release_blob(conn, "a") is True
+        assert conn.execute("SELECT COUNT(*) FROM label_blobs").fetchone() == (0,)
+        conn.close()
+    print("test_shared_blobs_are_refcounted passed successfully!")
+
+def test_cache_scans_only_to_evict():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "app.db")
+        init_db(db_path)
+        cache = LabelCache(os.path.join(tmp, "labels"), max_bytes=250, db_path=db_path)
+        scans = []
+        scan = cache._scan
+        cache._scan = lambda: scans.append(1) or scan()
+
+        # Pinned blobs alone far over the cap: no rescans after the first load
+        conn = sqlite3.connect(db_path)
+        with conn:
+            for i in range(20):
+                retain_blob(conn, f"pinned{i}", 100)
+        for i in range(20):
+            cache.put(f"pinned{i}", b"p" * 100)
+        assert len(scans) == 1
+
+        cache.put("a", b"x" * 100)
+        cache.put("b", b"y" * 100)
+        assert len(scans) == 1
+        cache.put("c", b"z" * 100)  # 300 unpinned bytes: evict
+        assert len(scans) == 2
+        assert sorted(n for n in os.listdir(cache.directory) if not n.startswith("pinned")) == ["b.pdf", "c.pdf"]
+
+        # Removing the last reference's file keeps the count right
+        with conn:
+            assert release_blob(conn, "pinned0") is True
+        cache.remove("pinned0")
+        cache.remove("b")
+        assert cache._unpinned_bytes == 100 == scan()[1]
+        conn.close()
+    print("test_cache_scans_only_to_evict passed successfully!")
+
+if __name__ == "__main__":
+    test_render_in_memory_is_deterministic()
+    test_cache_evicts_least_recently_used()
+    test_shared_blobs_are_refcounted()
+    test_cache_scans_only_to_evict()
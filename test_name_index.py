@@ -0,0 +1,45 @@
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from engines.name_index import NameIndex
+
+def test_ranking():
+    index = NameIndex(["wheat flour", "gram flour", "almond", "almond oil", "rice", "rice flour", "brown rice"])
+    names = lambda q: [index.names[i] for i, _ in index.search(q)]
+
+    # Substring matches: whole-word first, then closest length, then alphabetical
+    assert names("flour") == ["gram flour", "rice flour", "wheat flour"]
+    assert names("rice")[0] == "rice"
+    assert names("almon")[0] == "almond"
+
+    # No substring hit: trigram similarity above the threshold
+    assert names("almonds")[0] == "almond"
+    assert names("quinoa") == []
+
+    # Deterministic regardless of insertion order
+    reversed_index = NameIndex(list(reversed(index.names)))
+    assert [reversed_index.names[i] for i, _ in reversed_index.search("flour")] == names("flour")
+
+    # A name covering only part of the query is not a match: it may be another food
+    index = NameIndex(["sugar", "chicken", "tomato", "almond"])
+    assert index.search("brown sugar") == []
+    assert index.search("chicken stock") == []
+    assert [index.names[i] for q in ("tomatoes", "almonds") for i, _ in index.search(q)] == ["tomato", "almond"]
+    print("test_ranking passed successfully!")
+
+def test_lookup_speed():
+    names = [f"food item {i} {w}" for i, w in enumerate(["raw", "cooked", "dried", "salted"] * 25000)]
+    names.append("jaggery")
+    index = NameIndex(names)
+    start = time.perf_counter()
+    for _ in range(100):
+        assert index.names[index.search("jagger")[0][0]] == "jaggery"
+    per_lookup = (time.perf_counter() - start) / 100
+    assert per_lookup < 0.001, f"Lookup took {per_lookup * 1000:.3f}ms"
+    print(f"test_lookup_speed passed ({per_lookup * 1e6:.1f}us per lookup)")
+
+if __name__ == "__main__":
+    test_ranking()
+    test_lookup_speed()
@@ -0,0 +1,86 @@
+import sys
+import os
+import sqlite3
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from engines import db, parser, parse_cache
+from engines.parse_cache import ParseCache, cache_key
+
+def test_cache_key_normalization():
+    a = cache_key("500g Almonds,\n  10g   Salt\n\n", "groq", "llama-3.1-8b-instant")
+    b = cache_key("500g almonds,\n10g salt", "groq", "llama-3.1-8b-instant")
+    assert a == b
+    assert a != cache_key("500g almonds,\n10g salt", "gemini", "gemini-1.5-flash")
+    assert a != cache_key("500g almonds,\n12g salt", "groq", "llama-3.1-8b-instant")
+    print("test_cache_key_normalization passed successfully!")
+
+def test_lru_eviction_and_hit_ratio():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ParseCache(os.path.join(tmp, "cache.db"), max_entries=2)
+        cache.put("a", "groq", "m", [{"name": "a", "quantity": 1, "unit": "g"}])
+        cache.put("b", "groq", "m", [])
+        assert cache.get("a") is not None   # "a" is now the most recently used
+        cache.put("c", "groq", "m", [])
+        assert cache.get("b") is None       # "b" was evicted
+        assert cache.get("c") == []
+        assert len(cache) == 2
+        assert cache.stats() == {"hits": 2, "misses": 1, "hit_ratio": 0.6667}
+    print("test_lru_eviction_and_hit_ratio passed successfully!")
+
+def test_recipe_cache_is_separate():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "cache.db")
+        # A database from before recipe_cache: its standardized lists move across
+        db.migrate(db_path, db.COMPOSITION_MIGRATIONS[:3])
+        conn = sqlite3.connect(db_path)
+        conn.execute("INSERT INTO parse_cache VALUES ('s', 'standardized', 'm', '[]', 1, 1)")
+        conn.execute("INSERT INTO parse_cache VALUES ('p', 'groq', 'm', '[]', 1, 1)")
+        conn.commit()
+        conn.close()
+        db.migrate(db_path, db.COMPOSITION_MIGRATIONS)
+
+        llm = ParseCache(db_path, max_entries=1)
+        recipes = ParseCache(db_path, max_entries=3, table="recipe_cache")
+        assert recipes.get("s") == [] and llm.get("s") is None
+        for key in "abc":
+            recipes.put(key, "standardized", "m", [])
+        # Filling the recipe cache neither evicts LLM parses nor shows in their stats
+        assert llm.get("p") == [] and len(llm) == 1 and len(recipes) == 3
+        assert llm.stats()["hits"] == 1 and recipes.stats()["hits"] == 1
+    print("test_recipe_cache_is_separate passed successfully!")
+
+def test_llm_parse_skipped_on_cache_hit():
+    calls = []
+
+    class FakeResponse:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            content = '[{"name": "almonds", "quantity": 500, "unit": "g"}]'
+            return {"choices": [{"message": {"content": content}}]}
+
+    def fake_post(provider, url, **kwargs):
+        calls.append(kwargs)
+        return FakeResponse()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old = parser.LLM_API_KEY, parser.http_client.post, parse_cache._cache
+        parser.LLM_API_KEY = "gsk_test"
+        parser.http_client.post = fake_post
+        parse_cache._cache = ParseCache(os.path.join(tmp, "cache.db"))
+        try:
+            first = parser.parse_with_llm("500g Almonds")
+            second = parser.parse_with_llm("500g almonds ")
+            assert first == second == [{"name": "almonds", "quantity": 500, "unit": "g"}]
+            assert len(calls) == 1
+        finally:
+            parser.LLM_API_KEY, parser.http_client.post, parse_cache._cache = old
+    print("test_llm_parse_skipped_on_cache_hit passed successfully!")
+
+if __name__ == "__main__":
+    test_cache_key_normalization()
+    test_lru_eviction_and_hit_ratio()
+    test_recipe_cache_is_separate()
+    test_llm_parse_skipped_on_cache_hit()
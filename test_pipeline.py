@@ -0,0 +1,105 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from engines import pipeline
+from engines.pipeline import compute_label, label_inputs, label_from_ingredients, recipe_ingredients
+
+FORM = {"product_name": "Test Biscuits", "ingredients": "100g wheat flour\n50g sugar\n20g ghee\n3g salt",
+        "serving_size": "30", "net_weight": "150", "total_weight": "160"}
+
+def test_recalculation_matches_generate():
+    generated, score = compute_label(FORM)
+    payload = dict(FORM, ingredients=generated["ingredients"])
+    recalculated, recalculated_score = label_from_ingredients(recipe_ingredients(payload), label_inputs(payload))
+    assert recalculated == generated
+    assert recalculated_score == score
+
+    # A serving size edit reuses the per-100g analysis and only rescales per serving
+    payload["serving_size"] = 60
+    bigger, _ = label_from_ingredients(recipe_ingredients(payload), label_inputs(payload))
+    assert bigger["per_100g"] == generated["per_100g"]
+    assert bigger["health_claims"] == generated["health_claims"]
+    assert abs(bigger["per_serving"]["energy"] - 2 * generated["per_serving"]["energy"]) <= 1
+    assert bigger["servings_per_pack"] == 2
+    print("test_recalculation_matches_generate passed successfully!")
+
+def test_recalculation_quantity_edits():
+    generated, _ = compute_label(FORM)
+    payload = dict(FORM, ingredients=generated["ingredients"], quantities={"Salt": 0.5})
+    ingredients = recipe_ingredients(payload)
+    assert {"name": "salt", "quantity": 0.5} in ingredients
+    edited, _ = label_from_ingredients(ingredients, label_inputs(payload))
+    assert edited["per_100g"]["sodium"] < generated["per_100g"]["sodium"]
+
+    # 0 drops an ingredient
+    payload["quantities"] = {"ghee": 0}
+    assert "ghee" not in [i["name"] for i in recipe_ingredients(payload)]
+
+    for bad in ({"quantities": {"butter": 5}}, {"quantities": {"salt": -1}},
+                {"ingredients": "not json"}, {"ingredients": []}, {"parse_id": None, "ingredients": None}):
+        try:
+            recipe_ingredients(dict(payload, **bad))
+            assert False, f"expected a ValueError for {bad}"
+        except ValueError:
+            pass
+    print("test_recalculation_quantity_edits passed successfully!")
+
+def test_recalculation_edits_running_totals():
+    generated, _ = compute_label(FORM)
+    parse_id = pipeline.remember_parse("what-if test recipe", generated["ingredients"])
+    inputs = label_inputs(FORM)
+
+    def recalc(quantities, **kwargs):
+        payload = {"parse_id": parse_id, "quantities": quantities}
+        return label_from_ingredients(recipe_ingredients(payload), inputs, **kwargs)[0]
+
+    assert recalc({}, parse_id=parse_id) == recalc({})
+    keys = {name: key for name, _, key in pipeline._what_if[parse_id][2]}
+
+    # Each edit matches a full calculation of the edited recipe, up to the
+    # last bits the running sums may carry
+    for edits in ({"salt": 1}, {"salt": 1, "ghee": 0}, {"salt": 2, "ghee": 20}):
+        ingredients = recipe_ingredients({"parse_id": parse_id, "quantities": edits})
+        edited = pipeline.edited_nutrition(parse_id, ingredients, 160, 100)
+        fresh = pipeline.calculate_nutrition(ingredients, 160, 100)
+        assert all(abs(edited["per_100g"][n] - v) <= 1e-9 * (1 + abs(v)) for n, v in fresh["per_100g"].items())
+        assert dict(edited, per_100g=None, per_serving=None) == dict(fresh, per_100g=None, per_serving=None)
+        assert recalc(edits, parse_id=parse_id)["ingredients"] == recalc(edits)["ingredients"]
+
+    # Untouched and re-weighed lines kept their place; the dropped line was re-added
+    after = {name: key for name, _, key in pipeline._what_if[parse_id][2]}
+    assert [name for name in keys if keys[name] != after[name]] == ["ghee"]
+
+    # Running totals dropped from the LRU are rebuilt from the parse
+    pipeline._what_if.clear()
+    assert recalc({"salt": 3}, parse_id=parse_id)["per_100g"] == recalc({"salt": 3})["per_100g"]
+    print("test_recalculation_edits_running_totals passed successfully!")
+
+def test_recalculation_rejects_malformed_json():
+    generated, _ = compute_label(FORM)
+    payload = dict(FORM, ingredients=generated["ingredients"])
+
+    # A number is a usable licence; only its text is printed
+    assert label_inputs(dict(payload, fssai_license=12345678901234))["fssai_license"] == "12345678901234"
+
+    for bad in ({"target_claims": [1]}, {"target_claims": {"Low Fat": True}}, {"serving_size": [30]},
+                {"total_weight": {"g": 160}}):
+        try:
+            label_inputs(dict(payload, **bad))
+            assert False, f"expected a ValueError for {bad}"
+        except ValueError:
+            pass
+    for bad in ([payload], "ingredients", dict(payload, parse_id=7)):
+        try:
+            recipe_ingredients(bad)
+            assert False, f"expected a ValueError for {bad!r}"
+        except ValueError:
+            pass
+    print("test_recalculation_rejects_malformed_json passed successfully!")
+
+if __name__ == "__main__":
+    test_recalculation_matches_generate()
+    test_recalculation_quantity_edits()
+    test_recalculation_edits_running_totals()
+    test_recalculation_rejects_malformed_json()
@@ -0,0 +1,124 @@
+import sys
+import os
+import random
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from engines.reformulation import reformulate, solve_min_change
+from engines.calculator import calculate_nutrition
+from engines.compliance_features import suggest_sodium_fix
+from engines.ingredient_store import get_store
+from engines.pipeline import compute_label
+
+def test_solver_single_constraint():
+    # min sum(((q - q0) / q0)**2) s.t. q0 + q1 <= 150: the cut is split in
+    # proportion to q0**2, i.e. q = q0 - q0**2 * 50 / sum(q0**2)
+    q0 = np.array([100.0, 100.0])
+    q, ok = solve_min_change(q0, [[1.0, 1.0]], [150.0], [0, 0], [200, 200])
+    assert ok
+    assert np.allclose(q, [75.0, 75.0])
+
+    q0 = np.array([100.0, 50.0])
+    q, ok = solve_min_change(q0, [[1.0, 1.0]], [120.0], [0, 0], [200, 100])
+    assert ok
+    assert np.allclose(q, q0 - q0 ** 2 * 30 / np.sum(q0 ** 2))
+    print("test_solver_single_constraint passed successfully!")
+
+def test_solver_is_optimal():
+    rng = np.random.default_rng(5)
+    for _ in range(300):
+        n, m = rng.integers(1, 10), rng.integers(1, 5)
+        q0 = rng.uniform(0.5, 300, n)
+        A = rng.normal(size=(m, n))
+        reachable = q0 * rng.uniform(0.3, 1.5, n)
+        b = A @ reachable + rng.uniform(0, 5, m)
+        lower, upper = np.minimum(q0, 0.1), q0 * 2
+        q, ok = solve_min_change(q0, A, b, lower, upper)
+        assert ok
+        assert np.all(A @ q <= b + 1e-6) and np.all(q >= lower) and np.all(q <= upper)
+        # No feasible point on the way to another feasible point is closer to q0
+        cost = np.sum(((q - q0) / q0) ** 2)
+        for t in np.linspace(0.05, 1, 20):
+            x = q + (reachable - q) * t
+            assert np.sum(((x - q0) / q0) ** 2) >= cost - 1e-9
+    print("test_solver_is_optimal passed successfully!")
+
+def test_reformulate_meets_targets():
+    rng = random.Random(11)
+    names = list(get_store().names)
+    targets = [("sodium", "<=", 600), ("sat_fat", "<", 1.5), ("protein", ">", 5)]
+    solved = 0
+    for _ in range(100):
+        ingredients = [{"name": name, "quantity": round(rng.uniform(1, 300), 1)}
+                       for name in rng.sample(names, rng.randint(2, 8))]
+        final_yield = rng.choice([0, round(sum(i["quantity"] for i in ingredients) * 0.8, 1)])
+        result = reformulate(ingredients, final_yield, targets)
+        if not result["is_feasible"]:
+            continue
+        solved += 1
+        assert all(t["met"] for t in result["targets"])
+
+        # Same numbers from calculate_nutrition, with the yield moving by the same grams
+        new = [{"name": i["name"], "quantity": q} for i, q in zip(ingredients, result["quantities"])]
+        new_yield = final_yield - sum(i["quantity"] for i in ingredients) + sum(result["quantities"]) \
+            if final_yield > 0 else 0
+        calc = calculate_nutrition(new, new_yield, 30)
+        assert calc["per_100g"]["sodium"] <= 600
+        assert calc["per_100g"]["sat_fat"] < 1.5
+        assert calc["per_100g"]["protein"] > 5
+    assert solved > 50
+    print("test_reformulate_meets_targets passed successfully!")
+
+def test_reformulate_reports_unreachable_targets():
+    ingredients = [{"name": "sugar", "quantity": 50}, {"name": "wheat flour", "quantity": 100}]
+    result = reformulate(ingredients, 0, [("added_sugar", "==", 0), ("sodium", "<=", 600)])
+    assert not result["is_feasible"]
+    assert [t["met"] for t in result["targets"]] == [False, True]
+    assert result["changes"] == []
+
+    # "==" holds up to the solver's rounding
+    result = reformulate(ingredients, 0, [("sugar", "==", 20)])
+    assert result["is_feasible"] and result["targets"][0]["met"]
+    print("test_reformulate_reports_unreachable_targets passed successfully!")
+
+def test_sodium_fix_without_yield():
+    # use_raw_weight passes a yield of 0: normalise by the raw weight
+    ingredients = [{"name": "wheat flour", "quantity": 100}, {"name": "salt", "quantity": 5}]
+    calc = calculate_nutrition(ingredients, 0, 30)
+    fix = suggest_sodium_fix(ingredients, calc["per_100g"]["sodium"], 0)
+    assert fix["is_fully_fixed"]
+    assert abs(sum(c["percentage"] for c in fix["contributors"]) - 100) < 1e-6
+    assert fix["fixes"][0]["name"] == "salt"
+    assert fix["new_sodium_per_100g"] <= 600
+
+    # A trim-only plan that already meets the limit is reused, anything else is not
+    low_sodium = reformulate(ingredients, 0, [("sodium", "<=", 120)], max_scale=1.0)
+    reused = suggest_sodium_fix(ingredients, calc["per_100g"]["sodium"], 0, plan=low_sodium)
+    assert reused["new_sodium_per_100g"] == round(low_sodium["per_100g"]["sodium"], 1)
+    unchanged = reformulate(ingredients, 0, [])
+    assert suggest_sodium_fix(ingredients, calc["per_100g"]["sodium"], 0, plan=unchanged) == fix
+    print("test_sodium_fix_without_yield passed successfully!")
+
+def test_compute_label_target_claims():
+    form = {"product_name": "Test", "ingredients": "100g wheat flour\n50g sugar\n20g ghee",
+            "serving_size": "30", "net_weight": "150", "target_claims": "Low Fat, Low Sugar"}
+    data, _ = compute_label(form)
+    claims = [t for t in data["reformulation"]["targets"] if t["nutrient"] in ("fat", "sugar")]
+    assert [t["threshold"] for t in claims] == [3, 5]
+    assert all(t["met"] for t in data["reformulation"]["targets"])
+
+    form["target_claims"] = "Extra Crunchy"
+    try:
+        compute_label(form)
+        assert False, "expected an unknown claim error"
+    except ValueError:
+        pass
+    print("test_compute_label_target_claims passed successfully!")
+
+if __name__ == "__main__":
+    test_solver_single_constraint()
+    test_solver_is_optimal()
+    test_reformulate_meets_targets()
+    test_reformulate_reports_unreachable_targets()
+    test_sodium_fix_without_yield()
+    test_compute_label_target_claims()
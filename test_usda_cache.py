@@ -0,0 +1,80 @@
+import sys
+import os
+import json
+import time
+import tempfile
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from engines import external_api, http_client
+
+class StubUSDA(BaseHTTPRequestHandler):
+    calls = []
+    delay = 0
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)["query"][0]
+        StubUSDA.calls.append(query)
+        time.sleep(StubUSDA.delay)
+        foods = []
+        if query.lower() == "quinoa":
+            foods = [{"foodNutrients": [{"nutrientId": 1008, "value": 368}, {"nutrientId": 1003, "value": 14.1}]}]
+        body = json.dumps({"foods": foods}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_stub():
+    server = HTTPServer(("127.0.0.1", 0), StubUSDA)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def test_usda_cache():
+    http_client.reset()  # a breaker left open by an earlier test would block the stub
+    server = start_stub()
+    old_url, old_cache = external_api.USDA_API_URL, external_api._cache
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            external_api.USDA_API_URL = f"http://127.0.0.1:{server.server_port}/fdc/v1/foods/search"
+            external_api._cache = external_api.LookupCache(os.path.join(tmp, "cache.db"), negative_ttl=60)
+            StubUSDA.calls, StubUSDA.delay = [], 0
+
+            # Hits and misses are both answered from disk the second time
+            assert external_api.search_ingredient_nutrition("Quinoa")["energy"] == 368
+            assert external_api.search_ingredient_nutrition("quinoa")["protein"] == 14.1
+            assert external_api.search_ingredient_nutrition("unobtainium") is None
+            assert external_api.search_ingredient_nutrition("unobtainium") is None
+            assert StubUSDA.calls == ["Quinoa", "unobtainium"], StubUSDA.calls
+
+            # Expired negative entries are retried
+            external_api._cache.negative_ttl = 0
+            time.sleep(0.01)
+            assert external_api.search_ingredient_nutrition("unobtainium") is None
+            assert StubUSDA.calls.count("unobtainium") == 2
+
+            # Concurrent lookups for one name are coalesced into a single request
+            StubUSDA.calls, StubUSDA.delay = [], 0.2
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(external_api.search_ingredient_nutrition("kale")))
+                       for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            assert results == [None] * 8
+            assert StubUSDA.calls == ["kale"], StubUSDA.calls
+        finally:
+            external_api.USDA_API_URL, external_api._cache = old_url, old_cache
+            server.shutdown()
+            server.server_close()
+    print("test_usda_cache passed successfully!")
+
+if __name__ == "__main__":
+    test_usda_cache()